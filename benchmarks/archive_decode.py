@@ -0,0 +1,52 @@
+"""
+Decode throughput of TickArchive against loading the raw float64 series.
+
+Writes a synthetic series of exponential tick gaps and half-tick price steps, then
+reports the best of several full decodes. Run from the repository root:
+
+    python benchmarks/archive_decode.py [ticks]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from q import TickArchive  # noqa: E402
+
+
+def best(function, repeat: int = 5) -> float:
+    """The fastest of several timed calls, in seconds"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main(ticks: int = 5_000_000) -> None:
+    rng = np.random.default_rng(0)
+    times = 1.6e9 + np.cumsum(rng.exponential(0.05, ticks))
+    prices = 30000 + np.cumsum(rng.integers(-3, 4, ticks)) * 0.5
+    with tempfile.TemporaryDirectory() as path:
+        archive = TickArchive.write(os.path.join(path, "ticks.qtk"), times, prices, 0.5)
+        raw = os.path.join(path, "ticks.npy")
+        np.save(raw, np.vstack((times, prices)))
+        decode = best(lambda: [archive.block(i) for i in range(len(archive.index))])
+        load = best(lambda: np.load(raw))
+        size = os.path.getsize(archive.path)
+        raw_size = os.path.getsize(raw)
+    print(f"ticks          {ticks:>12,}")
+    print(f"archive bytes  {size:>12,}  ({size / ticks:.2f} per tick)")
+    print(f"raw bytes      {raw_size:>12,}  ({raw_size / ticks:.2f} per tick)")
+    print(f"decode         {decode:>12.3f} s  ({ticks / decode / 1e6:.1f}M ticks/s)")
+    print(f"np.load        {load:>12.3f} s  ({ticks / load / 1e6:.1f}M ticks/s)")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -1,15 +1,479 @@
-   from typing import List
-   import time
+"""
+Vectorized performance analytics for finished runs.
 
-   # ... existing code from q.py (part 6 / 13) ...
+While it runs, the engine only records raw data: the equity curve rows of
+``q.EquityRecorder`` and the closed trades returned by ``Strategy.trade_ledger``.
+Everything here works on those arrays once the run is over.
+"""
 
-   class Strategy:
-       # ... existing code from q.py (part 6 / 13) ...
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional, Sequence, Tuple, Union
 
-   class Funds:
-       # ... existing code from q.py (part 5 / 13) ...
+import numpy as np
 
-   class Tracking:
-       # ... existing code from q.py (part 5 / 13) ...
+# the columns of q.EquityRecorder rows, which takes them from here
+CURVE_FIELDS: Tuple[str, ...] = (
+    "time",
+    "bar_index",
+    "price",
+    "equity",
+    "balance",
+    "margin",
+    "open_profit",
+)
 
-   # ... existing code from q.py (part 8 / 13) ...
\ No newline at end of file
+
+def streaks(wins: np.ndarray) -> Tuple[int, int, int, int]:
+    """
+    Finds the longest and the current runs of wins and losses.
+
+    Args:
+        wins (np.ndarray): True for every winning trade, in closing order.
+
+    Returns:
+        tuple: The max consecutive wins, max consecutive losses, and the consecutive
+            wins and losses at the end of the sequence.
+    """
+    wins = np.asarray(wins, dtype=bool)
+    if len(wins) == 0:
+        return 0, 0, 0, 0
+    starts = np.flatnonzero(np.concatenate(([True], wins[1:] != wins[:-1])))
+    lengths = np.diff(np.append(starts, len(wins)))
+    won = wins[starts]
+    max_wins = int(lengths[won].max()) if won.any() else 0
+    max_losses = int(lengths[~won].max()) if (~won).any() else 0
+    last = int(lengths[-1])
+    return max_wins, max_losses, last if won[-1] else 0, 0 if won[-1] else last
+
+
+def trade_stats(
+    net_profit: np.ndarray,
+    gross_profit: Optional[np.ndarray] = None,
+    gross_loss: Optional[np.ndarray] = None,
+    commission: Optional[np.ndarray] = None,
+) -> Dict[str, float]:
+    """
+    Computes the closed trade statistics of Tracking in one pass over the ledger.
+
+    Args:
+        net_profit (np.ndarray): The net profit of every closed trade.
+        gross_profit (np.ndarray, optional): The gross profit of every closed trade.
+        gross_loss (np.ndarray, optional): The gross loss of every closed trade, positive.
+        commission (np.ndarray, optional): The commission of every closed trade.
+
+    Returns:
+        dict: Values keyed by their Tracking field names.
+    """
+    net_profit = np.asarray(net_profit, dtype=np.float64)
+    total = len(net_profit)
+    wins = net_profit > 0
+    won = int(wins.sum())
+    lost = total - won
+    win_amount = float(net_profit[wins].sum())
+    loss_amount = float(-net_profit[~wins].sum())
+    avg_win = win_amount / won if won else 0.0
+    avg_loss = loss_amount / lost if lost else 0.0
+    gross_win = float(np.sum(gross_profit)) if gross_profit is not None else win_amount
+    gross_lost = float(np.sum(gross_loss)) if gross_loss is not None else loss_amount
+    max_wins, max_losses, consecutive_wins, consecutive_losses = streaks(wins)
+    return {
+        "total_trades": total,
+        "total_winning_trades": won,
+        "total_losing_trades": lost,
+        "max_consecutive_wins": max_wins,
+        "max_consecutive_losses": max_losses,
+        "consecutive_wins": consecutive_wins,
+        "consecutive_losses": consecutive_losses,
+        "gross_profit": gross_win,
+        "gross_loss": gross_lost,
+        "avg_win": avg_win,
+        "avg_loss": avg_loss,
+        "avg_profit_per_trade": float(net_profit.sum()) / total if total else 0.0,
+        "win_loss_ratio": avg_win / avg_loss if avg_loss > 0 else 0.0,
+        "profit_factor": gross_win / gross_lost if gross_lost > 0 else 0.0,
+        "commission_paid": float(np.sum(commission)) if commission is not None else 0.0,
+        "net_profit": float(net_profit.sum()),
+        "percent_profitable": won / total if total else 0.0,
+    }
+
+
+def drawdowns(equity: np.ndarray) -> np.ndarray:
+    """
+    Returns the drawdown of every point of a curve as a fraction of the running peak.
+
+    Args:
+        equity (np.ndarray): The equity curve.
+
+    Returns:
+        np.ndarray: Values <= 0, 0 at every new peak.
+    """
+    equity = np.asarray(equity, dtype=np.float64)
+    peaks = np.maximum.accumulate(equity)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(peaks > 0, equity / peaks - 1, 0.0)
+
+
+def max_drawdown(
+    equity: np.ndarray, times: Optional[np.ndarray] = None
+) -> Tuple[float, float]:
+    """
+    Finds the deepest drawdown and the longest time spent below a previous peak.
+
+    Args:
+        equity (np.ndarray): The equity curve.
+        times (np.ndarray, optional): The time of every point. Defaults to the index.
+
+    Returns:
+        tuple: The max drawdown depth (<= 0) and the longest underwater duration.
+    """
+    depth = drawdowns(equity)
+    if len(depth) == 0:
+        return 0.0, 0.0
+    times = np.arange(len(depth)) if times is None else np.asarray(times)
+    at_peak = depth == 0
+    at_peak[0] = True
+    last_peak = np.maximum.accumulate(np.where(at_peak, np.arange(len(depth)), 0))
+    return float(depth.min()), float((times - times[last_peak]).max())
+
+
+def max_runup(equity: np.ndarray) -> float:
+    """Returns the largest rise of a curve above its running low, as a fraction."""
+    equity = np.asarray(equity, dtype=np.float64)
+    if len(equity) == 0:
+        return 0.0
+    lows = np.minimum.accumulate(equity)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return float(np.max(np.where(lows > 0, equity / lows - 1, 0.0)))
+
+
+def period_returns(equity: np.ndarray) -> np.ndarray:
+    equity = np.asarray(equity, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = equity[1:] / equity[:-1] - 1
+    return returns[np.isfinite(returns)]
+
+
+def sharpe(
+    returns: np.ndarray, periods_per_year: float = 1.0, risk_free: float = 0.0
+) -> float:
+    """
+    Computes the Sharpe ratio of per-period returns.
+
+    Args:
+        returns (np.ndarray): The per-period returns.
+        periods_per_year (float, optional): Periods per year to annualize by. Defaults to 1.
+        risk_free (float, optional): The per-period risk free return. Defaults to 0.
+
+    Returns:
+        float: The Sharpe ratio, 0 when the returns don't vary.
+    """
+    excess = np.asarray(returns, dtype=np.float64) - risk_free
+    if len(excess) < 2:
+        return 0.0
+    deviation = excess.std(ddof=1)
+    return (
+        float(excess.mean() / deviation * np.sqrt(periods_per_year))
+        if deviation
+        else 0.0
+    )
+
+
+def sortino(
+    returns: np.ndarray, periods_per_year: float = 1.0, risk_free: float = 0.0
+) -> float:
+    """
+    Computes the Sortino ratio of per-period returns, penalizing only downside moves.
+
+    Args:
+        returns (np.ndarray): The per-period returns.
+        periods_per_year (float, optional): Periods per year to annualize by. Defaults to 1.
+        risk_free (float, optional): The per-period risk free return. Defaults to 0.
+
+    Returns:
+        float: The Sortino ratio, 0 without downside moves.
+    """
+    excess = np.asarray(returns, dtype=np.float64) - risk_free
+    if len(excess) < 2:
+        return 0.0
+    downside = np.sqrt(np.mean(np.minimum(excess, 0.0) ** 2))
+    return (
+        float(excess.mean() / downside * np.sqrt(periods_per_year)) if downside else 0.0
+    )
+
+
+def calmar(equity: np.ndarray, periods_per_year: float = 1.0) -> float:
+    """
+    Computes the Calmar ratio: annualized return over max drawdown depth.
+
+    Args:
+        equity (np.ndarray): The equity curve.
+        periods_per_year (float, optional): Points per year of the curve. Defaults to 1.
+
+    Returns:
+        float: The Calmar ratio, 0 without a drawdown.
+    """
+    equity = np.asarray(equity, dtype=np.float64)
+    if len(equity) < 2 or equity[0] <= 0 or equity[-1] <= 0:
+        return 0.0
+    years = (len(equity) - 1) / periods_per_year
+    annual = (equity[-1] / equity[0]) ** (1 / years) - 1
+    depth, _ = max_drawdown(equity)
+    return float(annual / -depth) if depth < 0 else 0.0
+
+
+def exposure(margin: np.ndarray) -> float:
+    """Returns the fraction of the curve spent with margin in use."""
+    margin = np.asarray(margin)
+    return float(np.count_nonzero(margin > 0) / len(margin)) if len(margin) else 0.0
+
+
+def trade_durations(
+    entry: np.ndarray, exit: np.ndarray, percentiles: Sequence[float] = (50, 90, 99)
+) -> Dict[str, float]:
+    """
+    Summarizes how long closed trades stayed open.
+
+    Args:
+        entry (np.ndarray): The entry time or bar index of every trade.
+        exit (np.ndarray): The exit time or bar index of every trade.
+        percentiles (Sequence[float], optional): The percentiles to report.
+
+    Returns:
+        dict: The mean, min, max and requested percentiles ("p50", ...).
+    """
+    durations = np.asarray(exit, dtype=np.float64) - np.asarray(entry, dtype=np.float64)
+    if len(durations) == 0:
+        return {
+            "mean": 0.0,
+            "min": 0.0,
+            "max": 0.0,
+            **{f"p{p:g}": 0.0 for p in percentiles},
+        }
+    return {
+        "mean": float(durations.mean()),
+        "min": float(durations.min()),
+        "max": float(durations.max()),
+        **{
+            f"p{p:g}": float(v)
+            for p, v in zip(percentiles, np.percentile(durations, percentiles))
+        },
+    }
+
+
+def analyze(
+    curve: np.ndarray,
+    ledger: Optional[Dict[str, np.ndarray]] = None,
+    periods_per_year: float = 1.0,
+    fields: Sequence[str] = CURVE_FIELDS,
+) -> Dict[str, object]:
+    """
+    Computes the full report of a run from its equity curve and closed trades.
+
+    Args:
+        curve (np.ndarray): The (rows, fields) curve of an EquityRecorder.
+        ledger (dict, optional): The closed trade arrays from Strategy.trade_ledger.
+        periods_per_year (float, optional): Curve rows per year to annualize by.
+        fields (Sequence[str], optional): The column names of the curve.
+
+    Returns:
+        dict: The curve metrics, plus trade statistics and durations with a ledger.
+    """
+    curve = np.asarray(curve, dtype=np.float64)
+    column = {name: curve[:, i] for i, name in enumerate(fields)}
+    equity = column["equity"] + column["open_profit"]
+    returns = period_returns(equity)
+    depth, duration = max_drawdown(equity, column["time"])
+    report: Dict[str, object] = {
+        "sharpe": sharpe(returns, periods_per_year),
+        "sortino": sortino(returns, periods_per_year),
+        "calmar": calmar(equity, periods_per_year),
+        "max_draw_down": depth,
+        "max_draw_down_duration": duration,
+        "max_run_up": max_runup(equity),
+        "exposure": exposure(column["margin"]),
+    }
+    if ledger is not None:
+        report.update(
+            trade_stats(
+                ledger["net_profit"],
+                ledger.get("gross_profit"),
+                ledger.get("gross_loss"),
+                ledger.get("commission"),
+            )
+        )
+        report["trade_durations"] = trade_durations(
+            ledger["entry_bar_index"], ledger["exit_bar_index"]
+        )
+    return report
+
+
+BOOTSTRAP = "bootstrap"
+PERMUTATION = "permutation"
+
+
+def path_stats(
+    pnl: np.ndarray, initial_equity: float = 1000.0, ruin: float = 0.5
+) -> Dict[str, np.ndarray]:
+    """
+    Computes the statistics of many trade sequences at once.
+
+    Args:
+        pnl (np.ndarray): The (paths, trades) net profits, one sequence per row.
+        initial_equity (float, optional): The equity every sequence starts from.
+        ruin (float, optional): The fraction of the initial equity lost that counts
+            as ruin. Defaults to 0.5.
+
+    Returns:
+        dict: Per-path net_profit, max_draw_down (<= 0, from the running peak
+            including the start), profit_factor, win_loss_ratio and ruined.
+    """
+    pnl = np.atleast_2d(np.asarray(pnl, dtype=np.float64))
+    equity = initial_equity + np.cumsum(pnl, axis=1)
+    peaks = np.maximum(np.maximum.accumulate(equity, axis=1), initial_equity)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        depth = np.where(peaks > 0, equity / peaks - 1, 0.0).min(axis=1, initial=0.0)
+        won = np.where(pnl > 0, pnl, 0.0).sum(axis=1)
+        lost = -np.where(pnl < 0, pnl, 0.0).sum(axis=1)
+        wins = np.count_nonzero(pnl > 0, axis=1)
+        losses = pnl.shape[1] - wins
+        avg_win = np.where(wins > 0, won / wins, 0.0)
+        avg_loss = np.where(losses > 0, lost / losses, 0.0)
+        return {
+            "net_profit": pnl.sum(axis=1),
+            "max_draw_down": depth,
+            "profit_factor": np.where(lost > 0, won / lost, 0.0),
+            "win_loss_ratio": np.where(avg_loss > 0, avg_win / avg_loss, 0.0),
+            "ruined": (equity <= initial_equity * (1 - ruin)).any(axis=1),
+        }
+
+
+def _resample_batch(
+    pnl: np.ndarray,
+    method: str,
+    paths: int,
+    seed: np.random.SeedSequence,
+    initial_equity: float,
+    ruin: float,
+) -> Dict[str, np.ndarray]:
+    """Path statistics of one batch of resampled trade sequences"""
+    rng = np.random.default_rng(seed)
+    if method == BOOTSTRAP:
+        sequences = pnl[rng.integers(0, len(pnl), size=(paths, len(pnl)))]
+    else:
+        sequences = rng.permuted(np.broadcast_to(pnl, (paths, len(pnl))), axis=1)
+    return path_stats(sequences, initial_equity, ruin)
+
+
+def resample(
+    pnl: np.ndarray,
+    method: str = BOOTSTRAP,
+    paths: int = 10000,
+    initial_equity: float = 1000.0,
+    ruin: float = 0.5,
+    seed: Union[int, np.random.SeedSequence, None] = None,
+    batch: int = 1000,
+    workers: Optional[int] = None,
+) -> Dict[str, np.ndarray]:
+    """
+    Runs path_stats over resampled orderings of the closed trades.
+
+    BOOTSTRAP draws every sequence from the trades with replacement, so all the
+    statistics vary. PERMUTATION shuffles the same trades, so only the path
+    dependent ones, drawdown and ruin, do. Paths are built ``batch`` rows at a
+    time to bound memory, each batch seeded from ``seed`` so the results don't
+    depend on ``workers``.
+
+    Args:
+        pnl (np.ndarray): The net profit of every closed trade.
+        method (str, optional): BOOTSTRAP or PERMUTATION. Defaults to BOOTSTRAP.
+        paths (int, optional): The number of sequences. Defaults to 10000.
+        initial_equity (float, optional): The equity every sequence starts from.
+        ruin (float, optional): The fraction of the initial equity lost that counts
+            as ruin. Defaults to 0.5.
+        seed (int | np.random.SeedSequence, optional): The random seed, or the seed
+            sequence the batches are spawned from.
+        batch (int, optional): Sequences per batch. Defaults to 1000.
+        workers (int, optional): Run the batches in a process pool of this size.
+
+    Returns:
+        dict: The path_stats arrays of all sequences.
+    """
+    if method not in (BOOTSTRAP, PERMUTATION):
+        raise ValueError(f"Unknown resampling method {method}")
+    pnl = np.asarray(pnl, dtype=np.float64)
+    sizes = [min(batch, paths - start) for start in range(0, paths, batch)]
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    seeds = seed.spawn(len(sizes))
+    args = (
+        [pnl] * len(sizes),
+        [method] * len(sizes),
+        sizes,
+        seeds,
+        [initial_equity] * len(sizes),
+        [ruin] * len(sizes),
+    )
+    if workers and workers > 1 and len(sizes) > 1:
+        with ProcessPoolExecutor(workers) as pool:
+            batches = list(pool.map(_resample_batch, *args))
+    else:
+        batches = list(map(_resample_batch, *args))
+    if not batches:
+        return path_stats(np.empty((0, len(pnl))), initial_equity, ruin)
+    return {k: np.concatenate([b[k] for b in batches]) for k in batches[0]}
+
+
+def robustness(
+    pnl: np.ndarray,
+    paths: int = 10000,
+    confidence: float = 0.95,
+    initial_equity: float = 1000.0,
+    ruin: float = 0.5,
+    seed: Optional[int] = None,
+    batch: int = 1000,
+    workers: Optional[int] = None,
+) -> Dict[str, Dict[str, object]]:
+    """
+    Puts confidence intervals around the point estimates of a closed trade ledger.
+
+    Args:
+        pnl (np.ndarray): The net profit of every closed trade, in closing order.
+        paths (int, optional): Sequences per method. Defaults to 10000.
+        confidence (float, optional): The two-sided interval width. Defaults to 0.95.
+        initial_equity (float, optional): The equity every sequence starts from.
+        ruin (float, optional): The fraction of the initial equity lost that counts
+            as ruin. Defaults to 0.5.
+        seed (int, optional): The random seed, each method runs on its own stream
+            spawned from it.
+        batch (int, optional): Sequences per batch. Defaults to 1000.
+        workers (int, optional): Run the batches in a process pool of this size.
+
+    Returns:
+        dict: Per method ("actual", BOOTSTRAP, PERMUTATION), the mean, low and high
+            of every statistic and the risk_of_ruin; "actual" holds the values of
+            the ledger as traded.
+    """
+    actual = path_stats(np.asarray(pnl, dtype=np.float64)[None], initial_equity, ruin)
+    report: Dict[str, Dict[str, object]] = {
+        "actual": {k: float(v[0]) for k, v in actual.items() if k != "ruined"}
+    }
+    report["actual"]["risk_of_ruin"] = float(actual["ruined"][0])
+    bounds = (100 * (1 - confidence) / 2, 100 * (1 + confidence) / 2)
+    streams = np.random.SeedSequence(seed).spawn(2)
+    for method, stream in zip((BOOTSTRAP, PERMUTATION), streams):
+        stats = resample(
+            pnl, method, paths, initial_equity, ruin, stream, batch, workers
+        )
+        summary: Dict[str, object] = {}
+        for k, v in stats.items():
+            if k == "ruined":
+                summary["risk_of_ruin"] = float(v.mean()) if len(v) else 0.0
+            elif len(v):
+                low, high = np.percentile(v, bounds)
+                summary[k] = {
+                    "mean": float(v.mean()),
+                    "low": float(low),
+                    "high": float(high),
+                }
+        report[method] = summary
+    return report
@@ -1,6 +1,32 @@
-import time
+import asyncio
+import bisect
+import copy
+import functools
+import hashlib
+import heapq
+import inspect
+import itertools
 import json
-from typing import List, Optional
+import math
+import os
+import queue
+import random
+import sqlite3
+import struct
+import tempfile
+import threading
+import time
+import uuid
+import weakref
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+from numpy import average
+
+from performance_analysis import CURVE_FIELDS, trade_stats
 
 # Constants for trading operations
 LONG = "long"
@@ -16,6 +42,7 @@ STOP = "stop"
 STOP_LOSS = "stop_loss"
 TRAILING_STOP = "trailing_stop"
 TAKE_PROFIT = "take_profit"
+LIQUIDATION = "liquidation"
 
 CREATED = "created"
 IMMEDIATE = "immediate"
@@ -23,38 +50,214 @@ PENDING = "pending"
 
 OPEN = "open"
 CLOSED = "closed"
+EXPIRED = "expired"
+
+# order time in force
+GTC = "gtc"  # good till canceled
+GTD = "gtd"  # good till the order's expire_time
+IOC = "ioc"  # immediate or cancel, fill what can be filled when placed
+FOK = "fok"  # fill or kill, fill all of it when placed or nothing
+
+NEW = "new"
+CANCEL = "cancel"
+
+# order in which a bar is assumed to reach its high and low
+HIGH_FIRST = "high_first"
+LOW_FIRST = "low_first"
+NEAREST_FIRST = "nearest_first"  # the extreme closer to the open
+ADVERSE_FIRST = "adverse_first"  # the extreme against each trade
+
+ISOLATED = "isolated"
+CROSS = "cross"
+
+# how clean_ticks handles the ticks failing a check
+DROP = "drop"
+FILL = "fill"  # repair from the ticks before it
+KEEP = "keep"  # only report it
+RAISE = "raise"
+
+CLEAN_POLICIES = {
+    "invalid_price": DROP,
+    "non_monotonic": DROP,
+    "duplicate": DROP,
+    "spike": DROP,
+    "gap": KEEP,
+}
+CLEAN_ACTIONS = {
+    "invalid_price": (DROP, FILL, KEEP, RAISE),
+    "non_monotonic": (DROP, FILL, KEEP, RAISE),
+    "duplicate": (DROP, KEEP, RAISE),
+    "spike": (DROP, FILL, KEEP, RAISE),
+    "gap": (KEEP, RAISE),
+}
+
+# closed trade Data fields exported by Strategy.trade_ledger
+LEDGER_FIELDS = (
+    "entry_bar_index",
+    "exit_bar_index",
+    "entry_time",
+    "exit_time",
+    "entry_price",
+    "exit_price",
+    "size",
+    "net_profit",
+    "gross_profit",
+    "gross_loss",
+    "commission",
+    "max_draw_down",
+    "max_run_up",
+)
 
 
 class Fee:
     """
     Represents a fee associated with a trade or order.
 
+    The type is compiled once into a rate on the traded value and a flat amount, so
+    calculating a fee is plain arithmetic that also works on arrays.
+
     Attributes:
         type (str): The type of fee (e.g., "commission" or "flat").
         value (float): The fee value.
+        rate (float): The compiled fee per unit of traded value.
+        flat (float): The compiled fee per fill.
     """
 
     def __init__(self, type: str = "commission", value: float = 0.0004):
+        if type not in ("commission", "flat"):
+            raise ValueError(f"Invalid fee type: {type}")
         self.type: str = type
-        self.value: float = value
+        self.value = value
+
+    @property
+    def value(self) -> float:
+        return self._value
 
-    def calculate(self, size: float, price: float) -> float:
+    @value.setter
+    def value(self, value: float) -> None:
+        self._value: float = value
+        self.rate: float = value if self.type == "commission" else 0.0
+        self.flat: float = value if self.type == "flat" else 0.0
+
+    def get_state(self) -> dict:
+        return {"type": self.type, "value": self.value}
+
+    def calculate(
+        self, size: Union[float, np.ndarray], price: Union[float, np.ndarray]
+    ) -> Union[float, np.ndarray]:
         """
         Calculates the fee based on the specified size and price.
 
         Args:
-            size (float): The size of the trade or order.
-            price (float): The price of the trade or order.
+            size (float | np.ndarray): The size of the trade or order, or of many.
+            price (float | np.ndarray): The price of the trade or order, or of many.
 
         Returns:
-            float: The calculated fee amount.
+            float | np.ndarray: The calculated fee amount, or one per size and price.
         """
-        if self.type == "commission":
-            return size * price * self.value
-        elif self.type == "flat":
-            return self.value
-        else:
-            raise ValueError(f"Invalid fee type: {self.type}")
+        return size * price * self.rate + self.flat
+
+    def calculate_total(self, sizes: List[float], price: float) -> float:
+        """The summed fees of closing several sizes at one price"""
+        return sum(abs(size) for size in sizes) * price * self.rate + self.flat * len(
+            sizes
+        )
+
+
+class FeeSchedule:
+    """
+    Volume-tiered maker and taker fees, like an exchange's fee levels.
+
+    The tiers are compiled into arrays once. The traded volume is tracked
+    incrementally, and the maker and taker Fee objects are repriced in place when it
+    crosses into the next tier, so everything holding them sees the new rates.
+
+    Attributes:
+        thresholds (np.ndarray): The traded volume from which each tier applies.
+        maker_rates (np.ndarray): The maker rate of each tier.
+        taker_rates (np.ndarray): The taker rate of each tier.
+        volume (float): The traded volume so far.
+        tier (int): The index of the current tier.
+        maker (Fee): The current maker fee.
+        taker (Fee): The current taker fee.
+    """
+
+    def __init__(
+        self, tiers: List[Tuple[float, float, float]], volume: float = 0.0
+    ) -> None:
+        """
+        Args:
+            tiers (list): (volume, maker rate, taker rate) per tier, the first from
+                a volume of 0, ascending by volume.
+            volume (float, optional): The traded volume so far. Defaults to 0.
+        """
+        table: np.ndarray = np.asarray(tiers, dtype=np.float64).reshape(-1, 3)
+        if len(table) == 0 or table[0, 0] != 0 or np.any(np.diff(table[:, 0]) <= 0):
+            raise ValueError("Fee tiers must start at volume 0 and ascend")
+        self.thresholds: np.ndarray = table[:, 0]
+        self.maker_rates: np.ndarray = table[:, 1]
+        self.taker_rates: np.ndarray = table[:, 2]
+        self.volume: float = volume
+        self.tier: int = self.tier_of(volume)
+        self.maker: Fee = Fee(value=float(self.maker_rates[self.tier]))
+        self.taker: Fee = Fee(value=float(self.taker_rates[self.tier]))
+
+    def get_state(self) -> dict:
+        return {
+            "tiers": np.column_stack(
+                (self.thresholds, self.maker_rates, self.taker_rates)
+            ).tolist(),
+            "volume": self.volume,
+        }
+
+    def tier_of(self, volume: Union[float, np.ndarray]) -> Union[int, np.ndarray]:
+        """The tier index at a traded volume, or at each of an array of them"""
+        tier = np.searchsorted(self.thresholds, volume, side="right") - 1
+        return int(tier) if np.ndim(tier) == 0 else tier
+
+    def record(self, value: float) -> None:
+        """Adds a fill's traded value, moving up the tiers the volume crosses"""
+        self.volume += abs(value)
+        last: int = len(self.thresholds) - 1
+        if self.tier < last and self.volume >= self.thresholds[self.tier + 1]:
+            while self.tier < last and self.volume >= self.thresholds[self.tier + 1]:
+                self.tier += 1
+            self.maker.value = float(self.maker_rates[self.tier])
+            self.taker.value = float(self.taker_rates[self.tier])
+
+    def fees(
+        self,
+        sizes: np.ndarray,
+        prices: np.ndarray,
+        maker: Union[bool, np.ndarray] = False,
+        record: bool = True,
+    ) -> np.ndarray:
+        """
+        Calculates the fees of a sequence of fills in one call.
+
+        Each fill is charged at the tier of the volume traded before it, so tier
+        changes within the sequence apply from the fill that crosses them on.
+
+        Args:
+            sizes (np.ndarray): The size of each fill.
+            prices (np.ndarray): The price of each fill.
+            maker (bool | np.ndarray, optional): Whether each fill is a maker fill.
+                Defaults to False.
+            record (bool, optional): Add the fills to the traded volume. Defaults to
+                True.
+
+        Returns:
+            np.ndarray: The fee of each fill.
+        """
+        values: np.ndarray = np.abs(np.asarray(sizes) * np.asarray(prices))
+        after: np.ndarray = self.volume + np.cumsum(values)
+        tiers: np.ndarray = self.tier_of(after - values)
+        rates: np.ndarray = np.where(
+            maker, self.maker_rates[tiers], self.taker_rates[tiers]
+        )
+        if record and len(values):
+            self.record(float(after[-1]) - self.volume)
+        return values * rates
 
 
 class Calculations:
@@ -101,10 +304,13 @@ class Calculations:
     def scaled_targets(
         cls, count: int, weight: float, minimum: float, maximum: float
     ) -> List[float]:
+        if count < 2:
+            return [minimum] * count
         split = cls.scaled_sizes(cls.gap_size(maximum, minimum), count - 1, weight, 0)
+        step = 1 if maximum >= minimum else -1  # a short's ladder runs downwards
         targets = [0.0] * count
         for i in range(count):
-            targets[i] = minimum + sum(split[:i])
+            targets[i] = minimum + step * sum(split[:i])
         return targets
 
 
@@ -148,6 +354,7 @@ class Tracking:
         self.win_loss_ratio: float = 0.0
         self.profit_factor: float = 0.0
         self.commission_paid: float = 0.0
+        # the lowest and highest combined open profit of the open trades, in quote
         self.max_draw_down: float = 0.0
         self.max_run_up: float = 0.0
         self.net_profit: float = 0.0
@@ -271,8 +478,43 @@ class Config:
         )
         self.risk: float = 0.05  # the default risk percentage (0-1)
         self.slippage: float = 0.0001  # the default slippage percentage (0-1)
+        self.intrabar_path: str = NEAREST_FIRST  # the assumed path inside OHLC bars
+        # seconds per tick of order expiry, orders expire up to one tick late
+        self.expiry_resolution: float = 1.0
+        self.margin_mode: str = ISOLATED  # margin per trade, or CROSS for shared
+        self.maintenance_margin: float = 0.005  # the margin rate to keep (0-1)
         self.taker_fee: Fee = Fee()  # the default taker fee
         self.maker_fee: Fee = Fee(value=0.0002)  # the default maker fee
+        self.fee_schedule: Optional[FeeSchedule] = None  # volume tiers of the fees
+
+    def get_state(self) -> dict:
+        """Plain-value copy of the settings, fees as their type and value"""
+        fees: Tuple[str, ...] = ("taker_fee", "maker_fee", "fee_schedule")
+        state: dict = _plain_copy(self.__dict__, fees)
+        state["taker_fee"] = self.taker_fee.get_state()
+        state["maker_fee"] = self.maker_fee.get_state()
+        state["fee_schedule"] = self.fee_schedule and self.fee_schedule.get_state()
+        return state
+
+    def set_state(self, state: dict) -> None:
+        fees: Tuple[str, ...] = ("taker_fee", "maker_fee", "fee_schedule")
+        self.__dict__.update(_plain_copy(state, fees))
+        self.fee_schedule = None
+        self.taker_fee = Fee(**state["taker_fee"])
+        self.maker_fee = Fee(**state["maker_fee"])
+        if state.get("fee_schedule"):
+            self.set_fee_schedule(FeeSchedule(**state["fee_schedule"]))
+
+    def set_fee_schedule(self, schedule: FeeSchedule) -> None:
+        """Use a schedule's tiered fees as the maker and taker fees"""
+        self.fee_schedule = schedule
+        self.taker_fee = schedule.taker
+        self.maker_fee = schedule.maker
+
+    def record_volume(self, value: float) -> None:
+        """Count a fill's traded value towards the fee schedule's tiers"""
+        if self.fee_schedule is not None:
+            self.fee_schedule.record(value)
 
     def set_max_order(self, price: Optional[float] = None, funds_equity=None) -> float:
         """
@@ -365,6 +607,32 @@ class Config:
 
         return 0.0
 
+    def max_usd(
+        self, prefix: str, prices: np.ndarray, funds_equity: float
+    ) -> np.ndarray:
+        """
+        The USD limit of the order ("ord") or position ("position") settings at each
+        price, as set_max_order and set_max_position compute it for a single price.
+        """
+        kind: str = getattr(self, f"{prefix}_max_type")
+        if kind == "usd":
+            return np.full(len(prices), getattr(self, f"{prefix}_max_usd"))
+        if kind == "percent":
+            limit: float = getattr(self, f"{prefix}_max_pct") / 100 * funds_equity
+            return np.full(len(prices), limit)
+        if kind == "units":
+            return getattr(self, f"{prefix}_max_units") * prices
+        return np.zeros(len(prices))
+
+
+def _plain_copy(fields: dict, skip: Tuple[str, ...] = ()) -> dict:
+    """Copy of an object's fields without the skipped references, lists copied"""
+    return {
+        k: list(v) if isinstance(v, list) else v
+        for k, v in fields.items()
+        if k not in skip
+    }
+
 
 class Data:
     def __init__(
@@ -408,7 +676,13 @@ class Order:
         price: Optional[float] = None,
         leverage: Optional[float] = None,
         funds_equity: Optional[float] = None,
+        time_in_force: str = GTC,
+        expire_time: Optional[float] = None,
     ) -> None:
+        if time_in_force not in (GTC, GTD, IOC, FOK):
+            raise ValueError(f"Invalid time in force: {time_in_force}")
+        if time_in_force == GTD and expire_time is None:
+            raise ValueError("A GTD order needs an expire_time")
         self.symbol = symbol
         self.comment: str = "Order"
         self.side: str = side
@@ -429,6 +703,8 @@ class Order:
         self.time: float = time.time()
         self.order_type: str = MARKET if type is None else type
         self.status: str = IMMEDIATE if self.order_type == MARKET else PENDING
+        self.time_in_force: str = time_in_force
+        self.expire_time: Optional[float] = expire_time
 
         self.te_active: bool = False
         self.te_enabled: bool = False
@@ -495,6 +771,17 @@ class Order:
     def __bool__(self) -> bool:
         return self.status == PENDING
 
+    def get_state(self) -> dict:
+        return _plain_copy(self.__dict__, ("fee",))
+
+    @classmethod
+    def from_state(cls, state: dict, config: Config) -> "Order":
+        """Rebuild an order from get_state, sharing the fees of the config"""
+        order: Order = cls.__new__(cls)
+        order.__dict__.update(_plain_copy(state))
+        order.fee = config.maker_fee if order.order_type == LIMIT else config.taker_fee
+        return order
+
 
 class Trade:
     """
@@ -613,10 +900,35 @@ class Trade:
         self.sl_trail_peak: Optional[float] = (
             self.entry_price if self.sl_trail_activated else None
         )
+        self.liquidation_price: Optional[float] = None
         self.data: Data = Data(
             self.size, self.entry_price, self.direction, self.comment
         )
 
+    def get_state(self) -> dict:
+        """Plain-value copy of the trade and its data, without shared references"""
+        state: dict = _plain_copy(
+            self.__dict__, ("config", "funds", "tracking", "calc", "taker_fee", "data")
+        )
+        state["data"] = _plain_copy(self.data.__dict__)
+        return state
+
+    @classmethod
+    def from_state(
+        cls, state: dict, config: Config, funds: Funds, tracking: Tracking
+    ) -> "Trade":
+        """Rebuild a trade from get_state onto the given config, funds and tracker"""
+        trade: Trade = cls.__new__(cls)
+        trade.__dict__.update(_plain_copy(state, ("data",)))
+        trade.config = config
+        trade.funds = funds
+        trade.tracking = tracking
+        trade.calc = Calculations()
+        trade.taker_fee = config.taker_fee
+        trade.data = Data.__new__(Data)
+        trade.data.__dict__.update(_plain_copy(state["data"]))
+        return trade
+
     def calc_open_fee(self, size: float, price: float, fee: Fee) -> float:
         """
         Calculates the open fee for the trade.
@@ -630,7 +942,7 @@ class Trade:
             float: The open fee for the trade.
         """
 
-        return fee.calculate(size, price)
+        return fee.calculate(abs(size), price)
 
     def set_tp(
         self,
@@ -675,13 +987,7 @@ class Trade:
             -self.size * self.tp_size_pct if self.tp_enabled else 0.0
         )
         self.tp_size_weight: float = (
-            (
-                -self.size
-                * self.tp_size_pct
-                * (tp_size_weight or self.config.tp_size_weight)
-            )
-            if self.tp_enabled
-            else 0.0
+            tp_size_weight or self.config.tp_size_weight if self.tp_enabled else 0.0
         )
         self.tp_sizes: Optional[List[float]] = (
             self.calc_tp_sizes() if self.tp_enabled else None
@@ -709,19 +1015,32 @@ class Trade:
 
     def calc_tp_sizes(self) -> List[float]:
         """
-        Calculates the take profit sizes for the trade.
+        Calculates the take profit sizes for the trade, the share of the take profit
+        size every target closes, weighted by tp_size_weight ** target.
 
         Returns:
             List[float]: A list of take profit sizes.
         """
-
+        if not self.tp_targets_count:
+            return []
         return self.calc.scaled_sizes(
-            self.tp_size_total,
-            self.tp_targets_count,
-            self.tp_size_weight,
-            self.config.ord_minimum_size,
+            abs(self.tp_size_total), self.tp_targets_count, self.tp_size_weight, 0.0
         )
 
+    def pop_tp(self) -> float:
+        """
+        Drops the next take profit target.
+
+        Returns:
+            float: The size the target closes, all that is left at the last target
+                when the take profit covers the whole trade.
+        """
+        self.tp_targets.pop(0)
+        if not self.tp_sizes:
+            return self.tp_size_total
+        size: float = self.tp_sizes.pop(0)
+        return self.size if not self.tp_targets and self.tp_size_pct >= 1 else size
+
     def update_max_draw_down(self, price: float) -> float:
         """
         Updates the maximum drawdown for the trade.
@@ -733,9 +1052,10 @@ class Trade:
             float: The maximum drawdown for the trade.
         """
 
-        self.data.max_draw_down = (
-            min(self.data.max_draw_down, self.calc_profit(price)) / self.value
-        )
+        if self.value:
+            self.data.max_draw_down = min(
+                self.data.max_draw_down, self.calc_profit(price) / abs(self.value)
+            )
         return self.data.max_draw_down
 
     def update_max_runup(self, price: float) -> float:
@@ -749,9 +1069,10 @@ class Trade:
             float: The maximum runup for the trade.
         """
 
-        self.data.max_run_up = (
-            max(self.data.max_run_up, self.calc_profit(price)) / self.value
-        )
+        if self.value:
+            self.data.max_run_up = max(
+                self.data.max_run_up, self.calc_profit(price) / abs(self.value)
+            )
         return self.data.max_run_up
 
     def get_fees(self, price: float) -> float:
@@ -765,7 +1086,7 @@ class Trade:
         float: The fees for the trade.
         """
 
-        self.data.open_fees = self.taker_fee.calculate(self.size, price)
+        self.data.open_fees = self.taker_fee.calculate(abs(self.size), price)
         return self.data.open_fees
 
 
@@ -810,12 +1131,12 @@ class Trade:
         """
         market_order    = close_type== MARKET
         fee_percent     = self.config.taker_fee if market_order else self.config.maker_fee
-        close_amount    = min(abs(size), abs(self.size)) * abs(size) / size
-        close_is_total  = self.size_gte_trade(close_amount)
+        close_amount    = min(abs(size), abs(self.size)) * (1 if self.size > 0 else -1)
+        close_is_total  = abs(close_amount) >= abs(self.size)
         close_profit    = (price - self.entry_price) * close_amount
-        close_commission= abs(close_amount * price * fee_percent.value)
+        close_commission= abs(fee_percent.calculate(close_amount, price))
         close_net_profit= close_profit - close_commission
-        close_margin    = (close_amount * self.entry_price) / self.leverage
+        close_margin    = abs(close_amount) * self.entry_price / self.leverage
 
         # Correctly update gross profit/loss in the Data object
         if close_profit > 0:
@@ -829,8 +1150,9 @@ class Trade:
         self.funds.margin   -= close_margin
         self.funds.balance  += close_margin + close_net_profit
         self.size           -= close_amount
+        self.config.record_volume(abs(close_amount) * price)
         self.value          =  self.size * self.entry_price
-        self.margin         =  self.value / self.leverage
+        self.margin         =  abs(self.value) / self.leverage
 
         if close_is_total:
             self.data.exit_type = close_type
@@ -850,7 +1172,7 @@ class Trade:
 
         self.size = size
         self.value = self.size * price
-        self.margin = self.value / self.leverage
+        self.margin = self.calc_margin(size, self.leverage, price)
         self.data.entry_price = price
         self.data.entry_time = time.time()
         self.data.entry_comment = comment
@@ -898,12 +1220,29 @@ class Trade:
         """
         return abs(size) * entry_price / leverage
 
+    def calc_liquidation_price(self, maintenance: float) -> Optional[float]:
+        """
+        The isolated margin liquidation price, where the trade's loss leaves only the
+        maintenance margin of its value. None when the trade can't be liquidated.
+        """
+        if self.size > 0:
+            price: float = self.entry_price * (1 - 1 / self.leverage)
+            price /= 1 - maintenance
+        else:
+            price = self.entry_price * (1 + 1 / self.leverage) / (1 + maintenance)
+        self.liquidation_price = price if price > 0 else None
+        return self.liquidation_price
+
+    def update_excursion(self, price: float) -> None:
+        value: float = abs(self.value)
+        excursion: float = self.calc_profit(price) / value if value else 0.0
+        self.data.max_draw_down = min(self.data.max_draw_down, excursion)
+        self.data.max_run_up = max(self.data.max_run_up, excursion)
+
     def update(self, price: float):
         if self.status != "open":
             return
-        self.update_max_draw_down(price)
-        self.update_max_runup(price)
-        self.calc_profit(price)
+        self.update_excursion(price)
 
         if self.sl_trail_enabled and self.sl_trail_dist:
             self.update_sl_trail(price)
@@ -916,8 +1255,7 @@ class Trade:
                 or (self.size <= 0 and price < self.tp_targets[0])
             )
         ):
-            self.close_trade_calc(self.tp_size_total, price, TAKE_PROFIT, "take profit")
-            self.tp_targets.pop(0)
+            self.close_trade_calc(self.pop_tp(), price, TAKE_PROFIT, "take profit")
 
         if self.sl_enabled and (
             (self.size > 0 and price < self.entry_price * (1 - self.sl_dist))
@@ -925,6 +1263,98 @@ class Trade:
         ):
             self.close_trade_calc(self.size, price, TRAILING_STOP, "trailing stop")
 
+    def update_bar(
+        self, open: float, high: float, low: float, close: float, path: str
+    ) -> None:
+        """
+        Resolves the exits of one OHLC bar.
+
+        The bar is walked as open, one extreme, the other, then close, in the order
+        given by path. A gap beyond a level fills at the open like a tick would, a
+        level crossed inside the bar fills at the level's price.
+
+        Args:
+            open (float): The bar open.
+            high (float): The bar high.
+            low (float): The bar low.
+            close (float): The bar close.
+            path (str): HIGH_FIRST, LOW_FIRST, NEAREST_FIRST or ADVERSE_FIRST.
+        """
+        self.update(open)
+        if path == NEAREST_FIRST:
+            high_first: bool = high - open < open - low
+        elif path == ADVERSE_FIRST:
+            high_first = self.size <= 0
+        else:
+            high_first = path == HIGH_FIRST
+        start: float = open
+        for end in (high, low, close) if high_first else (low, high, close):
+            if self.status != OPEN:
+                return
+            self.update_leg(start, end)
+            start = end
+
+    def update_leg(self, start: float, end: float) -> None:
+        """Moves the price straight from start to end, filling the levels in between"""
+        if end == start:
+            return
+        is_long: bool = self.size > 0
+        if (end > start) == is_long:
+            # towards profit: take profit targets, then the trailing stop's peak
+            while (
+                self.status == OPEN
+                and self.tp_enabled
+                and self.tp_targets
+                and (end > self.tp_targets[0] if is_long else end < self.tp_targets[0])
+            ):
+                target: float = self.tp_targets[0]
+                target = max(target, start) if is_long else min(target, start)
+                self.update_excursion(target)
+                self.close_at(self.pop_tp(), target, TAKE_PROFIT, "take profit")
+            if self.status == OPEN and self.sl_trail_enabled and self.sl_trail_dist:
+                self.sl_trail_activated = self.sl_trail_activated or (
+                    end > self.entry_price * (1 + self.sl_trigger_pct)
+                    if is_long
+                    else end < self.entry_price * (1 - self.sl_trigger_pct)
+                )
+                self.sl_trail_peak = (
+                    max(self.sl_trail_peak or end, end)
+                    if is_long
+                    else min(self.sl_trail_peak or end, end)
+                )
+        else:
+            # against the trade: the nearest of the stop loss and the trailing stop
+            levels: List[float] = []
+            if self.sl_enabled:
+                levels.append(
+                    self.entry_price * (1 - self.sl_dist)
+                    if is_long
+                    else self.entry_price * (1 + self.sl_dist)
+                )
+            if self.sl_trail_activated and self.sl_trail_dist and self.sl_trail_peak:
+                levels.append(
+                    self.sl_trail_peak * (1 - self.sl_trail_dist)
+                    if is_long
+                    else self.sl_trail_peak * (1 + self.sl_trail_dist)
+                )
+            hit: List[float] = [
+                level for level in levels if (end < level if is_long else end > level)
+            ]
+            if hit:
+                level: float = min(max(hit), start) if is_long else max(min(hit), start)
+                self.update_excursion(level)
+                self.close_at(self.size, level, TRAILING_STOP, "trailing stop")
+        if self.status == OPEN:
+            self.update_excursion(end)
+
+    def close_at(
+        self, size: float, price: float, close_type: str, comment: str
+    ) -> None:
+        """close_trade_calc, with the exit price of a total close set to the fill"""
+        self.close_trade_calc(size, price, close_type, comment)
+        if self.status != OPEN:
+            self.data.exit_price = price
+
     def update_sl_trail(self, price: float) -> None:
         trigger_condition: bool = (
             (price > self.entry_price * (1 + self.sl_trigger_pct))
@@ -948,66 +1378,573 @@ class Trade:
         ):
             self.close_trade_calc(self.size, price, TRAILING_STOP, "trailing stop")
 
-    def update_on_trade(self) -> None:
-        """
-        Updates the trade tracker after a trade is closed.
-        """
-        self.tracking.total_trades += 1
-        if self.data.net_profit > 0:
-            self.tracking.total_winning_trades += 1
-            self.tracking.consecutive_wins += 1
-            self.tracking.consecutive_losses = 0  # Reset consecutive losses
+
+class EquityRecorder:
+    """
+    Per-update record of the account, kept in a preallocated float64 buffer.
+
+    Every ``every`` updates one row of FIELDS is written. The buffer doubles when full,
+    and can be backed by a memory-mapped file so long runs don't have to fit in RAM.
+    A file backed buffer is remapped when it grows and when it is closed, so arrays
+    from curve and column are only valid until then; copy them to keep them.
+
+    Attributes:
+        every (int): Record one row every this many updates.
+        path (str): The backing file, None for an in-memory buffer.
+        buffer (np.ndarray): The (capacity, len(FIELDS)) row buffer.
+        count (int): The number of rows recorded.
+    """
+
+    FIELDS = CURVE_FIELDS
+
+    def __init__(
+        self, every: int = 1, capacity: int = 4096, path: Optional[str] = None
+    ):
+        self.every: int = max(1, every)
+        self.path: Optional[str] = path
+        self.count: int = 0
+        self.updates: int = 0
+        self.buffer: np.ndarray = self._allocate(max(1, capacity))
+
+    def _allocate(self, capacity: int) -> np.ndarray:
+        shape: Tuple[int, int] = (capacity, len(self.FIELDS))
+        if self.path is None:
+            return np.empty(shape)
+        mode: str = "r+" if self.count else "w+"
+        if self.count:
+            self.buffer.flush()
+            del self.buffer
+            os.truncate(self.path, capacity * len(self.FIELDS) * 8)
+        return np.memmap(self.path, dtype=np.float64, mode=mode, shape=shape)
+
+    def _grow(self) -> None:
+        capacity: int = len(self.buffer) * 2
+        if self.path is None:
+            grown: np.ndarray = np.empty((capacity, len(self.FIELDS)))
+            grown[: self.count] = self.buffer[: self.count]
+            self.buffer = grown
         else:
-            self.tracking.total_losing_trades += 1
-            self.tracking.consecutive_losses += 1
-            self.tracking.consecutive_wins = 0  # Reset consecutive wins
+            self.buffer = self._allocate(capacity)
 
-        self.tracking.gross_profit += max(0.0, self.data.gross_profit)
-        self.tracking.gross_loss += min(0.0, self.data.gross_loss)
-        self.tracking.commission_paid += self.data.commission
-        self.tracking.net_profit += self.data.net_profit
+    def record(self, strategy: "Strategy") -> None:
+        """
+        Records the state of a strategy's funds, if this update is due.
 
-        self.tracking.percent_profitable = (
-            self.tracking.total_winning_trades / self.tracking.total_trades
-        )
-        self.tracking.max_consecutive_wins = max(
-            self.tracking.max_consecutive_wins, self.tracking.consecutive_wins
-        )
-        self.tracking.max_consecutive_losses = max(
-            self.tracking.max_consecutive_losses, self.tracking.consecutive_losses
-        )
-        self.tracking.avg_win = (
-            self.tracking.gross_profit / self.tracking.total_winning_trades
-            if self.tracking.total_winning_trades > 0
-            else 0.0
-        )
-        self.tracking.avg_loss = (
-            self.tracking.gross_profit / self.tracking.total_losing_trades
-            if self.tracking.total_losing_trades > 0
-            else 0.0
-        )
-        self.tracking.avg_profit_per_trade = (
-            self.tracking.net_profit / self.tracking.total_trades
+        Args:
+            strategy (Strategy): The strategy that was just updated.
+        """
+        self.updates += 1
+        if (self.updates - 1) % self.every:
+            return
+        if self.count == len(self.buffer):
+            self._grow()
+        funds: Funds = strategy.funds
+        self.buffer[self.count] = (
+            strategy.time,
+            strategy.bar_index,
+            strategy.price,
+            funds.equity,
+            funds.balance,
+            funds.margin,
+            funds.open_profit,
         )
-        self.tracking.win_loss_ratio = (
-            self.tracking.total_winning_trades / self.tracking.total_losing_trades
-            if self.tracking.total_losing_trades > 0
-            else 0.0
+        self.count += 1
+
+    @property
+    def curve(self) -> np.ndarray:
+        """The recorded rows, a view valid until the buffer next grows or closes."""
+        return self.buffer[: self.count]
+
+    def column(self, name: str) -> np.ndarray:
+        """One field of the recorded rows, a view like curve."""
+        return self.buffer[: self.count, self.FIELDS.index(name)]
+
+    def downsample(self, buckets: int, field: str = "equity") -> np.ndarray:
+        """
+        Reduces the curve to at most two rows per bucket, keeping each bucket's lowest
+        and highest value of a field so drawdowns and peaks survive the reduction.
+
+        Args:
+            buckets (int): The number of equal-width buckets.
+            field (str, optional): The field whose extremes are kept.
+                Defaults to "equity".
+
+        Returns:
+            np.ndarray: The kept rows in their original order.
+        """
+        if self.count <= 2 * buckets:
+            return self.curve.copy()
+        width: int = -(-self.count // buckets)
+        buckets = -(-self.count // width)  # the last ones may have nothing to hold
+        padded: np.ndarray = np.zeros(buckets * width, dtype=bool)
+        padded[self.count :] = True
+        padded = padded.reshape(buckets, width)
+        values: np.ndarray = np.zeros(buckets * width)
+        values[: self.count] = self.column(field)
+        values = values.reshape(buckets, width)
+        starts: np.ndarray = np.arange(buckets) * width
+        keep: np.ndarray = np.concatenate(
+            (
+                starts + np.argmin(np.where(padded, np.inf, values), axis=1),
+                starts + np.argmax(np.where(padded, -np.inf, values), axis=1),
+            )
         )
-        self.tracking.profit_factor = (
-            self.tracking.avg_win / self.tracking.avg_loss
-            if self.tracking.avg_loss > 0
-            else 0.0
+        return self.curve[np.unique(keep)]
+
+    def close(self) -> None:
+        """Trims a file backed buffer to the recorded rows and flushes it."""
+        if self.path is None:
+            return
+        self.buffer.flush()
+        del self.buffer
+        os.truncate(self.path, self.count * len(self.FIELDS) * 8)
+        self.buffer = np.empty((0, len(self.FIELDS)))
+
+    def copy(self) -> "EquityRecorder":
+        """In-memory copy of the recorder and the rows recorded so far."""
+        recorder: EquityRecorder = EquityRecorder(self.every, max(1, self.count * 2))
+        recorder.buffer[: self.count] = self.curve
+        recorder.count = self.count
+        recorder.updates = self.updates
+        return recorder
+
+    @classmethod
+    def load(cls, path: str) -> np.ndarray:
+        """Reads the rows of a closed file backed recorder."""
+        return np.fromfile(path, dtype=np.float64).reshape(-1, len(cls.FIELDS))
+
+
+class OrderQueue:
+    """
+    Submission queue for orders coming from other threads.
+
+    Producers append (action, order or id, fields) commands and the engine thread
+    drains them in batches. Appending to and popping from opposite ends of a deque
+    are atomic in CPython, so neither side takes a lock.
+    """
+
+    def __init__(self):
+        self.commands: deque = deque()
+
+    def put(self, action: str, target, fields: Optional[dict] = None) -> None:
+        self.commands.append((action, target, fields))
+
+    def drain(self, limit: Optional[int] = None) -> List[tuple]:
+        """
+        Pops the commands queued so far, in submission order.
+
+        Args:
+            limit (int, optional): The most commands to pop. Defaults to all queued.
+
+        Returns:
+            list: The popped (action, target, fields) commands.
+        """
+        count: int = len(self.commands)
+        if limit is not None:
+            count = min(limit, count)
+        popleft = self.commands.popleft
+        return [popleft() for _ in range(count)]
+
+    def __len__(self) -> int:
+        return len(self.commands)
+
+
+class LiquidationIndex:
+    """
+    Liquidation levels of the open trades, ordered by price.
+
+    Isolated trades each sit in a heap, longs by their highest liquidation price
+    and shorts by their lowest, so a tick only compares the price against the two
+    heap tops. Trades that close or get repriced aren't removed from the heaps; only
+    the entry with the trade's latest sequence number is live, the others are
+    dropped when they reach the top. Cross margin has a single account level,
+    recomputed only after the open trades changed.
+
+    Attributes:
+        longs (list): Max-heap of (-price, sequence, trade).
+        shorts (list): Min-heap of (price, sequence, trade).
+        live (dict): The sequence of the live entry of every indexed trade, by id().
+        account_price (float): The cross margin liquidation price, None without one.
+        account_below (bool): Whether the account liquidates below account_price.
+        dirty (bool): The account level must be recomputed.
+    """
+
+    def __init__(self):
+        self.longs: List[Tuple[float, int, Trade]] = []
+        self.shorts: List[Tuple[float, int, Trade]] = []
+        self.sequence: int = 0
+        self.live: Dict[int, int] = {}
+        self.account_price: Optional[float] = None
+        self.account_below: bool = True
+        self.dirty: bool = False
+
+    def add(self, trade: Trade, maintenance: float) -> None:
+        """Index a new or changed trade, any older entry of it becomes stale"""
+        price: Optional[float] = trade.calc_liquidation_price(maintenance)
+        self.dirty = True
+        self.sequence += 1
+        if price is None:
+            self.live.pop(id(trade), None)
+            return
+        self.live[id(trade)] = self.sequence
+        if trade.size > 0:
+            heapq.heappush(self.longs, (-price, self.sequence, trade))
+        else:
+            heapq.heappush(self.shorts, (price, self.sequence, trade))
+
+    def rebuild(self, trades: List[Trade], maintenance: float) -> None:
+        self.longs, self.shorts, self.live = [], [], {}
+        for trade in trades:
+            self.add(trade, maintenance)
+
+    def _valid(self, entry: Tuple[float, int, Trade]) -> bool:
+        _, sequence, trade = entry
+        return trade.status == OPEN and self.live.get(id(trade)) == sequence
+
+    def nearest(self) -> Tuple[Optional[float], Optional[float]]:
+        """The highest long and lowest short liquidation prices"""
+        for heap in (self.longs, self.shorts):
+            while heap and not self._valid(heap[0]):
+                _, sequence, trade = heapq.heappop(heap)
+                if self.live.get(id(trade)) == sequence:
+                    del self.live[id(trade)]  # the trade closed without liquidating
+        return (
+            -self.longs[0][0] if self.longs else None,
+            self.shorts[0][0] if self.shorts else None,
         )
-        self.tracking.current_balance = (
-            self.tracking.starting_balance + self.tracking.net_profit
+
+    def due(self, low: float, high: float) -> List[Tuple[float, Trade]]:
+        """
+        Pops the isolated trades liquidated by prices between low and high.
+
+        Returns:
+            list: (liquidation price, trade) pairs, nearest levels first.
+        """
+        hits: List[Tuple[float, Trade]] = []
+        long_top, short_top = self.nearest()
+        while long_top is not None and low <= long_top:
+            trade: Trade = heapq.heappop(self.longs)[2]
+            del self.live[id(trade)]
+            hits.append((long_top, trade))
+            long_top = self.nearest()[0]
+        while short_top is not None and high >= short_top:
+            trade = heapq.heappop(self.shorts)[2]
+            del self.live[id(trade)]
+            hits.append((short_top, trade))
+            short_top = self.nearest()[1]
+        return hits
+
+    def reprice_account(self, trades: List[Trade], equity: float, maintenance: float):
+        """
+        Recomputes the cross margin level, the price where the equity with the open
+        profit of every trade falls to the maintenance margin of their value.
+        """
+        self.dirty = False
+        net: float = sum(t.size for t in trades)
+        gross: float = sum(abs(t.size) for t in trades)
+        cost: float = sum(t.size * t.entry_price for t in trades)
+        slope: float = net - maintenance * gross
+        level: float = (cost - equity) / slope if slope else 0.0
+        self.account_below = slope > 0
+        self.account_price = level if trades and slope and level > 0 else None
+
+    def account_due(self, low: float, high: float) -> bool:
+        if self.account_price is None:
+            return False
+        return low <= self.account_price if self.account_below else (
+            high >= self.account_price
         )
-        self.tracking.peak_balance = max(
-            self.tracking.peak_balance, self.tracking.current_balance
+
+
+# one L2 book change per record, size 0 removes the level; a record with side 0
+# starts a snapshot, clearing the book before the levels that follow it
+BOOK_EVENT = np.dtype(
+    [("time", "<f8"), ("side", "i1"), ("price", "<f8"), ("size", "<f8")]
+)
+BID = 1
+ASK = -1
+
+
+class OrderBook:
+    """
+    Level-2 order book of price levels and their resting sizes.
+
+    Each side keeps its prices in an ascending list searched with bisect, and the
+    sizes in a dict. Changing the size of an existing level is an O(1) dict write.
+    New and emptied levels are found in O(log n) but cost an O(n) shift of the
+    list, a memmove that stays cheap at the depth of a replayed book and keeps the
+    best levels in order for walk().
+
+    Attributes:
+        bids (dict): Size by bid price.
+        asks (dict): Size by ask price.
+        bid_prices (list): The bid prices, ascending, the best last.
+        ask_prices (list): The ask prices, ascending, the best first.
+    """
+
+    def __init__(self):
+        self.bids: Dict[float, float] = {}
+        self.asks: Dict[float, float] = {}
+        self.bid_prices: List[float] = []
+        self.ask_prices: List[float] = []
+
+    def clear(self) -> None:
+        self.bids.clear()
+        self.asks.clear()
+        self.bid_prices.clear()
+        self.ask_prices.clear()
+
+    def set(self, side: int, price: float, size: float) -> None:
+        """Sets the resting size of a BID or ASK level, removing it at 0"""
+        levels: Dict[float, float] = self.bids if side == BID else self.asks
+        prices: List[float] = self.bid_prices if side == BID else self.ask_prices
+        if size > 0:
+            if price not in levels:
+                bisect.insort(prices, price)
+            levels[price] = size
+        elif price in levels:
+            del levels[price]
+            del prices[bisect.bisect_left(prices, price)]
+
+    def apply(self, sides: List[int], prices: List[float], sizes: List[float]) -> None:
+        """Applies a run of book events in order"""
+        for side, price, size in zip(sides, prices, sizes):
+            if side == 0:
+                self.clear()
+            else:
+                self.set(side, price, size)
+
+    def get_state(self) -> dict:
+        return {
+            "bids": [[p, self.bids[p]] for p in self.bid_prices],
+            "asks": [[p, self.asks[p]] for p in self.ask_prices],
+        }
+
+    @classmethod
+    def from_state(cls, state: dict) -> "OrderBook":
+        book: OrderBook = cls()
+        book.bids = {p: s for p, s in state["bids"]}
+        book.asks = {p: s for p, s in state["asks"]}
+        book.bid_prices = [p for p, _ in state["bids"]]
+        book.ask_prices = [p for p, _ in state["asks"]]
+        return book
+
+    def best_bid(self) -> Optional[float]:
+        return self.bid_prices[-1] if self.bid_prices else None
+
+    def best_ask(self) -> Optional[float]:
+        return self.ask_prices[0] if self.ask_prices else None
+
+    def walk(
+        self,
+        side: str,
+        size: float,
+        limit: Optional[float] = None,
+        consume: bool = False,
+    ) -> Tuple[float, float]:
+        """
+        Fills an order against the opposite side of the book, best level first.
+
+        Args:
+            side (str): BUY takes the asks, SELL takes the bids.
+            size (float): The size to fill.
+            limit (float, optional): The worst price to fill at. Defaults to None.
+            consume (bool, optional): Take the filled sizes out of the book, until
+                the replay next sets those levels. Defaults to False.
+
+        Returns:
+            tuple: The filled size and its average price, 0 and 0 without a fill.
+        """
+        buying: bool = side == BUY
+        levels: Dict[float, float] = self.asks if buying else self.bids
+        prices: List[float] = self.ask_prices if buying else self.bid_prices
+        rest: float = size
+        cost: float = 0.0
+        taken: int = 0
+        count: int = len(prices)
+        while rest > 0 and taken < count:
+            price: float = prices[taken] if buying else prices[count - 1 - taken]
+            if limit is not None and (price > limit if buying else price < limit):
+                break
+            fill: float = min(rest, levels[price])
+            cost += fill * price
+            rest -= fill
+            if consume and fill < levels[price]:
+                levels[price] -= fill
+                break
+            taken += 1
+        if consume and taken:
+            for price in prices[:taken] if buying else prices[count - taken :]:
+                del levels[price]
+            if buying:
+                del prices[:taken]
+            else:
+                del prices[count - taken :]
+        filled: float = size - rest
+        return filled, cost / filled if filled else 0.0
+
+
+class BookReplay:
+    """
+    Replays a file of BOOK_EVENT records into an OrderBook.
+
+    The records are memory-mapped and applied in time order, one run of records per
+    advance, so the replay keeps pace with the bars driving the strategy.
+
+    Attributes:
+        events (np.ndarray): The BOOK_EVENT records, ascending by time.
+        book (OrderBook): The book in its replayed state.
+        position (int): The index of the next record to apply.
+    """
+
+    def __init__(self, events: Union[str, np.ndarray]):
+        self.events: np.ndarray = (
+            np.load(events, mmap_mode="r") if isinstance(events, str) else events
         )
-        self.tracking.low_balance = min(
-            self.tracking.low_balance, self.tracking.current_balance
+        if self.events.dtype != BOOK_EVENT:
+            raise ValueError(f"Book events must have the dtype {BOOK_EVENT}")
+        self.times: np.ndarray = np.ascontiguousarray(self.events["time"])
+        self.book: OrderBook = OrderBook()
+        self.position: int = 0
+
+    @staticmethod
+    def write(path: str, events: np.ndarray) -> None:
+        """Saves book events, sorted by time, as a .npy file for replay"""
+        events = np.asarray(events, dtype=BOOK_EVENT)
+        np.save(path, events[np.argsort(events["time"], kind="stable")])
+
+    def advance(self, time_is: float) -> int:
+        """
+        Applies every record up to and including a time.
+
+        Returns:
+            int: The number of records applied.
+        """
+        stop: int = int(np.searchsorted(self.times, time_is, side="right"))
+        if stop > self.position:
+            chunk: np.ndarray = self.events[self.position : stop]
+            self.book.apply(
+                chunk["side"].tolist(), chunk["price"].tolist(), chunk["size"].tolist()
+            )
+        applied: int = stop - self.position
+        self.position = max(stop, self.position)
+        return applied
+
+
+class TimingWheel:
+    """
+    Hierarchical timing wheel of expiries, keyed by simulated time.
+
+    Times are counted in ticks of ``resolution`` seconds. Level 0 has one slot per
+    tick of the current rotation, and each level above covers ``slots`` rotations of
+    the one below per slot. An entry sits at the lowest level whose span still holds
+    its tick. Entries cascade one level down when their slot comes up, so advancing
+    the clock only touches the slots it passes, and stretches with nothing
+    scheduled at a level are skipped whole.
+
+    A time is due at the first tick at or after it, so an item comes due up to one
+    ``resolution`` after its time, never before it.
+
+    Attributes:
+        resolution (float): The seconds per tick.
+        bits (int): log2 of the slots per level.
+        wheels (list): Per level, the slots of (tick, item) entries.
+        overflow (list): Entries beyond the top level.
+        current (int): The last tick processed.
+        count (int): The entries scheduled.
+    """
+
+    def __init__(
+        self, resolution: float = 1.0, bits: int = 6, levels: int = 6, now: float = 0.0
+    ):
+        if levels < 1 or bits < 1:
+            raise ValueError("A timing wheel needs at least one level of two slots")
+        self.resolution: float = resolution
+        self.bits: int = bits
+        self.slots: int = 1 << bits
+        self.mask: int = self.slots - 1
+        self.wheels: List[List[List[tuple]]] = [
+            [[] for _ in range(self.slots)] for _ in range(levels)
+        ]
+        self.sizes: List[int] = [0] * levels
+        self.overflow: List[tuple] = []
+        self.current: int = int(now // resolution)
+        self.count: int = 0
+
+    def schedule(self, when: float, item) -> None:
+        """Schedules an item to come due once the clock reaches a time"""
+        self.count += 1
+        tick: int = max(math.ceil(when / self.resolution), self.current + 1)
+        self._insert(tick, item, self.current)
+
+    def _insert(self, tick: int, item, reference: int) -> None:
+        level: int = 0
+        while level < len(self.wheels) and (tick >> (self.bits * (level + 1))) != (
+            reference >> (self.bits * (level + 1))
+        ):
+            level += 1
+        if level == len(self.wheels):
+            self.overflow.append((tick, item))
+            return
+        self.wheels[level][(tick >> (self.bits * level)) & self.mask].append(
+            (tick, item)
         )
+        self.sizes[level] += 1
+
+    def _cascade(self, tick: int) -> None:
+        """Moves the slots starting at a rotation boundary down, top level first"""
+        levels: int = len(self.wheels)
+        if not tick & ((1 << (self.bits * levels)) - 1) and self.overflow:
+            entries, self.overflow = self.overflow, []
+            for due, item in entries:
+                self._insert(due, item, tick)
+        top: int = min(1, levels - 1)
+        while top + 1 < levels and not tick & ((1 << (self.bits * (top + 1))) - 1):
+            top += 1
+        for level in range(top, 0, -1):
+            slot: int = (tick >> (self.bits * level)) & self.mask
+            entries = self.wheels[level][slot]
+            if entries:
+                self.wheels[level][slot] = []
+                self.sizes[level] -= len(entries)
+                for due, item in entries:
+                    self._insert(due, item, tick)
+
+    def advance(self, now: float) -> list:
+        """
+        Moves the clock to a time.
+
+        Returns:
+            list: The items that came due, in due order.
+        """
+        target: int = int(now // self.resolution)
+        due: list = []
+        while self.current < target and self.count:
+            tick: int = self.current + 1
+            if not tick & self.mask:
+                self._cascade(tick)
+            entries: List[tuple] = self.wheels[0][tick & self.mask]
+            if entries:
+                self.wheels[0][tick & self.mask] = []
+                self.sizes[0] -= len(entries)
+                self.count -= len(entries)
+                due.extend(item for _, item in entries)
+            self.current = tick
+            # skip to the next boundary of the lowest level holding entries
+            level: int = next(
+                (k for k, size in enumerate(self.sizes) if size), len(self.sizes)
+            )
+            if level:
+                span: int = (1 << (self.bits * level)) - 1
+                self.current = min(target, tick | span)
+        if not self.count:
+            self.current = max(self.current, target)
+        return due
+
+
+def direction_sign(side: str) -> float:
+    """1 for a LONG or BUY side, -1 for a SHORT or SELL one, the sign of its size"""
+    return 1.0 if side in (LONG, BUY) else -1.0
 
 
 class Strategy:
@@ -1018,7 +1955,13 @@ class Strategy:
         self.tracking: Tracking = tracking
         self.closed_trades: List[Trade] = []
         self.open_trades: List[Trade] = []
-        self.open_orders: List[Order] = []
+        self.open_orders: Dict[str, Order] = {}  # by id, in placing order
+        self.submissions: OrderQueue = OrderQueue()
+        self.recorder: Optional[EquityRecorder] = None
+        self.liquidations: LiquidationIndex = LiquidationIndex()
+        self.book: Optional[OrderBook] = None  # fills walk this book when set
+        self.expiries: TimingWheel = TimingWheel(config.expiry_resolution)
+        self.time: float = 0.0
         self.bar_index: int = 0
         self.order_ids: int = 0
         self.trade_ids: int = 0
@@ -1029,15 +1972,18 @@ class Strategy:
         """
         trades: List[Trade] = self.open_trades
         if len(self.open_trades) > 0:
-            self.funds.pending_fees = sum(
-                t.taker_fee.calculate(abs(t.size), self.price) for t in trades
+            sizes: List[float] = [t.size for t in trades]
+            self.funds.pending_fees = self.config.taker_fee.calculate_total(
+                sizes, self.price
             )
             self.funds.margin = sum(t.margin for t in trades)
             self.funds.open_profit = sum(
                 t.size * (self.price - t.entry_price) for t in trades
             )
-        if len(self.open_orders) > 0:
-            self.funds.pending_margin = sum(o.margin for o in self.open_orders)
+        else:
+            self.funds.pending_fees = 0.0
+            self.funds.open_profit = 0.0
+        self.funds.pending_margin = sum(o.margin for o in self.open_orders.values())
         self.funds.balance = (
             self.funds.open_profit
             + self.funds.equity
@@ -1049,51 +1995,6 @@ class Strategy:
             else 0
         )
 
-    def max_draw_down(self) -> float:
-        trades: List[Trade] = self.open_trades
-        self.tracking.max_draw_down = min(
-            self.tracking.max_draw_down,
-            sum(t.calc_profit(self.price) for t in trades),
-        )
-        return self.tracking.max_draw_down
-
-    def max_run_up(self) -> float:
-        trades: List[Trade] = self.open_trades
-        self.tracking.max_run_up = max(
-            self.tracking.max_draw_down,
-            sum(t.calc_profit(self.price) for t in trades),
-        )
-        return self.tracking.max_run_up
-
-    def avg_win(self) -> float:
-        """returns the average win amount, adds up win amounts of winning trades from closed trades
-        and divides by the number of wins"""
-        wins: int = 0
-        win_amount: float = 0.0
-        for trade in self.closed_trades:
-            prof: float = trade.data.net_profit
-            wins += 1 if prof > 0 else 0
-            win_amount += max(prof, 0)
-        return win_amount / wins if wins > 0 else 0
-
-    def avg_loss(self) -> float:
-        """returns the average loss amount, adds up loss amounts of losing trades from closed trades
-        and divides by the number of losses"""
-        losses: int = 0
-        loss_amount: float = 0.0
-        for trade in self.closed_trades:
-            prof: float = trade.data.net_profit
-            losses += 1 if prof < 0 else 0
-            loss_amount += min(prof, 0)
-        return loss_amount / losses if losses > 0 else 0
-
-    def win_loss_ratio(self) -> float:
-        return (
-            self.avg_win() / self.avg_loss()
-            if self.avg_win() > 0 and self.avg_loss() > 0
-            else 0.0
-        )
-
     def restrict_size(self, size: float, price: float, leverage: float) -> float:
         """Restrict the size of an order to the max order allowed by the config and within position max size"""
         # convert size to usd for max_position_size and get the lesser of the difference or the size limit
@@ -1117,66 +2018,71 @@ class Strategy:
         max_funds_net_fee: float = max_entry_margin_usd * (
             1 - self.config.taker_fee.value
         )
-        return max_funds_net_fee / price
-
-    def update_tracking_on_close(self, trade: Trade) -> None:
-        """
-        update tracking on close of trade
-
-            current_balance
-            peak_balance
-            low_balance
-            open_trades
-            total_trades
-            total_winning_trades
-            total_losing_trades
-            max_consecutive_wins
-            max_consecutive_losses
-            consecutive_wins
-            consecutive_losses
-            gross_profit
-            gross_loss
-            avg_win
-            avg_loss
-            avg_profit_per_trade
-            win_loss_ratio
-            profit_factor
-            commission_paid
-            max_draw_down
-            max_run_up
-            net_profit
-            percent_profitable
-            net_returns
-
-        """
-        self.tracking.max_draw_down = max(
-            self.tracking.max_draw_down, trade.data.net_profit
-        )
-        self.tracking.max_run_up = max(self.tracking.max_run_up, trade.data.net_profit)
-        self.tracking.gross_profit += trade.data.gross_profit
-        self.tracking.gross_loss += trade.data.gross_loss
-        self.tracking.net_profit += trade.data.net_profit
+        return math.copysign(max_funds_net_fee / price, size)
+
+    def restrict_sizes(
+        self, sizes: np.ndarray, prices: np.ndarray, leverages: np.ndarray
+    ) -> np.ndarray:
+        """
+        Restrict a basket of entries like restrict_size, in one pass, each entry's
+        margin counting against the position limit and balance of the next ones. The
+        sizes keep their signs. With a fee schedule, each entry nets the taker fee of
+        the tier reached by the entries before it.
+        """
+        n: int = len(prices)
+        if n == 0:
+            return np.zeros(0)
+        equity: float = self.funds.equity
+        order_cap: np.ndarray = self.config.max_usd("ord", prices, equity) / leverages
+        sizes = np.asarray(sizes, dtype=np.float64)
+        requested: np.ndarray = np.abs(sizes * prices)
+        wanted: List[float] = np.minimum(order_cap, requested).tolist()
+        room: List[float] = np.minimum(
+            self.config.max_usd("position", prices, equity) / leverages
+            - self.funds.margin,
+            self.funds.balance,
+        ).tolist()
+        used: float = 0.0
+        margins: List[float] = [0.0] * n
+        for k in range(n):
+            margins[k] = max(0.0, min(wanted[k], room[k] - used))
+            used += margins[k]
+        # keep the config's derived limits as restrict_size leaves them
+        self.config.set_max_position(float(prices[-1]), equity)
+        self.config.set_default_order(float(prices[-1]), equity)
+        self.config.set_max_order(float(prices[-1]), equity)
+        values: np.ndarray = np.array(margins) * leverages
+        schedule: Optional[FeeSchedule] = self.config.fee_schedule
+        if schedule is None:
+            values *= 1 - self.config.taker_fee.value
+        else:
+            # each entry nets the taker rate of the tier the ones before it reached
+            volume: float = schedule.volume
+            for k in range(n):
+                values[k] *= 1 - schedule.taker_rates[schedule.tier_of(volume)]
+                volume += values[k]
+        return np.copysign(values / prices, sizes)
 
     def update_trades(self, price) -> None:
         self.price = price
         trades: list[Trade] = self.open_trades
 
-        for t in trades:
+        for t in list(trades):
+            size: float = t.size
             t.update(self.price)
             if t.status == "closed":
-                self.closed_trades.append(t)
-                self.open_trades.remove(t)
-
-        self.funds.open_profit = sum(t.calc_profit(self.price) for t in trades)
-        self.funds.pending_fees = sum(t.get_fees(self.price) for t in trades)
+                self.archive(t)
+            elif t.size != size:
+                self.liquidations.dirty = True
 
-    def update_orders(self) -> None:
+    def update_orders(self, orders: Optional[List[Order]] = None) -> None:
+        """Trigger and fill the open orders, or only the given ones"""
         ids: List[str] = [t.id for t in self.open_trades]
         long_trades: List[Trade] = [t for t in self.open_trades if t.direction == LONG]
         short_trades: List[Trade] = [
             t for t in self.open_trades if t.direction == SHORT
         ]
-        for o in self.open_orders:
+        for o in list(self.open_orders.values() if orders is None else orders):
             id_match: bool = o.id in ids
             direction: str = o.direction
 
@@ -1199,19 +2105,46 @@ class Strategy:
                 self.cancel(o.id)
 
     def update_tracker(self) -> None:
+        """
+        Per update bookkeeping, kept O(1). Closed trade statistics are computed once
+        from the ledger by finalize_tracking. max_draw_down and max_run_up track the
+        extremes of funds.open_profit; for drawdowns of the equity curve as a
+        fraction, see performance_analysis.analyze.
+        """
         tracker: Tracking = self.tracking
-        self.tracking.current_balance = self.funds.balance
-        self.tracking.peak_balance = max(tracker.peak_balance, self.funds.balance)
-        self.tracking.low_balance = min(tracker.low_balance, self.funds.balance)
-        self.tracking.total_trades = len(self.closed_trades) + len(self.open_trades)
-        self.tracking.avg_win = self.avg_win()
-        self.tracking.avg_loss = self.avg_loss()
-        self.tracking.avg_profit_per_trade = (tracker.avg_win + tracker.avg_loss) / 2
-        self.tracking.win_loss_ratio = self.win_loss_ratio()
-        self.tracking.commission_paid = self.funds.commission_paid
-        self.max_draw_down()
-        self.max_run_up()
-        self.profit_factor()
+        tracker.current_balance = self.funds.balance
+        tracker.peak_balance = max(tracker.peak_balance, self.funds.balance)
+        tracker.low_balance = min(tracker.low_balance, self.funds.balance)
+        tracker.open_trades = len(self.open_trades)
+        tracker.total_trades = len(self.closed_trades) + len(self.open_trades)
+        tracker.commission_paid = self.funds.commission_paid
+        tracker.max_draw_down = min(tracker.max_draw_down, self.funds.open_profit)
+        tracker.max_run_up = max(tracker.max_run_up, self.funds.open_profit)
+
+    def trade_ledger(self) -> Dict[str, np.ndarray]:
+        """Closed trade data as one array per field, in closing order"""
+        count: int = len(self.closed_trades)
+        return {
+            field: np.fromiter(
+                (getattr(t.data, field) for t in self.closed_trades),
+                dtype=np.float64,
+                count=count,
+            )
+            for field in LEDGER_FIELDS
+        }
+
+    def finalize_tracking(self) -> Tracking:
+        """Compute the closed trade statistics of the tracker from the ledger"""
+        ledger: Dict[str, np.ndarray] = self.trade_ledger()
+        stats: dict = trade_stats(
+            ledger["net_profit"],
+            ledger["gross_profit"],
+            ledger["gross_loss"],
+            ledger["commission"],
+        )
+        self.tracking.__dict__.update(stats)
+        self.tracking.total_trades += len(self.open_trades)
+        return self.tracking
 
     def profit_factor(self) -> None:
         self.tracking.profit_factor = (
@@ -1220,19 +2153,24 @@ class Strategy:
             else 0.0
         )
 
+    def reserve(self, order: Order) -> None:
+        """Hold a resting order's margin in pending_margin, out of the balance"""
+        self.funds.pending_margin += order.margin
+        self.funds.balance -= order.margin
+
+    def release(self, order: Order) -> None:
+        """Return the margin reserved for an order leaving the open orders"""
+        self.funds.pending_margin -= order.margin
+        self.funds.balance += order.margin
+
     def cancel_all(self) -> None:
-        for o in self.open_orders:
-            self.cancel(o.id)
+        for o in self.open_orders.values():
+            self.release(o)
+        self.open_orders.clear()
 
     def cancel(self, id: str) -> None:
-        for o in self.open_orders:
-            if o.id != id:
-                continue
-            self.open_orders.remove(o)
-            self.funds.margin -= o.margin
-            self.funds.balance += o.margin
-            self.funds.pending_fees -= o.value * self.config.maker_fee.value
-            break
+        if (o := self.open_orders.pop(id, None)) is not None:
+            self.release(o)
 
     @staticmethod
     def size_gte_trade(t: Trade, size: float) -> bool:
@@ -1256,8 +2194,19 @@ class Strategy:
         get values from order and use new_entry to open new trade
         """
         if o.status == IMMEDIATE:
-            self.new_entry(o.side, o.size, o.price, o.leverage, o.comment, o.symbol)
-            self.open_orders.remove(o)
+            limit: Optional[float] = o.price if o.order_type == LIMIT else None
+            self.release(o)  # the entry takes its margin from the balance itself
+            rest: float = self.new_entry(
+                o.side, o.size, o.price, o.leverage, o.comment, o.symbol, limit
+            )
+            if rest > 0:
+                o.size = rest  # the book couldn't fill it all, the rest keeps waiting
+                o.value = o.size * o.price
+                o.margin = o.get_margin()
+                o.status = PENDING
+                self.reserve(o)
+            else:
+                del self.open_orders[o.id]
 
     def new_entry(
         self,
@@ -1267,87 +2216,3360 @@ class Strategy:
         leverage: float,
         comment: str = "",
         symbol: str = "",
-    ) -> None:
-        """Open a new trade with a specified size and type"""
-        size = self.restrict_size(size, price, leverage)  # Restrict size here!
-        trade: Trade = Trade(
-            symbol,
-            self.config,
-            self.funds,
-            self.tracking,
-            direction=side,
-            size=size,  # Use restricted size
-            price=price,
-            leverage=leverage,
-            comment=comment,
-            tp_targets=5,
-            tp_size_pct=0.75,
-            tp_dist_weight=0.5,
-            tp_start=price,
-            tp_end=price * (1 + (0.05 if size > 0 else -0.05)),
-        )
-        trade.open_trade_calc(size, price, comment)
+        limit: Optional[float] = None,
+    ) -> float:
+        """
+        Open a new trade with a specified size and type. Shorts get a negative size,
+        whatever the sign of the one given.
+
+        Returns:
+            float: The size a limit order couldn't fill from the book, 0 otherwise.
+        """
+        sign: float = direction_sign(side)
+        size = self.restrict_size(sign * abs(size), price, leverage)
+        if size == 0:
+            return 0.0  # nothing left to open, a zero value trade can't be tracked
+        wanted: float = abs(size)
+        filled, price = self.fill(BUY if sign > 0 else SELL, wanted, price, limit)
+        if filled == 0:
+            return wanted
+        trade: Trade = self.make_trade(
+            side, sign * filled, price, leverage, comment, symbol
+        )
         self.open_trades.append(trade)
+        self.liquidations.add(trade, self.config.maintenance_margin)
+        self.config.record_volume(filled * price)
+        return wanted - filled
+
+    def fill(
+        self, side: str, size: float, price: float, limit: Optional[float] = None
+    ) -> Tuple[float, float]:
+        """
+        The size and average price a fill gets, at the given price without a book.
+
+        With a book, the fill walks its levels. A limit order takes only the levels
+        up to its limit and may fill partially. A market order always fills in full:
+        past the visible depth, and on an empty side, the rest is priced at the
+        average so far, or the quoted price, moved against it by Config.slippage.
+
+        Args:
+            side (str): BUY or SELL.
+            size (float): The size to fill.
+            price (float): The quoted price.
+            limit (float, optional): The limit price of a limit order.
+
+        Returns:
+            tuple: The filled size, positive, and its average price.
+        """
+        if self.book is None:
+            return abs(size), price
+        filled, average = self.book.walk(side, abs(size), limit, consume=True)
+        if limit is not None:
+            return filled, average
+        rest: float = abs(size) - filled
+        if rest > 0:
+            slippage: float = self.config.slippage
+            slipped: float = (average or price) * (
+                1 + slippage if side == BUY else 1 - slippage
+            )
+            average = (filled * average + rest * slipped) / abs(size)
+        return abs(size), average
+
+    def new_entries(
+        self,
+        sides: List[str],
+        sizes: np.ndarray,
+        prices: np.ndarray,
+        leverages: Optional[np.ndarray] = None,
+        comments: Optional[List[str]] = None,
+        symbol: str = "",
+    ) -> List[Trade]:
+        """
+        Open a basket of trades, sized together against the current funds.
+
+        Unlike repeated new_entry calls, every entry sees the margin and balance
+        taken by the ones before it, so the position and balance limits hold for the
+        basket as a whole. Entries sized down to nothing are skipped. With a book,
+        every entry is a market fill walking it in entry order, as new_entry would.
+
+        Args:
+            sides (List[str]): The direction of every entry.
+            sizes (np.ndarray): The requested sizes.
+            prices (np.ndarray): The entry prices.
+            leverages (np.ndarray, optional): The leverages. Defaults to the config's.
+            comments (List[str], optional): The entry comments. Defaults to "".
+            symbol (str, optional): The symbol of the trades. Defaults to "".
+
+        Returns:
+            List[Trade]: The opened trades, in entry order.
+        """
+        prices = np.asarray(prices, dtype=np.float64)
+        leverages = (
+            np.full(len(prices), self.config.leverage)
+            if leverages is None
+            else np.asarray(leverages, dtype=np.float64)
+        )
+        signs: np.ndarray = np.array([direction_sign(s) for s in sides])
+        sizes = self.restrict_sizes(
+            signs * np.abs(np.asarray(sizes, dtype=np.float64)), prices, leverages
+        )
+        kept: np.ndarray = np.flatnonzero(sizes)
+        if self.book is not None:
+            prices = prices.copy()
+            for k in kept.tolist():
+                filled, prices[k] = self.fill(
+                    BUY if signs[k] > 0 else SELL, sizes[k], prices[k]
+                )
+                sizes[k] = signs[k] * filled
+        trades: List[Trade] = self.make_trades(
+            [sides[k] for k in kept],
+            sizes[kept],
+            prices[kept],
+            leverages[kept],
+            None if comments is None else [comments[k] for k in kept],
+            symbol,
+        )
+        self.open_trades.extend(trades)
+        for trade in trades:
+            self.liquidations.add(trade, self.config.maintenance_margin)
+        self.config.record_volume(float(np.dot(np.abs(sizes), prices)))
+        return trades
+
+    def make_trade(
+        self,
+        side: str,
+        size: float,
+        price: float,
+        leverage: float,
+        comment: str = "",
+        symbol: str = "",
+    ) -> Trade:
+        """
+        Build an opened trade of an already restricted size at the current bar.
+
+        The take profit ladder comes from the config's tp_* settings, its first and
+        last targets tp_start and tp_end away from the entry price.
+        """
+        config: Config = self.config
+        away: float = 1.0 if size > 0 else -1.0
+        trade: Trade = Trade(
+            symbol,
+            config,
+            self.funds,
+            self.tracking,
+            direction=side,
+            size=size,
+            price=price,
+            leverage=leverage,
+            comment=comment,
+            tp_targets=config.tp_targets_count,
+            tp_size_pct=config.tp_size_total,
+            tp_dist_weight=config.tp_dist_weight,
+            tp_size_weight=config.tp_size_weight,
+            tp_start=price * (1 + away * config.tp_start),
+            tp_end=price * (1 + away * config.tp_end),
+        )
+        trade.open_trade_calc(size, price, comment)
+        trade.data.entry_bar_index = self.bar_index
+        trade.data.entry_time = self.time
+        return trade
+
+    def make_trades(
+        self,
+        sides: List[str],
+        sizes: np.ndarray,
+        prices: np.ndarray,
+        leverages: np.ndarray,
+        comments: Optional[List[str]] = None,
+        symbol: str = "",
+    ) -> List[Trade]:
+        """
+        Build opened trades of already restricted sizes in bulk, as make_trade would.
+
+        One unit trade per direction is built the regular way. Every field that
+        scales with price or size, the take profit ladder included, is computed for
+        the whole basket with array operations and set on copies of the unit trade.
+        With a fee schedule, every entry pays the tier its predecessors' volume
+        reached, as it would have entered one by one.
+        """
+        n: int = len(sizes)
+        sizes = np.asarray(sizes, dtype=np.float64)
+        prices = np.asarray(prices, dtype=np.float64)
+        values: List[float] = (sizes * prices).tolist()
+        margins: List[float] = (np.abs(sizes) * prices / leverages).tolist()
+        schedule: Optional[FeeSchedule] = self.config.fee_schedule
+        open_fees: List[float] = np.broadcast_to(
+            self.config.maker_fee.calculate(np.abs(sizes), prices)
+            if schedule is None
+            else schedule.fees(sizes, prices, maker=True, record=False),
+            (n,),
+        ).tolist()
+        units: Dict[str, Trade] = {
+            side: self.make_trade(side, direction_sign(side), 1.0, 1.0, "", symbol)
+            for side in set(sides)
+        }
+        targets: Dict[str, List[List[float]]] = {}
+        tp_sizes: Dict[str, List[List[float]]] = {}
+        for side, unit in units.items():
+            if unit.tp_targets is not None:
+                targets[side] = np.multiply.outer(prices, unit.tp_targets).tolist()
+            if unit.tp_sizes is not None:
+                tp_sizes[side] = np.multiply.outer(
+                    np.abs(sizes), unit.tp_sizes
+                ).tolist()
+        trades: List[Trade] = []
+        for k in range(n):
+            side: str = sides[k]
+            unit: Trade = units[side]
+            price: float = float(prices[k])
+            size: float = float(sizes[k])
+            comment: str = "" if comments is None else comments[k]
+            trade: Trade = Trade.__new__(Trade)
+            trade.__dict__.update(unit.__dict__)
+            trade.entry_price = price
+            trade.size = size
+            trade.value = values[k]
+            trade.leverage = float(leverages[k])
+            trade.margin = margins[k]
+            trade.open_fees = open_fees[k]
+            trade.comment = comment
+            trade.tp_size_total = abs(size) * unit.tp_size_total
+            if unit.tp_start is not None:
+                trade.tp_start = price * unit.tp_start
+                trade.tp_end = price * unit.tp_end
+            trade.tp_targets = targets[side][k] if side in targets else None
+            trade.tp_sizes = tp_sizes[side][k] if side in tp_sizes else None
+            if unit.sl_trail_peak is not None:
+                trade.sl_trail_peak = price
+            trade.data = Data.__new__(Data)
+            trade.data.__dict__.update(unit.data.__dict__)
+            trade.data.size = size
+            trade.data.entry_price = price
+            trade.data.entry_comment = comment
+            trades.append(trade)
+        return trades
+
+    def entry_events(self) -> Dict[str, np.ndarray]:
+        """Entries of every trade of the run as arrays, in entry order"""
+        trades: List[Trade] = sorted(
+            self.closed_trades + self.open_trades,
+            key=lambda t: t.data.entry_bar_index,
+        )
+        return {
+            "bar_index": np.array([t.data.entry_bar_index for t in trades], dtype=int),
+            "price": np.array([t.data.entry_price for t in trades], dtype=float),
+            "size": np.array([t.data.size for t in trades], dtype=float),
+            "leverage": np.array([t.leverage for t in trades], dtype=float),
+            "direction": np.array([t.direction for t in trades], dtype=str),
+            "comment": np.array([t.data.entry_comment for t in trades], dtype=str),
+            "symbol": np.array([t.symbol for t in trades], dtype=str),
+        }
+
+    def close_trade(
+        self,
+        trade: Trade,
+        size: float,
+        close_type: str,
+        comment: str = "",
+    ) -> None:
+        """Close a trade with a specified size and type"""
+        price: float = self.price
+        if close_type == MARKET:
+            side: str = SELL if trade.direction in (LONG, BUY) else BUY
+            size, price = self.fill(side, size, price)
+        trade.close_at(size, price, close_type, comment)
+        if trade.status != OPEN:
+            self.archive(trade)
+
+    def archive(self, trade: Trade) -> None:
+        """Move a trade to the closed trades, stamping its exit with the current bar"""
+        trade.data.exit_bar_index = self.bar_index
+        trade.data.exit_time = self.time
+        self.closed_trades.append(trade)
+        self.open_trades.remove(trade)
+        self.liquidations.dirty = True
+
+    def close_all_trades(self) -> None:
+        """Close all open trades"""
+        for t in list(self.open_trades):
+            self.close_trade(t, t.size, MARKET)
+
+    def execute_order(self, order: Order) -> None:
+        """Execute an existing order"""
+        if order.status == IMMEDIATE:
+            if trade := self.get_trade_by_id(order.id):
+                if order.side == BUY:
+                    trade.size += order.size
+                else:
+                    trade.size -= order.size
+                trade.value = trade.size * order.price
+                trade.margin = trade.calc_margin(
+                    trade.size, order.leverage, order.price
+                )
+                self.liquidations.add(trade, self.config.maintenance_margin)
+                del self.open_orders[order.id]
+                self.release(order)
+
+    def submit_order(self, order: Order) -> None:
+        """Queue a new order, safe to call from any thread"""
+        self.submissions.put(NEW, order)
+
+    def submit_cancel(self, id: str) -> None:
+        """Queue the cancel of an open order, safe to call from any thread"""
+        self.submissions.put(CANCEL, id)
+
+    def submit_modify(self, id: str, **fields) -> None:
+        """Queue a change of an open order's fields, safe to call from any thread"""
+        self.submissions.put(UPDATE, id, fields)
+
+    def place_order(self, order: Order) -> None:
+        """
+        Add an order to the open orders, giving it an id if it has none. Ids must be
+        unique among the open orders.
+
+        GTD orders are scheduled to expire, IOC and FOK orders are matched at once
+        and whatever they don't fill is canceled.
+        """
+        if not order.id:
+            self.order_ids += 1
+            order.id = f"order{self.order_ids}"
+        if order.id in self.open_orders:
+            raise ValueError(f"An order with id {order.id} is already open")
+        order.time = self.time
+        self.open_orders[order.id] = order
+        self.reserve(order)
+        if order.time_in_force == GTD:
+            if not self.expiries.count:
+                self.expiries.advance(self.time)  # catch the idle clock up
+            self.expiries.schedule(order.expire_time, order)
+        elif order.time_in_force in (IOC, FOK):
+            if order.time_in_force == IOC or self.fillable(order):
+                self.update_orders([order])
+            if order.id in self.open_orders:
+                self.cancel(order.id)
+
+    def fillable(self, order: Order) -> bool:
+        """Whether an order can fill in full right now, a FOK order's condition"""
+        if order.status == PENDING:
+            order.update_order(self.price)
+        if order.status != IMMEDIATE:
+            return False
+        if self.book is None or order.order_type != LIMIT:
+            return True
+        return self.book.walk(order.side, order.size, order.price)[0] >= order.size
+
+    def expire_orders(self) -> None:
+        """
+        Remove the orders whose expiry the clock has reached, in O(expired) time.
+
+        Wheel entries of orders already gone, or rescheduled to a later expiry by
+        modify, are skipped.
+        """
+        for o in self.expiries.advance(self.time):
+            if o.expire_time > self.time or self.open_orders.get(o.id) is not o:
+                continue
+            del self.open_orders[o.id]
+            o.status = EXPIRED
+            self.release(o)
+
+    def modify(self, id: str, fields: dict) -> None:
+        if "id" in fields:
+            raise ValueError("The id of an open order can't be changed")
+        if (o := self.open_orders.get(id)) is not None:
+            self.release(o)
+            for name, value in fields.items():
+                setattr(o, name, value)
+            o.value = o.size * o.price
+            o.margin = o.get_margin()
+            self.reserve(o)
+            if "expire_time" in fields and o.time_in_force == GTD:
+                self.expiries.schedule(o.expire_time, o)  # the old entry goes stale
+
+    def drain_submissions(self, limit: Optional[int] = None) -> None:
+        """Apply the orders, cancels and modifications queued by other threads"""
+        for action, target, fields in self.submissions.drain(limit):
+            if action == NEW:
+                self.place_order(target)
+            elif action == CANCEL:
+                self.cancel(target)
+            elif action == UPDATE:
+                self.modify(target, fields)
+
+    def update(self, time_is, bar_idnex, price) -> None:
+        """
+        Update the strategy with one tick.
+
+        Queued submissions are applied and due orders expire first. Open trades then
+        resolve their exits and liquidations, and the open orders trigger and fill at
+        the price, before the funds and the tracker update.
+        """
+        self.time = time_is
+        self.bar_index = bar_idnex
+        self.price = price
+        if self.submissions:
+            self.drain_submissions()
+        if self.expiries.count:
+            self.expire_orders()
+        self.update_trades(price)
+        if self.open_trades:
+            self.check_liquidations(price, price, price)
+        if self.open_orders:
+            self.update_orders()
+        self.update_funds()
+        self.update_tracker()
+        if self.recorder is not None:
+            self.recorder.record(self)
+
+    def update_bar(
+        self,
+        time_is: float,
+        bar_index: int,
+        open: float,
+        high: float,
+        low: float,
+        close: float,
+    ) -> None:
+        """
+        Update the strategy with one OHLC bar instead of a tick.
+
+        Open trades resolve their exits inside the bar with Trade.update_bar along
+        the config's intrabar_path. Orders, funds and the tracker then update at
+        the close, as update does with a tick.
+        """
+        self.time = time_is
+        self.bar_index = bar_index
+        self.price = close
+        if self.submissions:
+            self.drain_submissions()
+        if self.expiries.count:
+            self.expire_orders()
+        for t in list(self.open_trades):
+            size: float = t.size
+            t.update_bar(open, high, low, close, self.config.intrabar_path)
+            if t.status == CLOSED:
+                self.archive(t)
+            elif t.size != size:
+                self.liquidations.dirty = True
+        if self.open_trades:
+            self.check_liquidations(low, high, open)
+        if self.open_orders:
+            self.update_orders()
+        self.update_funds()
+        self.update_tracker()
+        if self.recorder is not None:
+            self.recorder.record(self)
+
+    def check_liquidations(self, low: float, high: float, open: float) -> None:
+        """
+        Liquidate the trades whose maintenance margin the price range broke.
+
+        With isolated margin every trade has its own level in the liquidations
+        index, with cross margin the whole account liquidates at one level. Trades
+        close at their level, or at the open when it already gapped beyond it.
+
+        Args:
+            low (float): The lowest price since the last check.
+            high (float): The highest price since the last check.
+            open (float): The first price since the last check.
+        """
+        index: LiquidationIndex = self.liquidations
+        if self.config.margin_mode == CROSS:
+            if index.dirty:
+                index.reprice_account(
+                    self.open_trades, self.funds.equity, self.config.maintenance_margin
+                )
+            if index.account_due(low, high):
+                level: float = index.account_price
+                below: bool = index.account_below
+                fill: float = min(level, open) if below else max(level, open)
+                for t in list(self.open_trades):
+                    self.liquidate(t, fill)
+            return
+        for level, t in index.due(low, high):
+            self.liquidate(t, min(level, open) if t.size > 0 else max(level, open))
+
+    def liquidate(self, trade: Trade, price: float) -> None:
+        trade.update_excursion(price)
+        trade.close_at(trade.size, price, LIQUIDATION, "liquidation")
+        self.archive(trade)
+
+    def get_state(self, closed: bool = True) -> dict:
+        """
+        Plain-value copy of the strategy, its config, funds, tracker, trades and book.
+
+        Args:
+            closed (bool, optional): Include the closed trades. Defaults to True.
+        """
+        state: dict = {
+            "price": self.price,
+            "time": self.time,
+            "bar_index": self.bar_index,
+            "order_ids": self.order_ids,
+            "trade_ids": self.trade_ids,
+            "config": self.config.get_state(),
+            "funds": dict(self.funds.__dict__),
+            "tracking": dict(self.tracking.__dict__),
+            "open_trades": [t.get_state() for t in self.open_trades],
+            "open_orders": [o.get_state() for o in self.open_orders.values()],
+            "book": None if self.book is None else self.book.get_state(),
+        }
+        if closed:
+            state["closed_trades"] = [t.get_state() for t in self.closed_trades]
+        return state
+
+    def set_state(self, state: dict) -> None:
+        """Replace the strategy's state, in place, with one from get_state"""
+        self.price = state["price"]
+        self.time = state["time"]
+        self.bar_index = state["bar_index"]
+        self.order_ids = state["order_ids"]
+        self.trade_ids = state["trade_ids"]
+        self.config.set_state(state["config"])
+        self.funds.__dict__.update(state["funds"])
+        self.tracking.__dict__.update(state["tracking"])
+        self.open_trades = [
+            Trade.from_state(t, self.config, self.funds, self.tracking)
+            for t in state["open_trades"]
+        ]
+        if "closed_trades" in state:
+            self.closed_trades = [
+                Trade.from_state(t, self.config, self.funds, self.tracking)
+                for t in state["closed_trades"]
+            ]
+        self.open_orders = {
+            o["id"]: Order.from_state(o, self.config) for o in state["open_orders"]
+        }
+        book: Optional[dict] = state.get("book")
+        self.book = None if book is None else OrderBook.from_state(book)
+        self.liquidations = LiquidationIndex()
+        self.liquidations.rebuild(self.open_trades, self.config.maintenance_margin)
+        self.expiries = TimingWheel(self.config.expiry_resolution, now=self.time)
+        for o in self.open_orders.values():
+            if o.time_in_force == GTD:
+                self.expiries.schedule(o.expire_time, o)
+
+    def fork(self, branches: int = 1) -> List["Strategy"]:
+        """
+        Split the strategy into independent branches that continue from its state.
+
+        Each branch gets its own copy of the config, funds, tracker, open and closed
+        trades, orders and order book, and of the equity curve recorded so far. The
+        closed trades are rebuilt on the branch's own config, funds and tracker, so
+        nothing a branch does reaches the original. Commands still queued for
+        submission are queued on every branch too, with copies of the orders they
+        place.
+
+        Args:
+            branches (int, optional): The number of branches. Defaults to 1.
+
+        Returns:
+            List[Strategy]: The branches, the original is left untouched.
+        """
+        state: dict = self.get_state()
+        commands: tuple = tuple(self.submissions.commands)
+        forks: List[Strategy] = []
+        for _ in range(branches):
+            branch: Strategy = Strategy(Config(), Funds(), Tracking())
+            branch.set_state(state)
+            for action, target, fields in commands:
+                if isinstance(target, Order):
+                    target = Order.from_state(target.get_state(), branch.config)
+                branch.submissions.put(action, target, fields and dict(fields))
+            if self.recorder is not None:
+                branch.recorder = self.recorder.copy()
+            forks.append(branch)
+        return forks
+
+
+BAR_FIELDS = ("time", "open", "high", "low", "close", "volume")
+
+
+def bar_start(
+    times: Union[float, np.ndarray], seconds: float
+) -> Union[float, np.ndarray]:
+    """
+    The opening time of the bar each time falls in.
+
+    Shared by resample and BarResampler so batch and streaming bars bucket ticks
+    identically: floor division gives the same result for floats and arrays.
+    """
+    return times // seconds * seconds
+
+
+def resample(
+    times: np.ndarray,
+    prices: np.ndarray,
+    seconds: float,
+    volumes: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """
+    Builds OHLCV bars from a tick series in one vectorized pass.
+
+    Args:
+        times (np.ndarray): The tick timestamps, ascending.
+        prices (np.ndarray): The tick prices.
+        seconds (float): The bar length.
+        volumes (np.ndarray, optional): The tick volumes. Defaults to counting ticks.
+
+    Returns:
+        np.ndarray: A (6, bars) array with the BAR_FIELDS rows, times being each
+            bar's opening time. Rows 1 to 4 are the bars of run_bars.
+    """
+    times = np.asarray(times, dtype=np.float64)
+    prices = np.asarray(prices, dtype=np.float64)
+    if len(times) == 0:
+        return np.empty((len(BAR_FIELDS), 0))
+    buckets: np.ndarray = bar_start(times, seconds)
+    starts: np.ndarray = np.flatnonzero(
+        np.concatenate(([True], buckets[1:] != buckets[:-1]))
+    )
+    ends: np.ndarray = np.append(starts[1:], len(times)) - 1
+    amounts: np.ndarray = np.ones(len(times)) if volumes is None else volumes
+    return np.vstack(
+        (
+            buckets[starts],
+            prices[starts],
+            np.maximum.reduceat(prices, starts),
+            np.minimum.reduceat(prices, starts),
+            prices[ends],
+            np.add.reduceat(np.asarray(amounts, dtype=np.float64), starts),
+        )
+    )
+
+
+def align(bar_times: np.ndarray, seconds: float, times: np.ndarray) -> np.ndarray:
+    """
+    Maps times onto the last higher timeframe bar closed by each of them.
+
+    A bar opening at t closes at t + seconds, so a time only sees bars that were
+    complete at that moment, never the one still forming.
+
+    Args:
+        bar_times (np.ndarray): The opening times of the bars, ascending.
+        seconds (float): The bar length.
+        times (np.ndarray): The times to align, e.g. a lower timeframe's times.
+
+    Returns:
+        np.ndarray: The bar index per time, -1 before the first bar closed.
+    """
+    return (
+        np.searchsorted(np.asarray(bar_times) + seconds, times, side="right") - 1
+    )
+
+
+class BarResampler:
+    """
+    Streaming OHLCV bars of one timeframe, built tick by tick in O(1).
+
+    The forming bar is kept in plain floats and appended to a growing array once a
+    tick of the next bar arrives. Only completed bars are exposed, so a strategy
+    reading them never sees the bar its current tick belongs to.
+
+    Attributes:
+        seconds (float): The bar length.
+        bar (list): The forming bar as BAR_FIELDS values, None before the first tick.
+        buffer (np.ndarray): The (capacity, 6) buffer of completed bars.
+        size (int): The number of completed bars.
+    """
+
+    def __init__(self, seconds: float, capacity: int = 1024):
+        self.seconds: float = seconds
+        self.bar: Optional[List[float]] = None
+        self.buffer: np.ndarray = np.empty((max(1, capacity), len(BAR_FIELDS)))
+        self.size: int = 0
+
+    def update(self, time_is: float, price: float, volume: float = 1.0) -> bool:
+        """
+        Adds a tick.
+
+        Returns:
+            bool: Whether the tick completed the previous bar.
+        """
+        start: float = bar_start(time_is, self.seconds)
+        bar: Optional[List[float]] = self.bar
+        if bar is not None and bar[0] == start:
+            if price > bar[2]:
+                bar[2] = price
+            elif price < bar[3]:
+                bar[3] = price
+            bar[4] = price
+            bar[5] += volume
+            return False
+        self.bar = [start, price, price, price, price, volume]
+        if bar is None:
+            return False
+        if self.size == len(self.buffer):
+            self.buffer = np.concatenate((self.buffer, np.empty_like(self.buffer)))
+        self.buffer[self.size] = bar
+        self.size += 1
+        return True
+
+    def bars(self) -> np.ndarray:
+        """The completed bars as a (bars, 6) view of BAR_FIELDS columns"""
+        return self.buffer[: self.size]
+
+    def last(self, count: int = 1) -> np.ndarray:
+        """The most recent completed bars, oldest first"""
+        return self.buffer[max(0, self.size - count) : self.size]
+
+    def copy(self) -> "BarResampler":
+        resampler: BarResampler = BarResampler(self.seconds, len(self.buffer))
+        resampler.buffer[: self.size] = self.bars()
+        resampler.size = self.size
+        resampler.bar = None if self.bar is None else list(self.bar)
+        return resampler
+
+    def get_state(self) -> dict:
+        return {"seconds": self.seconds, "bar": self.bar, "bars": self.bars().tolist()}
+
+    @classmethod
+    def from_state(cls, state: dict) -> "BarResampler":
+        bars: np.ndarray = np.asarray(state["bars"], dtype=np.float64)
+        resampler: BarResampler = cls(state["seconds"], max(1024, len(bars)))
+        resampler.buffer[: len(bars)] = bars.reshape(-1, len(BAR_FIELDS))
+        resampler.size = len(bars)
+        resampler.bar = state["bar"]
+        return resampler
+
+
+class Pair:
+    def __init__(self, symbol: str, config: Config, initiial_funds: float = 100.0):
+        self.symbol: str = symbol
+        self.config: Config = config
+        self.funds: Funds = Funds(initial=initiial_funds)
+        self.tracking: Tracking = Tracking()
+        self.strategy: Strategy = Strategy(self.config, self.funds, self.tracking)
+        self.price: float = 0.0
+        self.time: int = int(time.time())
+        self.order_ids: int = 0
+        self.trade_ids: int = 0
+        self.bar_index: int = 0
+        self.timeframes: Dict[float, BarResampler] = {}
+
+    def add_timeframe(self, seconds: float) -> BarResampler:
+        """Build bars of a timeframe from the pair's ticks, fed by run_pair"""
+        return self.timeframes.setdefault(seconds, BarResampler(seconds))
+
+    def get_state(self, closed: bool = True) -> dict:
+        return {
+            "symbol": self.symbol,
+            "price": self.price,
+            "time": self.time,
+            "bar_index": self.bar_index,
+            "order_ids": self.order_ids,
+            "trade_ids": self.trade_ids,
+            "strategy": self.strategy.get_state(closed),
+            "timeframes": [r.get_state() for r in self.timeframes.values()],
+        }
+
+    def fork(self, branches: int = 1) -> List["Pair"]:
+        """
+        Split the pair into independent what-if branches at the current bar.
+
+        Args:
+            branches (int, optional): The number of branches. Defaults to 1.
+
+        Returns:
+            List[Pair]: The branches, see Strategy.fork for what they copy.
+        """
+        forks: List[Pair] = []
+        for strategy in self.strategy.fork(branches):
+            branch: Pair = Pair.__new__(Pair)
+            branch.__dict__.update(self.__dict__)
+            branch.config = strategy.config
+            branch.funds = strategy.funds
+            branch.tracking = strategy.tracking
+            branch.strategy = strategy
+            branch.timeframes = {s: r.copy() for s, r in self.timeframes.items()}
+            forks.append(branch)
+        return forks
+
+    def set_state(self, state: dict) -> None:
+        self.symbol = state["symbol"]
+        self.price = state["price"]
+        self.time = state["time"]
+        self.bar_index = state["bar_index"]
+        self.order_ids = state["order_ids"]
+        self.trade_ids = state["trade_ids"]
+        self.strategy.set_state(state["strategy"])
+        self.timeframes = {
+            r["seconds"]: BarResampler.from_state(r)
+            for r in state.get("timeframes", [])
+        }
+
+
+class Checkpointer:
+    """
+    Periodic checkpoints of a Pair for resuming long runs.
+
+    A checkpoint is split by how its parts change. The mutable state, the pair
+    without its closed trades, is rewritten every time as zlib-compressed JSON,
+    written to a temporary name and swapped in, so a crash mid-write leaves the
+    previous checkpoint intact. Closed trades and equity curve rows never change, so
+    they are only appended to two side files: ``<path>.trades`` gets one compressed
+    JSON frame of the trades closed since the last checkpoint, ``<path>.curve`` the
+    raw float64 rows recorded since then. The header records how much of each side
+    file the checkpoint covers, anything past that is cut off before the next
+    append. A checkpoint thus costs the open state plus what is new, not the whole
+    run. With a BookReplay, the replayed book and its position are captured too.
+    The state of an on_bar signal function lives outside the pair and is not
+    captured.
+
+    Layout: header (magic, version, state bytes, trades bytes, trades, curve rows,
+    curve columns), state. A trades frame is its length and the compressed list.
+
+    Attributes:
+        path (str): The checkpoint file.
+        interval (float): Minimum seconds between two periodic checkpoints.
+        last (float): Monotonic time of the last checkpoint.
+        trades (int): The closed trades written to the trades file.
+        trades_bytes (int): The bytes of the trades file they take.
+        rows (int): The curve rows written to the curve file.
+    """
+
+    MAGIC = b"QSNP"
+    VERSION = 2
+    HEADER = struct.Struct("<4sHIQQQH")
+    FRAME = struct.Struct("<I")
+
+    def __init__(self, path: str, interval: float = 300.0):
+        self.path: str = path
+        self.interval: float = interval
+        self.last: float = time.monotonic()
+        self.trades: int = 0
+        self.trades_bytes: int = 0
+        self.rows: int = 0
+
+    def maybe_save(self, pair: Pair, replay: Optional[BookReplay] = None) -> bool:
+        """Checkpoint if the interval has passed since the last one"""
+        if time.monotonic() - self.last < self.interval:
+            return False
+        self.save(pair, replay)
+        return True
+
+    @staticmethod
+    def _append(path: str, size: int, data: bytes) -> int:
+        """Appends to a side file cut back to its checkpointed size, the new size"""
+        with open(path, "ab") as f:
+            f.truncate(size)
+            f.write(data)
+        return size + len(data)
+
+    def save(self, pair: Pair, replay: Optional[BookReplay] = None) -> None:
+        """
+        Checkpoints a pair.
+
+        Args:
+            pair (Pair): The pair to checkpoint.
+            replay (BookReplay, optional): The replay feeding the pair's book.
+                Defaults to None.
+        """
+        state: dict = pair.get_state(closed=False)
+        if replay is not None:
+            state["replay_position"] = replay.position
+        closed: List[Trade] = pair.strategy.closed_trades
+        if len(closed) < self.trades:  # the side files hold another run
+            self.trades = self.trades_bytes = 0
+        frame: bytes = b""
+        if len(closed) > self.trades:
+            frame = zlib.compress(
+                json.dumps(
+                    [t.get_state() for t in closed[self.trades :]], default=float
+                ).encode(),
+                level=1,
+            )
+            frame = self.FRAME.pack(len(frame)) + frame
+        self.trades_bytes = self._append(
+            f"{self.path}.trades", self.trades_bytes, frame
+        )
+        self.trades = len(closed)
+        recorder: Optional[EquityRecorder] = pair.strategy.recorder
+        rows: np.ndarray = np.empty((0, 0))
+        if recorder is not None:
+            state["recorder_updates"] = recorder.updates
+            if recorder.count < self.rows:  # the curve file holds another run
+                self.rows = 0
+            rows = recorder.buffer[self.rows : recorder.count]
+            self._append(
+                f"{self.path}.curve",
+                self.rows * rows.shape[1] * 8,
+                np.ascontiguousarray(rows, dtype="<f8").tobytes(),
+            )
+            self.rows = recorder.count
+        payload: bytes = zlib.compress(
+            json.dumps(state, default=float).encode(), level=1
+        )
+        temp: str = f"{self.path}.tmp"
+        with open(temp, "wb") as f:
+            f.write(
+                self.HEADER.pack(
+                    self.MAGIC,
+                    self.VERSION,
+                    len(payload),
+                    self.trades_bytes,
+                    self.trades,
+                    self.rows if recorder is not None else 0,
+                    rows.shape[1],
+                )
+            )
+            f.write(payload)
+        os.replace(temp, self.path)
+        self.last = time.monotonic()
+
+    @classmethod
+    def _load(cls, path: str) -> Tuple[dict, np.ndarray, int]:
+        with open(path, "rb") as f:
+            magic, version, length, trades_bytes, trades, rows, columns = (
+                cls.HEADER.unpack(f.read(cls.HEADER.size))
+            )
+            if magic != cls.MAGIC or version != cls.VERSION:
+                raise ValueError(f"Not a version {cls.VERSION} checkpoint: {path}")
+            state: dict = json.loads(zlib.decompress(f.read(length)))
+        closed: List[dict] = []
+        if trades_bytes:
+            with open(f"{path}.trades", "rb") as f:
+                data: bytes = f.read(trades_bytes)
+            at: int = 0
+            while at < trades_bytes:
+                (size,) = cls.FRAME.unpack_from(data, at)
+                at += cls.FRAME.size
+                closed.extend(json.loads(zlib.decompress(data[at : at + size])))
+                at += size
+        if len(closed) != trades:
+            raise ValueError(f"Truncated trades file of checkpoint: {path}")
+        state["strategy"]["closed_trades"] = closed
+        curve: np.ndarray = np.empty((0, columns))
+        if rows:
+            curve = np.fromfile(
+                f"{path}.curve", dtype="<f8", count=rows * columns
+            ).reshape(rows, columns)
+        return state, curve, trades_bytes
+
+    @classmethod
+    def read(cls, path: str) -> Tuple[dict, np.ndarray]:
+        """
+        Reads a checkpoint file and the parts of its side files it covers.
+
+        Args:
+            path (str): The checkpoint file.
+
+        Returns:
+            tuple: The pair state, closed trades included, and the equity curve rows.
+        """
+        state, curve, _ = cls._load(path)
+        return state, curve
+
+    def resume(
+        self, pair: Pair, offset: int = 0, replay: Optional[BookReplay] = None
+    ) -> int:
+        """
+        Restores a pair from the checkpoint file, if there is one.
+
+        Args:
+            pair (Pair): The pair to restore into, set up like the checkpointed one.
+            offset (int, optional): The bar index of the first element of the arrays
+                the run continues on, as given to run_pair. Defaults to 0.
+            replay (BookReplay, optional): A fresh replay of the checkpointed run's
+                book events, moved to the checkpointed book. Defaults to None.
+
+        Returns:
+            int: The index into those arrays to continue from, 0 without a
+                checkpoint.
+        """
+        if not os.path.exists(self.path):
+            return 0
+        state, curve, self.trades_bytes = self._load(self.path)
+        self.trades = len(state["strategy"]["closed_trades"])
+        self.rows = len(curve)
+        pair.set_state(state)
+        recorder: Optional[EquityRecorder] = pair.strategy.recorder
+        if recorder is not None:
+            while len(recorder.buffer) < len(curve):
+                recorder._grow()
+            recorder.buffer[: len(curve)] = curve
+            recorder.count = len(curve)
+            recorder.updates = state.get("recorder_updates", len(curve))
+        if replay is not None and pair.strategy.book is not None:
+            replay.book = pair.strategy.book
+            replay.position = state.get("replay_position", 0)
+        return pair.bar_index + 1 - offset
+
+
+def run_pair(
+    pair: Pair,
+    times: np.ndarray,
+    prices: np.ndarray,
+    on_bar: Optional[Callable[[Pair], None]] = None,
+    start: int = 0,
+    stop: Optional[int] = None,
+    close: bool = True,
+    checkpoint: Optional[Checkpointer] = None,
+    replay: Optional[BookReplay] = None,
+    offset: int = 0,
+) -> Pair:
+    """
+    Drives a Pair through a range of a price series.
+
+    Args:
+        pair (Pair): The pair to simulate.
+        times (np.ndarray): The timestamps of the series, read-only views are fine.
+        prices (np.ndarray): The prices of the series, read-only views are fine.
+        on_bar (Callable, optional): Called with the pair before each strategy update,
+            this is where entries and orders are placed. Defaults to None.
+        start (int, optional): The first index to simulate. Defaults to 0.
+        stop (int, optional): The index to stop before. Defaults to the series end.
+        close (bool, optional): Close all open trades after the last bar and finalize
+            the tracker. Defaults to True.
+        checkpoint (Checkpointer, optional): Checkpoints the pair after every update
+            once its interval has passed. Defaults to None.
+        replay (BookReplay, optional): An order book replayed up to each bar's time,
+            which the strategy's market and limit fills walk. Defaults to None.
+        offset (int, optional): The bar index of the first element of the arrays,
+            when they are a chunk of a longer series. Defaults to 0.
+
+    Returns:
+        Pair: The simulated pair.
+    """
+    stop = len(prices) if stop is None else stop
+    strategy: Strategy = pair.strategy
+    if replay is not None:
+        strategy.book = replay.book
+    for i in range(start, stop):
+        if replay is not None:
+            replay.advance(times[i])
+        pair.time = times[i]
+        pair.price = float(prices[i])
+        pair.tracking.price = pair.price
+        pair.bar_index = offset + i
+        strategy.time, strategy.bar_index = pair.time, pair.bar_index
+        for resampler in pair.timeframes.values():
+            resampler.update(pair.time, pair.price)
+        if on_bar is not None:
+            on_bar(pair)
+        strategy.update(pair.time, pair.bar_index, pair.price)
+        if checkpoint is not None:
+            checkpoint.maybe_save(pair, replay)
+    if close:
+        strategy.close_all_trades()
+        strategy.finalize_tracking()
+    return pair
+
+
+def run_bars(
+    pair: Pair,
+    times: np.ndarray,
+    bars: np.ndarray,
+    on_bar: Optional[Callable[[Pair], None]] = None,
+    start: int = 0,
+    stop: Optional[int] = None,
+    close: bool = True,
+    checkpoint: Optional[Checkpointer] = None,
+) -> Pair:
+    """
+    Drives a Pair through OHLC bars, like run_pair does through ticks.
+
+    on_bar sees each bar at its open, so entries it places go through the rest of
+    the bar. The strategy then updates with Strategy.update_bar and ends the bar at
+    its close. The pair's timeframes take the open as a tick at the bar's time
+    before on_bar, and its high, low and close as zero volume ticks after the
+    update, so their bars aggregate the input bars and count them as volume.
+
+    Args:
+        pair (Pair): The pair to simulate.
+        times (np.ndarray): The opening time of each bar.
+        bars (np.ndarray): A (4, n) array of the open, high, low and close rows.
+        on_bar (Callable, optional): Called with the pair at each bar's open.
+            Defaults to None.
+        start (int, optional): The first bar to simulate. Defaults to 0.
+        stop (int, optional): The bar to stop before. Defaults to the last bar.
+        close (bool, optional): Close all open trades after the last bar and finalize
+            the tracker. Defaults to True.
+        checkpoint (Checkpointer, optional): Checkpoints the pair after every bar
+            once its interval has passed. Defaults to None.
+
+    Returns:
+        Pair: The simulated pair.
+    """
+    opens, highs, lows, closes = (np.asarray(row, dtype=np.float64) for row in bars)
+    stop = len(closes) if stop is None else stop
+    strategy: Strategy = pair.strategy
+    for i in range(start, stop):
+        pair.time = times[i]
+        pair.price = float(opens[i])
+        pair.tracking.price = pair.price
+        pair.bar_index = i
+        strategy.time, strategy.bar_index = pair.time, i
+        for resampler in pair.timeframes.values():
+            resampler.update(pair.time, pair.price)
+        if on_bar is not None:
+            on_bar(pair)
+        strategy.update_bar(
+            pair.time,
+            i,
+            pair.price,
+            float(highs[i]),
+            float(lows[i]),
+            float(closes[i]),
+        )
+        pair.price = float(closes[i])
+        pair.tracking.price = pair.price
+        for resampler in pair.timeframes.values():
+            for price in (highs[i], lows[i], closes[i]):
+                resampler.update(pair.time, float(price), 0.0)
+        if checkpoint is not None:
+            checkpoint.maybe_save(pair)
+    if close:
+        strategy.close_all_trades()
+        strategy.finalize_tracking()
+    return pair
+
+
+def chunked(
+    times: np.ndarray, prices: np.ndarray, size: int = 16384
+) -> Iterator[Tuple[int, np.ndarray, np.ndarray]]:
+    """Yields (offset, times, prices) views of a series, size elements at a time"""
+    for offset in range(0, len(prices), size):
+        yield offset, times[offset : offset + size], prices[offset : offset + size]
+
+
+class CleaningReport:
+    """
+    What clean_ticks found and did.
+
+    Attributes:
+        ticks_in (int): The ticks given.
+        ticks_out (int): The ticks returned.
+        policies (dict): The action taken for every check.
+        found (dict): The original indices of the ticks failing every check.
+        gaps (np.ndarray): The (start time, seconds) of every gap over max_gap.
+    """
+
+    def __init__(self, ticks_in: int, policies: Dict[str, str]):
+        self.ticks_in: int = ticks_in
+        self.ticks_out: int = ticks_in
+        self.policies: Dict[str, str] = policies
+        self.found: Dict[str, np.ndarray] = {}
+        self.gaps: np.ndarray = np.empty((0, 2))
+
+    @property
+    def clean(self) -> bool:
+        """True when no tick failed any check"""
+        return not any(len(v) for v in self.found.values())
+
+    def summary(self) -> dict:
+        """The tick counts and the number of ticks failing every check"""
+        return {
+            "ticks_in": self.ticks_in,
+            "ticks_out": self.ticks_out,
+            **{check: len(found) for check, found in self.found.items()},
+        }
+
+
+def _forward_fill(values: np.ndarray, bad: np.ndarray) -> np.ndarray:
+    """
+    Replaces bad values with the last good one before them, in place.
+
+    Returns:
+        np.ndarray: The leading bad values that had nothing to fill from.
+    """
+    last: np.ndarray = np.maximum.accumulate(np.where(bad, 0, np.arange(len(values))))
+    values[:] = values[last]
+    return bad[last]
+
+
+def clean_ticks(
+    times: np.ndarray,
+    prices: np.ndarray,
+    policies: Optional[Dict[str, str]] = None,
+    spike_sigma: float = 8.0,
+    max_gap: Optional[float] = None,
+) -> Tuple[np.ndarray, np.ndarray, CleaningReport]:
+    """
+    Validates and repairs a tick series in whole-array passes before simulation.
+
+    The engine's hot loop does no checking, so a zero price divides by zero in
+    Trade.calc_profit and the Config.set_* methods, and out of order or spiking
+    ticks skew results silently. The checks run in this order, each on what the
+    previous ones left:
+
+    - ``invalid_price``: non-finite or non-positive prices. FILL repeats the last
+      good price.
+    - ``non_monotonic``: times that are non-finite or earlier than a previous tick.
+      FILL clamps them to the latest time seen.
+    - ``duplicate``: the same time and price as the previous tick.
+    - ``spike``: a log return beyond ``spike_sigma`` robust (MAD) sigmas that the
+      next tick reverses just as far. FILL repeats the previous price.
+    - ``gap``: more than ``max_gap`` seconds between ticks, only checked when given.
+      Gaps can be kept or raised on, not repaired.
+
+    Every check takes a DROP, FILL, KEEP (report only) or RAISE policy, see
+    CLEAN_POLICIES for the defaults. Leading ticks a FILL has nothing to fill from
+    are dropped.
+
+    Args:
+        times (np.ndarray): The tick times.
+        prices (np.ndarray): The tick prices.
+        policies (dict, optional): Actions per check, overriding CLEAN_POLICIES.
+        spike_sigma (float, optional): The spike threshold. Defaults to 8.
+        max_gap (float, optional): The longest allowed time between ticks.
+
+    Returns:
+        tuple: The cleaned times and prices and the CleaningReport.
+    """
+    policy: Dict[str, str] = {**CLEAN_POLICIES, **(policies or {})}
+    for check, action in policy.items():
+        if check not in CLEAN_POLICIES:
+            raise ValueError(f"Unknown check {check}")
+        if action not in CLEAN_ACTIONS[check]:
+            raise ValueError(f"Can't {action} on the {check} check")
+    times = np.array(times, dtype=np.float64)
+    prices = np.array(prices, dtype=np.float64)
+    if times.shape != prices.shape:
+        raise ValueError("Times and prices must have the same length")
+    index: np.ndarray = np.arange(len(prices))
+    report = CleaningReport(len(prices), policy)
+
+    def handle(check: str, bad: np.ndarray, fill: Optional[np.ndarray]) -> None:
+        nonlocal times, prices, index
+        report.found[check] = index[bad]
+        if not bad.any() or policy[check] == KEEP:
+            return
+        if policy[check] == RAISE:
+            raise ValueError(
+                f"{int(bad.sum())} ticks fail the {check} check, "
+                f"the first at index {index[bad][0]}"
+            )
+        keep: np.ndarray = ~bad if policy[check] == DROP else ~_forward_fill(fill, bad)
+        times, prices, index = times[keep], prices[keep], index[keep]
+
+    handle("invalid_price", ~(np.isfinite(prices) & (prices > 0)), prices)
+    finite: np.ndarray = np.isfinite(times)
+    latest: np.ndarray = np.maximum.accumulate(np.where(finite, times, -np.inf))
+    late: np.ndarray = ~finite
+    late[1:] |= times[1:] < latest[:-1]
+    handle("non_monotonic", late, times)
+    same: np.ndarray = np.zeros(len(times), dtype=bool)
+    same[1:] = (times[1:] == times[:-1]) & (prices[1:] == prices[:-1])
+    handle("duplicate", same, None)
+    spikes: np.ndarray = np.zeros(len(prices), dtype=bool)
+    with np.errstate(divide="ignore", invalid="ignore"):  # prices kept as invalid
+        returns: np.ndarray = np.diff(np.log(prices))
+    moves: np.ndarray = returns[np.isfinite(returns) & (returns != 0)]
+    if len(moves) > 1:
+        median: float = float(np.median(moves))
+        sigma: float = 1.4826 * float(np.median(np.abs(moves - median)))
+        if sigma > 0:
+            z: np.ndarray = np.where(
+                np.isfinite(returns), (returns - median) / sigma, 0.0
+            )
+            spikes[1:-1] = (
+                (np.abs(z[:-1]) > spike_sigma)
+                & (np.abs(z[1:]) > spike_sigma)
+                & (np.sign(z[:-1]) != np.sign(z[1:]))
+            )
+    handle("spike", spikes, prices)
+    if max_gap is not None:
+        with np.errstate(invalid="ignore"):  # times kept as non_monotonic
+            steps: np.ndarray = np.diff(times)
+        wide: np.ndarray = np.flatnonzero(steps > max_gap)
+        report.gaps = np.column_stack((times[wide], steps[wide]))
+        gap: np.ndarray = np.zeros(len(times), dtype=bool)
+        gap[wide + 1] = True
+        handle("gap", gap, None)
+    report.ticks_out = len(prices)
+    return times, prices, report
+
+
+class Prefetcher:
+    """
+    Reads chunks of a feed on a background thread while the engine simulates.
+
+    Wraps any chunk iterator, e.g. chunked, TickArchive.blocks or a network decoder,
+    and keeps up to ``depth`` chunks ready in a bounded queue, so at most
+    ``depth + 2`` chunks are in memory. Memory-mapped arrays are copied in on the
+    producer thread so their page faults don't land on the engine. File reads and
+    most numpy decoding release the GIL, so the producer runs while the engine works.
+    Exceptions raised by the source are re-raised from the consumer side.
+
+    Attributes:
+        depth (int): The max chunks waiting in the queue.
+        chunks (int): The chunks handed to the engine.
+        wait (float): Seconds the engine spent blocked waiting for a chunk.
+        stalls (int): The number of chunks the engine had to wait for.
+        read (float): Seconds the producer spent reading and decoding.
+    """
+
+    _DONE = object()
+
+    def __init__(self, source: Iterable, depth: int = 2):
+        if depth < 1:
+            raise ValueError("Prefetch depth must be at least 1")
+        self.depth: int = depth
+        self.chunks: int = 0
+        self.wait: float = 0.0
+        self.stalls: int = 0
+        self.read: float = 0.0
+        self.started: float = time.perf_counter()
+        self.queue: queue.Queue = queue.Queue(maxsize=depth)
+        self.stopping: threading.Event = threading.Event()
+        self.thread: threading.Thread = threading.Thread(
+            target=self._produce, args=(iter(source),), daemon=True
+        )
+        self.thread.start()
+
+    @staticmethod
+    def _load(item):
+        """Copies memory-mapped arrays of a chunk into memory"""
+        if isinstance(item, tuple):
+            return tuple(
+                np.array(x) if isinstance(x, np.memmap) else x for x in item
+            )
+        return np.array(item) if isinstance(item, np.memmap) else item
+
+    def _put(self, item) -> bool:
+        while not self.stopping.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(self, source: Iterator) -> None:
+        try:
+            while not self.stopping.is_set():
+                start: float = time.perf_counter()
+                try:
+                    item = self._load(next(source))
+                except StopIteration:
+                    break
+                self.read += time.perf_counter() - start
+                if not self._put(item):
+                    return
+            self._put(self._DONE)
+        except BaseException as error:
+            self._put(error)
+
+    def __iter__(self) -> "Prefetcher":
+        return self
+
+    def __next__(self):
+        try:
+            item = self.queue.get_nowait()
+        except queue.Empty:
+            start: float = time.perf_counter()
+            item = self.queue.get()
+            self.wait += time.perf_counter() - start
+            self.stalls += 1
+        if item is self._DONE:
+            self.queue.put(item)
+            raise StopIteration
+        if isinstance(item, BaseException):
+            self.queue.put(self._DONE)
+            raise item
+        self.chunks += 1
+        return item
+
+    def close(self) -> None:
+        """Stops the producer and drops any chunks read ahead"""
+        self.stopping.set()
+        self.thread.join()
+
+    def __enter__(self) -> "Prefetcher":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def stats(self) -> dict:
+        """
+        Summarizes how much the engine waited on the feed.
+
+        Returns:
+            dict: The chunks, stalls, seconds waited, seconds spent reading on the
+                background thread, elapsed seconds and the fraction of them waited.
+        """
+        elapsed: float = time.perf_counter() - self.started
+        return {
+            "chunks": self.chunks,
+            "stalls": self.stalls,
+            "wait": self.wait,
+            "read": self.read,
+            "elapsed": elapsed,
+            "wait_fraction": self.wait / elapsed if elapsed else 0.0,
+        }
+
+
+class MarketDataStore:
+    """
+    Read-only tick store with one memory-mapped ``.npy`` file per symbol.
+
+    Each file holds a (2, n) float64 array of timestamps and prices. Opening a
+    symbol maps the file instead of reading it, so every process attached to the
+    same store shares the pages of the OS file cache rather than holding a copy.
+
+    Attributes:
+        path (str): The directory holding the symbol files.
+    """
+
+    def __init__(self, path: str):
+        self.path: str = path
+
+    @classmethod
+    def write(
+        cls, path: str, data: Dict[str, Tuple[np.ndarray, np.ndarray]]
+    ) -> "MarketDataStore":
+        """
+        Writes a store from a mapping of symbol to (times, prices).
+
+        Args:
+            path (str): The directory to write to, created if missing.
+            data (dict): The series per symbol.
+
+        Returns:
+            MarketDataStore: The store opened on the written directory.
+        """
+        os.makedirs(path, exist_ok=True)
+        for symbol, (times, prices) in data.items():
+            np.save(
+                os.path.join(path, f"{symbol}.npy"),
+                np.vstack((times, prices)).astype(np.float64),
+            )
+        return cls(path)
+
+    def symbols(self) -> List[str]:
+        return sorted(f[:-4] for f in os.listdir(self.path) if f.endswith(".npy"))
+
+    def size(self, symbol: str) -> int:
+        """Size in bytes of a symbol's data, used to balance work across shards."""
+        return os.path.getsize(os.path.join(self.path, f"{symbol}.npy"))
+
+    def get(self, symbol: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Maps a symbol's series read-only.
+
+        Args:
+            symbol (str): The symbol to open.
+
+        Returns:
+            tuple: Read-only (times, prices) views of the mapped file.
+        """
+        data = np.load(os.path.join(self.path, f"{symbol}.npy"), mmap_mode="r")
+        return data[0], data[1]
+
+
+def varint_encode(values: np.ndarray) -> np.ndarray:
+    """
+    Encodes unsigned integers as LEB128 varints, 7 bits per byte, vectorized.
+
+    Args:
+        values (np.ndarray): The values, cast to uint64.
+
+    Returns:
+        np.ndarray: The encoded uint8 bytes.
+    """
+    values = np.asarray(values).astype(np.uint64)
+    bits: np.ndarray = np.zeros(len(values), dtype=np.int64)
+    rest: np.ndarray = values >> np.uint64(7)
+    while rest.any():
+        bits += rest > 0
+        rest >>= np.uint64(7)
+    lengths: np.ndarray = bits + 1
+    starts: np.ndarray = np.cumsum(lengths) - lengths
+    out: np.ndarray = np.empty(int(lengths.sum()), dtype=np.uint8)
+    for k in range(int(lengths.max()) if len(values) else 0):
+        has: np.ndarray = lengths > k
+        byte: np.ndarray = (values[has] >> np.uint64(7 * k)) & np.uint64(0x7F)
+        more: np.ndarray = (lengths[has] > k + 1).astype(np.uint64) << np.uint64(7)
+        out[starts[has] + k] = (byte | more).astype(np.uint8)
+    return out
+
+
+def varint_decode(data: np.ndarray) -> np.ndarray:
+    """
+    Decodes a run of LEB128 varints into uint64 values, vectorized.
+
+    Single byte runs are returned as is; otherwise the bytes of every value are
+    gathered one position at a time from a zero padded copy, into reused buffers.
+
+    Args:
+        data (np.ndarray): The encoded uint8 bytes.
+
+    Returns:
+        np.ndarray: The decoded values.
+    """
+    data = np.asarray(data, dtype=np.uint8)
+    last: np.ndarray = data < 0x80
+    if last.all():
+        return data.astype(np.uint64)
+    ends: np.ndarray = np.flatnonzero(last)
+    starts: np.ndarray = np.empty(len(ends), dtype=np.int64)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    lengths: np.ndarray = ends - starts + 1
+    padded: np.ndarray = np.zeros(len(data) + 10, dtype=np.uint8)
+    np.bitwise_and(data, 0x7F, out=padded[: len(data)])
+    values: np.ndarray = padded[starts].astype(np.uint64)
+    byte: np.ndarray = np.empty(len(starts), dtype=np.uint64)
+    for k in range(1, int(lengths.max())):
+        starts += 1
+        byte[:] = padded[starts]
+        byte *= lengths > k
+        byte <<= np.uint64(7 * k)
+        values |= byte
+    return values
+
+
+class TickArchive:
+    """
+    Compressed tick file of delta encoded, varint packed blocks.
+
+    Timestamps are stored as deltas in integer ``time_unit``s, prices as zigzag
+    deltas in integer ``tick_size``s, both as LEB128 varints. Each block of up to
+    ``block_size`` ticks decodes on its own from its index row, which holds its byte
+    range, tick count and first time and price, so reads can seek by time and stream
+    block by block. Encoding and decoding are vectorized per block. Prices are
+    rounded to the tick size and times to the time unit. The archive trades decode
+    speed for size: it is about a quarter of the raw float64 series but decodes
+    several times slower than loading it, see benchmarks/archive_decode.py.
+
+    Layout: header (magic, version, tick size, time unit, ticks, blocks, index
+    offset), blocks, index.
+
+    Attributes:
+        path (str): The archive file.
+        tick_size (float): The price quantum.
+        time_unit (float): The timestamp quantum in seconds.
+        index (np.ndarray): One INDEX row per block.
+    """
+
+    MAGIC = b"QTKA"
+    VERSION = 1
+    HEADER = struct.Struct("<4sHddQQQ")
+    INDEX = np.dtype(
+        [
+            ("offset", "<u8"),
+            ("time_bytes", "<u8"),
+            ("price_bytes", "<u8"),
+            ("count", "<u8"),
+            ("start", "<u8"),
+            ("first_time", "<i8"),
+            ("first_price", "<i8"),
+        ]
+    )
+
+    def __init__(self, path: str):
+        self.path: str = path
+        with open(path, "rb") as f:
+            header: tuple = self.HEADER.unpack(f.read(self.HEADER.size))
+        magic, version, self.tick_size, self.time_unit, self.ticks, blocks, at = header
+        if magic != self.MAGIC or version != self.VERSION:
+            raise ValueError(f"{path} is not a version {self.VERSION} tick archive")
+        self.data: np.ndarray = np.memmap(path, dtype=np.uint8, mode="r")
+        self.index: np.ndarray = np.frombuffer(
+            self.data[at : at + blocks * self.INDEX.itemsize].tobytes(), self.INDEX
+        )
+        self.starts: np.ndarray = self.index["start"].astype(np.int64)
+
+    @classmethod
+    def write(
+        cls,
+        path: str,
+        times: np.ndarray,
+        prices: np.ndarray,
+        tick_size: float,
+        time_unit: float = 1e-6,
+        block_size: int = 65536,
+    ) -> "TickArchive":
+        """
+        Writes a tick series as an archive.
+
+        Args:
+            path (str): The file to write.
+            times (np.ndarray): The timestamps in seconds, ascending.
+            prices (np.ndarray): The prices.
+            tick_size (float): The price quantum prices are rounded to.
+            time_unit (float, optional): The timestamp quantum. Defaults to 1µs.
+            block_size (int, optional): The ticks per block. Defaults to 65536.
+
+        Returns:
+            TickArchive: The archive opened on the written file.
+        """
+        stamps: np.ndarray = np.round(np.asarray(times) / time_unit).astype(np.int64)
+        quanta: np.ndarray = np.round(np.asarray(prices) / tick_size).astype(np.int64)
+        if np.any(np.diff(stamps) < 0):
+            raise ValueError("Tick times must be ascending")
+        rows: List[tuple] = []
+        with open(path + ".tmp", "wb") as f:
+            f.write(bytes(cls.HEADER.size))
+            for start in range(0, len(stamps), block_size):
+                t: np.ndarray = stamps[start : start + block_size]
+                q: np.ndarray = quanta[start : start + block_size]
+                moves: np.ndarray = np.diff(q, prepend=q[0])
+                time_bytes: np.ndarray = varint_encode(np.diff(t, prepend=t[0]))
+                price_bytes: np.ndarray = varint_encode(
+                    (moves << 1) ^ (moves >> 63)  # zigzag
+                )
+                rows.append(
+                    (f.tell(), len(time_bytes), len(price_bytes), len(t), start)
+                    + (t[0], q[0])
+                )
+                f.write(time_bytes.tobytes())
+                f.write(price_bytes.tobytes())
+            at: int = f.tell()
+            f.write(np.array(rows, dtype=cls.INDEX).tobytes())
+            f.seek(0)
+            f.write(
+                cls.HEADER.pack(
+                    cls.MAGIC,
+                    cls.VERSION,
+                    tick_size,
+                    time_unit,
+                    len(stamps),
+                    len(rows),
+                    at,
+                )
+            )
+        os.replace(path + ".tmp", path)
+        return cls(path)
+
+    def __len__(self) -> int:
+        return self.ticks
+
+    def block(self, i: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Decodes block i into (times, prices) float64 arrays"""
+        row: np.void = self.index[i]
+        offset: int = int(row["offset"])
+        split: int = offset + int(row["time_bytes"])
+        # the decoded buffers are integrated in place, only the results are new
+        stamps: np.ndarray = varint_decode(self.data[offset:split]).view(np.int64)
+        np.cumsum(stamps, out=stamps)
+        stamps += row["first_time"]
+        zigzag: np.ndarray = varint_decode(
+            self.data[split : split + int(row["price_bytes"])]
+        )
+        signs: np.ndarray = -(zigzag & np.uint64(1)).view(np.int64)
+        zigzag >>= np.uint64(1)
+        quanta: np.ndarray = zigzag.view(np.int64)
+        quanta ^= signs
+        np.cumsum(quanta, out=quanta)
+        quanta += row["first_price"]
+        return stamps * self.time_unit, quanta * self.tick_size
+
+    def seek(self, time_is: float) -> int:
+        """
+        The block holding the first tick at or after a time.
+
+        A block starting exactly at the time may have ticks of that same time at the
+        end of the block before it, so the search stops before equal first times.
+        """
+        firsts: np.ndarray = self.index["first_time"] * self.time_unit
+        return max(0, int(np.searchsorted(firsts, time_is, side="left")) - 1)
+
+    def blocks(
+        self, start: int = 0, stop: Optional[int] = None
+    ) -> Iterator[Tuple[int, np.ndarray, np.ndarray]]:
+        """Streams (offset, times, prices) blocks, the chunks FanOutRunner takes"""
+        for i in range(start, len(self.index) if stop is None else stop):
+            times, prices = self.block(i)
+            yield int(self.starts[i]), times, prices
+
+    def read(
+        self, start_time: Optional[float] = None, end_time: Optional[float] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Decodes the ticks in a time range into preallocated arrays.
+
+        Args:
+            start_time (float, optional): The first time to include. Defaults to all.
+            end_time (float, optional): The time to stop before. Defaults to all.
+
+        Returns:
+            tuple: The (times, prices) of the range.
+        """
+        first: int = 0 if start_time is None else self.seek(start_time)
+        last: int = len(self.index) if end_time is None else self.seek(end_time) + 1
+        counts: np.ndarray = self.index["count"][first:last].astype(np.int64)
+        times: np.ndarray = np.empty(int(counts.sum()))
+        prices: np.ndarray = np.empty(len(times))
+        at: int = 0
+        for _, t, p in self.blocks(first, last):
+            times[at : at + len(t)] = t
+            prices[at : at + len(p)] = p
+            at += len(t)
+        lo: int = 0 if start_time is None else int(np.searchsorted(times, start_time))
+        hi: int = len(times)
+        if end_time is not None:
+            hi = int(np.searchsorted(times, end_time))
+        return times[lo:hi], prices[lo:hi]
+
+
+class ArchiveStore:
+    """
+    Tick store of one TickArchive per symbol.
+
+    Answers the same symbols/size/get calls as MarketDataStore, so ShardedRunner
+    workers can decode their symbols straight from the compressed files.
+
+    Attributes:
+        path (str): The directory holding the ``.qtk`` files.
+    """
+
+    def __init__(self, path: str):
+        self.path: str = path
+
+    @classmethod
+    def write(
+        cls,
+        path: str,
+        data: Dict[str, Tuple[np.ndarray, np.ndarray]],
+        tick_size: Union[float, Dict[str, float]],
+        time_unit: float = 1e-6,
+    ) -> "ArchiveStore":
+        """
+        Writes a store from a mapping of symbol to (times, prices).
+
+        Args:
+            path (str): The directory to write to, created if missing.
+            data (dict): The series per symbol.
+            tick_size (float | dict): The tick size, or the tick size per symbol.
+            time_unit (float, optional): The timestamp quantum. Defaults to 1µs.
+
+        Returns:
+            ArchiveStore: The store opened on the written directory.
+        """
+        os.makedirs(path, exist_ok=True)
+        for symbol, (times, prices) in data.items():
+            size: float = (
+                tick_size[symbol] if isinstance(tick_size, dict) else tick_size
+            )
+            TickArchive.write(
+                os.path.join(path, f"{symbol}.qtk"), times, prices, size, time_unit
+            )
+        return cls(path)
+
+    def symbols(self) -> List[str]:
+        return sorted(f[:-4] for f in os.listdir(self.path) if f.endswith(".qtk"))
+
+    def size(self, symbol: str) -> int:
+        """Size in bytes of a symbol's archive, used to balance work across shards."""
+        return os.path.getsize(os.path.join(self.path, f"{symbol}.qtk"))
+
+    def open(self, symbol: str) -> TickArchive:
+        return TickArchive(os.path.join(self.path, f"{symbol}.qtk"))
+
+    def get(self, symbol: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Decodes a symbol's whole series"""
+        return self.open(symbol).read()
+
+
+SHARED_DATA_DIR: str = (
+    "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+)
+
+# per process: segment name -> [mapped array, open handles, unlink finalizer or None]
+_SHARED_SEGMENTS: Dict[str, list] = {}
+
+
+def _unlink_segment(path: str, owner: int) -> None:
+    # forked workers inherit the finalizer, only the creating process may unlink
+    if os.getpid() != owner:
+        return
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+class SharedMarketData:
+    """
+    Market data loaded once into shared memory and handed out as read-only views.
+
+    All series live in one memory-mapped segment in ``SHARED_DATA_DIR`` (tmpfs on
+    Linux), with a layout of symbol -> (offset, length). A handle pickles as its name
+    and layout only, so passing it to a worker process attaches that process to the
+    same physical pages instead of copying the data. It answers the same
+    ``symbols``/``size``/``get`` calls as MarketDataStore and can be given to
+    ShardedRunner or run_pair directly.
+
+    Handles are reference counted per process: every handle opened on a segment
+    counts once and the mapping is dropped when the last one is closed. The process
+    that created the segment removes it when its last handle is closed, when the
+    owning handle is garbage collected, or at interpreter exit, whichever comes
+    first. Worker processes close the handles they unpickle when their shard is
+    done. Views still alive after that keep their pages until they are garbage
+    collected.
+
+    Attributes:
+        name (str): The segment name other processes attach by.
+        layout (dict): The (offset, length) of every symbol in the segment.
+        closed (bool): Whether this handle has been closed.
+    """
+
+    def __init__(self, name: str, layout: Dict[str, Tuple[int, int]]):
+        self.name: str = name
+        self.layout: Dict[str, Tuple[int, int]] = layout
+        self.closed: bool = False
+        segment: Optional[list] = _SHARED_SEGMENTS.get(name)
+        if segment is None:
+            segment = _SHARED_SEGMENTS[name] = [
+                np.memmap(self.path(name), dtype=np.float64, mode="r"),
+                0,
+                None,
+            ]
+        segment[1] += 1
+        self.data: np.ndarray = segment[0]
+
+    @staticmethod
+    def path(name: str) -> str:
+        return os.path.join(SHARED_DATA_DIR, f"{name}.ticks")
+
+    @classmethod
+    def create(
+        cls,
+        data: Dict[str, Tuple[np.ndarray, np.ndarray]],
+        name: Optional[str] = None,
+    ) -> "SharedMarketData":
+        """
+        Loads series into a new shared segment.
+
+        Args:
+            data (dict): The (times, prices) per symbol.
+            name (str, optional): The segment name. Defaults to a unique name.
+
+        Returns:
+            SharedMarketData: The owning handle of the new segment.
+        """
+        name = name or f"market-{uuid.uuid4().hex[:16]}"
+        layout: Dict[str, Tuple[int, int]] = {}
+        offset: int = 0
+        for symbol, (times, prices) in data.items():
+            layout[symbol] = (offset, len(prices))
+            offset += 2 * len(prices)
+        segment = np.memmap(
+            cls.path(name), dtype=np.float64, mode="w+", shape=(max(offset, 1),)
+        )
+        for symbol, (times, prices) in data.items():
+            start, length = layout[symbol]
+            segment[start : start + length] = times
+            segment[start + length : start + 2 * length] = prices
+        segment.flush()
+        del segment
+        host: SharedMarketData = cls(name, layout)
+        _SHARED_SEGMENTS[name][2] = weakref.finalize(
+            host, _unlink_segment, cls.path(name), os.getpid()
+        )
+        return host
+
+    @classmethod
+    def from_store(
+        cls, store: MarketDataStore, name: Optional[str] = None
+    ) -> "SharedMarketData":
+        """Loads every symbol of an on-disk store into a new shared segment."""
+        return cls.create({s: store.get(s) for s in store.symbols()}, name)
+
+    def symbols(self) -> List[str]:
+        return sorted(self.layout)
+
+    def size(self, symbol: str) -> int:
+        return self.layout[symbol][1] * 2 * self.data.itemsize
+
+    def get(self, symbol: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns read-only (times, prices) views of a symbol, no data is copied.
+
+        Args:
+            symbol (str): The symbol to view.
+
+        Returns:
+            tuple: The read-only views.
+        """
+        start, length = self.layout[symbol]
+        return (
+            self.data[start : start + length],
+            self.data[start + length : start + 2 * length],
+        )
+
+    def close(self) -> None:
+        """Releases this handle, dropping the segment with the last handle."""
+        if self.closed:
+            return
+        self.closed = True
+        segment: list = _SHARED_SEGMENTS[self.name]
+        segment[1] -= 1
+        if segment[1] > 0:
+            return
+        del _SHARED_SEGMENTS[self.name]
+        if segment[2] is not None:
+            segment[2]()
+
+    def __enter__(self) -> "SharedMarketData":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __reduce__(self):
+        return (SharedMarketData, (self.name, self.layout))
+
+
+class RunResult:
+    """
+    Summary of a single symbol's simulation.
+
+    Attributes:
+        symbol (str): The simulated symbol.
+        funds (dict): The final Funds fields.
+        tracking (dict): The final Tracking fields.
+        ledger (list): The Data fields of every closed trade.
+    """
+
+    def __init__(self, symbol: str, funds: dict, tracking: dict, ledger: List[dict]):
+        self.symbol: str = symbol
+        self.funds: dict = funds
+        self.tracking: dict = tracking
+        self.ledger: List[dict] = ledger
+
+    @classmethod
+    def from_pair(cls, pair: Pair) -> "RunResult":
+        return cls(
+            pair.symbol,
+            dict(pair.funds.__dict__),
+            dict(pair.tracking.__dict__),
+            [dict(t.data.__dict__) for t in pair.strategy.closed_trades],
+        )
+
+
+class ShardReport:
+    """
+    Combined results of a sharded run.
+
+    Attributes:
+        results (dict): The RunResult of every symbol.
+        funds (dict): The additive Funds fields summed over all symbols.
+        tracking (dict): The additive Tracking fields summed over all symbols.
+        ledger (list): Every closed trade of every symbol, tagged with its symbol.
+    """
+
+    FUNDS_TOTALS = ("balance", "equity", "open_profit", "margin", "commission_paid")
+    TRACKING_TOTALS = (
+        "total_trades",
+        "total_winning_trades",
+        "total_losing_trades",
+        "gross_profit",
+        "gross_loss",
+        "commission_paid",
+        "net_profit",
+    )
+
+    def __init__(self, results: List[RunResult]):
+        results = sorted(results, key=lambda r: r.symbol)
+        self.results: Dict[str, RunResult] = {r.symbol: r for r in results}
+        self.funds: dict = {
+            k: sum(r.funds[k] for r in results) for k in self.FUNDS_TOTALS
+        }
+        self.tracking: dict = {
+            k: sum(r.tracking[k] for r in results) for k in self.TRACKING_TOTALS
+        }
+        self.ledger: List[dict] = [
+            dict(trade, symbol=r.symbol) for r in results for trade in r.ledger
+        ]
+
+
+def _run_shard(
+    store: Union[MarketDataStore, SharedMarketData],
+    symbols: List[str],
+    config: Config,
+    initial_funds: float,
+    on_bar: Optional[Callable[[Pair], None]],
+) -> List[RunResult]:
+    results: List[RunResult] = []
+    for symbol in symbols:
+        times, prices = store.get(symbol)
+        pair_config: Config = copy.deepcopy(config)
+        pair_config.symbol = symbol
+        pair: Pair = Pair(symbol, pair_config, initial_funds)
+        results.append(RunResult.from_pair(run_pair(pair, times, prices, on_bar)))
+    return results
+
+
+def _run_worker_shard(
+    store: Union[MarketDataStore, SharedMarketData],
+    symbols: List[str],
+    config: Config,
+    initial_funds: float,
+    on_bar: Optional[Callable[[Pair], None]],
+) -> List[RunResult]:
+    # the store is the worker's own unpickled handle, so release it once done
+    try:
+        return _run_shard(store, symbols, config, initial_funds, on_bar)
+    finally:
+        if isinstance(store, SharedMarketData):
+            store.close()
+
+
+class ShardedRunner:
+    """
+    Runs independent symbols across worker processes.
+
+    Symbols are split into one shard per worker, balanced by data size with a
+    longest-first greedy assignment. Workers open the symbols from the shared store
+    themselves, so only the store handle and the results cross process boundaries.
+
+    Attributes:
+        store (MarketDataStore | SharedMarketData): The store the workers read from.
+        config (Config): The template config, copied for every symbol.
+        initial_funds (float): The starting funds of every symbol.
+        on_bar (Callable): The module-level signal function passed to run_pair.
+        workers (int): The number of worker processes.
+    """
+
+    def __init__(
+        self,
+        store: Union[MarketDataStore, SharedMarketData],
+        config: Config,
+        initial_funds: float = 1000.0,
+        on_bar: Optional[Callable[[Pair], None]] = None,
+        workers: Optional[int] = None,
+    ):
+        self.store: Union[MarketDataStore, SharedMarketData] = store
+        self.config: Config = config
+        self.initial_funds: float = initial_funds
+        self.on_bar: Optional[Callable[[Pair], None]] = on_bar
+        self.workers: int = workers or os.cpu_count() or 1
+
+    def shards(self, symbols: Optional[List[str]] = None) -> List[List[str]]:
+        """
+        Splits symbols into shards of roughly equal total data size.
+
+        Args:
+            symbols (list, optional): The symbols to split. Defaults to the whole store.
+
+        Returns:
+            list: One list of symbols per non-empty shard.
+        """
+        symbols = self.store.symbols() if symbols is None else symbols
+        loads: List[Tuple[int, int]] = [(0, i) for i in range(self.workers)]
+        shards: List[List[str]] = [[] for _ in range(self.workers)]
+        for size, symbol in sorted(
+            ((self.store.size(s), s) for s in symbols), reverse=True
+        ):
+            load, i = heapq.heappop(loads)
+            shards[i].append(symbol)
+            heapq.heappush(loads, (load + size, i))
+        return [s for s in shards if s]
+
+    def run(self, symbols: Optional[List[str]] = None) -> ShardReport:
+        shards: List[List[str]] = self.shards(symbols)
+        if len(shards) <= 1:
+            return ShardReport(
+                [
+                    r
+                    for s in shards
+                    for r in _run_shard(
+                        self.store, s, self.config, self.initial_funds, self.on_bar
+                    )
+                ]
+            )
+        with ProcessPoolExecutor(max_workers=len(shards)) as pool:
+            futures = [
+                pool.submit(
+                    _run_worker_shard,
+                    self.store,
+                    s,
+                    self.config,
+                    self.initial_funds,
+                    self.on_bar,
+                )
+                for s in shards
+            ]
+            return ShardReport([r for f in futures for r in f.result()])
+
+
+class FanOutRunner:
+    """
+    Runs many independent pairs over a single pass of the market data.
+
+    Each chunk of the feed is read and converted to Python floats once, then every
+    pair runs through it while it is still hot in cache, before the next chunk is
+    decoded. The pairs share nothing but the data: each keeps its own strategy,
+    funds and tracker.
+
+    Attributes:
+        pairs (list): The simulated pairs.
+        on_bars (list): The signal function of each pair, None for none.
+    """
+
+    def __init__(
+        self,
+        pairs: List[Pair],
+        on_bars: Union[None, Callable[[Pair], None], List[Optional[Callable]]] = None,
+    ):
+        self.pairs: List[Pair] = pairs
+        if not isinstance(on_bars, (list, tuple)):
+            on_bars = [on_bars] * len(pairs)
+        self.on_bars: List[Optional[Callable[[Pair], None]]] = list(on_bars)
+        if len(self.on_bars) != len(self.pairs):
+            raise ValueError("Give one on_bar per pair")
 
-    def close_trade(
+    @classmethod
+    def from_configs(
+        cls,
+        configs: List[Config],
+        on_bars: Union[None, Callable[[Pair], None], List[Optional[Callable]]] = None,
+        initial_funds: float = 1000.0,
+    ) -> "FanOutRunner":
+        """One pair per config, each on its own copy of the config"""
+        return cls(
+            [Pair(c.symbol, copy.deepcopy(c), initial_funds) for c in configs], on_bars
+        )
+
+    def run_chunks(
+        self, chunks: Iterable[Tuple[int, np.ndarray, np.ndarray]], close: bool = True
+    ) -> List[RunResult]:
+        """
+        Feeds every pair chunk by chunk.
+
+        Args:
+            chunks (Iterable): (offset, times, prices) chunks in series order, e.g.
+                from chunked or a decoder.
+            close (bool, optional): Close all open trades after the last chunk and
+                finalize the trackers. Defaults to True.
+
+        Returns:
+            List[RunResult]: The result of every pair, in order.
+        """
+        for offset, times, prices in chunks:
+            times_list: list = np.asarray(times).tolist()
+            prices_list: List[float] = np.asarray(prices, dtype=np.float64).tolist()
+            for pair, on_bar in zip(self.pairs, self.on_bars):
+                run_pair(
+                    pair, times_list, prices_list, on_bar, close=False, offset=offset
+                )
+        if close:
+            for pair in self.pairs:
+                pair.strategy.close_all_trades()
+                pair.strategy.finalize_tracking()
+        return [RunResult.from_pair(pair) for pair in self.pairs]
+
+    def run(
+        self, times: np.ndarray, prices: np.ndarray, chunk: int = 16384
+    ) -> List[RunResult]:
+        """Feeds every pair a whole series, see run_chunks"""
+        return self.run_chunks(chunked(times, prices, chunk))
+
+
+class LatencyStats:
+    """
+    Collects tick-to-decision latencies in seconds.
+
+    Attributes:
+        samples (list): Every recorded latency.
+    """
+
+    def __init__(self):
+        self.samples: List[float] = []
+
+    def record(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def summary(self) -> dict:
+        """
+        Summarizes the recorded latencies.
+
+        Returns:
+            dict: The count, mean, median, 99th percentile and max in seconds.
+        """
+        if not self.samples:
+            return {"count": 0, "mean": 0.0, "p50": 0.0, "p99": 0.0, "max": 0.0}
+        samples = np.asarray(self.samples)
+        return {
+            "count": len(samples),
+            "mean": float(samples.mean()),
+            "p50": float(np.percentile(samples, 50)),
+            "p99": float(np.percentile(samples, 99)),
+            "max": float(samples.max()),
+        }
+
+
+class SimulatedExchange:
+    """
+    Local exchange stub for paper trading loops.
+
+    Streams a price series as (time, price) ticks every ``interval`` seconds and
+    fills submitted orders at their limit price, or at the last streamed price for
+    market orders, after a fixed latency. Ticks that are overdue because the consumer
+    fell behind arrive back to back, the way a socket buffer delivers them.
+
+    Attributes:
+        times (np.ndarray): The timestamps to stream.
+        prices (np.ndarray): The prices to stream.
+        interval (float): Seconds between streamed ticks.
+        fill_latency (float): Seconds before a submitted order is filled.
+        price (float): The last streamed price.
+        fills (list): Every filled order.
+    """
+
+    def __init__(
         self,
-        trade: Trade,
-        size: float,
-        close_type: str,
-        comment: str = "",
+        times: np.ndarray,
+        prices: np.ndarray,
+        interval: float = 0.001,
+        fill_latency: float = 0.0,
+    ):
+        self.times: np.ndarray = times
+        self.prices: np.ndarray = prices
+        self.interval: float = interval
+        self.fill_latency: float = fill_latency
+        self.price: float = 0.0
+        self.fills: List[Order] = []
+
+    async def stream(self):
+        """Yields ticks on a wall-clock schedule, all overdue ticks in one burst."""
+        loop = asyncio.get_running_loop()
+        start: float = loop.time()
+        for i, (time_is, price) in enumerate(zip(self.times, self.prices)):
+            due: float = start + i * self.interval
+            if due > loop.time():
+                await asyncio.sleep(due - loop.time())
+            self.price = float(price)
+            yield float(time_is), self.price
+
+    async def submit(self, order: Order) -> Order:
+        await asyncio.sleep(self.fill_latency)
+        if order.order_type == MARKET or not order.price:
+            order.price = self.price
+        order.status = IMMEDIATE
+        self.fills.append(order)
+        return order
+
+
+async def read_ticks(reader: asyncio.StreamReader):
+    """
+    Reads "time,price" lines from a socket or pipe as (time, price) ticks.
+
+    Args:
+        reader (asyncio.StreamReader): The stream to read until EOF.
+    """
+    while line := await reader.readline():
+        time_is, price = line.split(b",")
+        yield float(time_is), float(price)
+
+
+class AsyncRunner:
+    """
+    Live and paper trading loop driven by an async price source.
+
+    A feed task consumes ticks as fast as they arrive and keeps only the latest one,
+    while a decision task runs ``on_bar`` and ``Strategy.update`` on whatever is
+    latest when it gets to run. Both share one event loop and a decision never
+    awaits, so ticks only coalesce between awaits: the ones the source delivers
+    while the decision task waits to be scheduled, such as a burst of overdue ticks,
+    collapse into the latest instead of being replayed. A slow decision holds up
+    the feed rather than being overtaken by it. Orders passed to ``submit`` are
+    routed to the exchange by a separate task, so waiting on fills never blocks the
+    feed, and their fills are opened on the strategy at the filled price.
+
+    Attributes:
+        pair (Pair): The pair to trade.
+        source: An async iterable of (time, price), an asyncio.Queue of them ended by
+            None, or an object with an async ``stream()`` such as SimulatedExchange.
+        on_bar (Callable): Called with the pair before each strategy update.
+        exchange (SimulatedExchange): Fills submitted orders, without one they are
+            queued on the strategy's open orders.
+        close (bool): Close all open trades when the source ends.
+        latency (LatencyStats): The tick-to-decision latencies.
+        ticks (int): The number of ticks received.
+        decisions (int): The number of strategy updates run.
+    """
+
+    def __init__(
+        self,
+        pair: Pair,
+        source,
+        on_bar: Optional[Callable[[Pair], None]] = None,
+        exchange: Optional[SimulatedExchange] = None,
+        close: bool = True,
+    ):
+        self.pair: Pair = pair
+        self.source = source
+        self.on_bar: Optional[Callable[[Pair], None]] = on_bar
+        self.exchange: Optional[SimulatedExchange] = exchange
+        self.close: bool = close
+        self.latency: LatencyStats = LatencyStats()
+        self.ticks: int = 0
+        self.decisions: int = 0
+        self._latest: Optional[Tuple[float, float, float]] = None
+        self._done: bool = False
+        self._ready: Optional[asyncio.Event] = None
+        self._orders: Optional[asyncio.Queue] = None
+
+    def submit(self, order: Order) -> None:
+        """Queues an order without waiting for it to be filled."""
+        if self._orders is None:
+            self.pair.strategy.place_order(order)
+        else:
+            self._orders.put_nowait(order)
+
+    async def _ticks(self):
+        if isinstance(self.source, asyncio.Queue):
+            while (item := await self.source.get()) is not None:
+                yield item
+        elif hasattr(self.source, "stream"):
+            async for item in self.source.stream():
+                yield item
+        else:
+            async for item in self.source:
+                yield item
+
+    async def _feed(self) -> None:
+        async for time_is, price in self._ticks():
+            self.ticks += 1
+            self._latest = (time_is, price, time.perf_counter())
+            self._ready.set()
+        self._done = True
+        self._ready.set()
+
+    async def _decide(self) -> None:
+        pair: Pair = self.pair
+        strategy: Strategy = pair.strategy
+        while True:
+            await self._ready.wait()
+            self._ready.clear()
+            if self._latest is not None:
+                time_is, price, received = self._latest
+                self._latest = None
+                pair.time = time_is
+                pair.price = price
+                pair.tracking.price = price
+                # entries placed by on_bar take their time and bar from the strategy,
+                # which update only stamps after it
+                strategy.time, strategy.bar_index = time_is, pair.bar_index
+                if self.on_bar is not None:
+                    self.on_bar(pair)
+                strategy.update(pair.time, pair.bar_index, pair.price)
+                self.latency.record(time.perf_counter() - received)
+                self.decisions += 1
+                pair.bar_index += 1
+            if self._done:
+                return
+
+    async def _route(self) -> None:
+        while (order := await self._orders.get()) is not None:
+            filled: Order = await self.exchange.submit(order)
+            self.pair.strategy.new_entry(
+                filled.direction,
+                filled.size,
+                filled.price,
+                filled.leverage,
+                filled.comment,
+                filled.symbol,
+            )
+
+    async def run(self) -> Pair:
+        """
+        Trades until the source is exhausted.
+
+        Returns:
+            Pair: The traded pair.
+        """
+        self._ready = asyncio.Event()
+        self._done = False
+        router: Optional[asyncio.Task] = None
+        if self.exchange is not None:
+            self._orders = asyncio.Queue()
+            router = asyncio.create_task(self._route())
+        await asyncio.gather(self._feed(), self._decide())
+        if router is not None:
+            self._orders.put_nowait(None)
+            await router
+            self._orders = None
+        if self.close:
+            self.pair.strategy.close_all_trades()
+            self.pair.strategy.finalize_tracking()
+        return self.pair
+
+
+# bump whenever an engine change alters the results of an unchanged Config and dataset
+ENGINE_VERSION = "1"
+
+
+def dataset_id(times: np.ndarray, prices: np.ndarray) -> str:
+    """Content hash of a price series, for data without a stable name of its own"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(np.ascontiguousarray(times).tobytes())
+    digest.update(np.ascontiguousarray(prices).tobytes())
+    return digest.hexdigest()
+
+
+def strategy_id(on_bar: Optional[Callable[[Pair], None]]) -> str:
+    """
+    Hash of a signal function: its source, or its bytecode when there is none, with
+    its default arguments and closure values. functools.partial wrappers are
+    unwrapped, their bound arguments hashed too. Other callables without code fall
+    back to their repr.
+    """
+    if on_bar is None:
+        return ""
+    digest = hashlib.blake2b(digest_size=16)
+    while isinstance(on_bar, functools.partial):
+        digest.update(repr((on_bar.args, sorted(on_bar.keywords.items()))).encode())
+        on_bar = on_bar.func
+    code = getattr(on_bar, "__code__", None)
+    try:
+        digest.update(inspect.getsource(on_bar).encode())
+    except (OSError, TypeError):
+        if code is None:
+            digest.update(repr(on_bar).encode())
+        else:
+            digest.update(code.co_code + repr(code.co_consts).encode())
+    cells = getattr(on_bar, "__closure__", None) or ()
+    digest.update(repr(getattr(on_bar, "__defaults__", None)).encode())
+    digest.update(repr([c.cell_contents for c in cells]).encode())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Content-addressed on-disk cache of run results.
+
+    Results are keyed by a hash of every Config field, the dataset identity, the
+    strategy code, the starting funds and ENGINE_VERSION, and stored as one
+    uncompressed ``.npz`` per key holding the Funds/Tracking summary and, optionally,
+    the trade ledger arrays and the equity curve. Reading a hit refreshes its modification time, and writes evict
+    the least recently used entries once the directory grows past ``max_bytes``.
+
+    The directory is scanned once on opening and on every eviction. In between,
+    writes add their size to a running total instead of scanning. Evictions trim
+    the cache to TRIM of ``max_bytes``, so a full cache is not rescanned on every
+    write. Entries written by other processes are counted at the next scan.
+
+    Attributes:
+        path (str): The cache directory.
+        max_bytes (int): The size past which writes evict entries.
+        total (int): The tracked size of the entries in bytes.
+    """
+
+    SUFFIX = ".npz"
+    TRIM = 0.9  # the fraction of max_bytes evictions trim the cache back to
+
+    def __init__(self, path: str, max_bytes: int = 1 << 30):
+        self.path: str = path
+        self.max_bytes: int = max_bytes
+        os.makedirs(path, exist_ok=True)
+        self.total: int = sum(size for _, size, _ in self._entries())
+
+    @staticmethod
+    def key(
+        config: Config,
+        dataset: str,
+        strategy: str = "",
+        initial_funds: float = 1000.0,
+    ) -> str:
+        """
+        Builds the cache key of a run.
+
+        Args:
+            config (Config): The config the run starts from.
+            dataset (str): The dataset identity, a name or a dataset_id hash.
+            strategy (str, optional): The strategy identity, e.g. a strategy_id hash.
+            initial_funds (float, optional): The starting funds. Defaults to 1000.
+
+        Returns:
+            str: The hex key.
+        """
+        identity: str = json.dumps(
+            {
+                "config": config.get_state(),
+                "dataset": dataset,
+                "strategy": strategy,
+                "initial_funds": float(initial_funds),
+                "engine": ENGINE_VERSION,
+            },
+            sort_keys=True,
+            default=float,
+        )
+        return hashlib.sha256(identity.encode()).hexdigest()
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, key + self.SUFFIX)
+
+    def get(self, key: str) -> Optional[dict]:
+        """
+        Looks up a result.
+
+        Args:
+            key (str): The key from ResultCache.key.
+
+        Returns:
+            dict: The "funds", "tracking", "ledger" and "curve" of the run, the last two
+                None when they weren't stored. None on a miss.
+        """
+        file: str = self._file(key)
+        try:
+            with np.load(file) as stored:
+                arrays: Dict[str, np.ndarray] = {k: stored[k] for k in stored.files}
+        except FileNotFoundError:
+            return None
+        os.utime(file)
+        result: dict = json.loads(arrays.pop("summary").tobytes())
+        ledger: Dict[str, np.ndarray] = {
+            k[len("ledger.") :]: v for k, v in arrays.items() if k.startswith("ledger.")
+        }
+        result["ledger"] = ledger or None
+        result["curve"] = arrays.get("curve")
+        return result
+
+    def put(
+        self,
+        key: str,
+        funds: dict,
+        tracking: dict,
+        ledger: Optional[Dict[str, np.ndarray]] = None,
+        curve: Optional[np.ndarray] = None,
     ) -> None:
-        """Close a trade with a specified size and type"""
-        trade.close_trade_calc(
-            size, price=self.price, close_type=close_type, comment=comment
+        """
+        Stores a result, then evicts old entries if the cache is over its size.
+
+        Args:
+            key (str): The key from ResultCache.key.
+            funds (dict): The final Funds fields.
+            tracking (dict): The final Tracking fields.
+            ledger (dict, optional): The trade ledger arrays.
+            curve (np.ndarray, optional): The equity curve rows.
+        """
+        summary: bytes = json.dumps(
+            {"funds": funds, "tracking": tracking}, default=float
+        ).encode()
+        arrays: Dict[str, np.ndarray] = {
+            "summary": np.frombuffer(summary, dtype=np.uint8)
+        }
+        if ledger is not None:
+            arrays.update({f"ledger.{k}": v for k, v in ledger.items()})
+        if curve is not None:
+            arrays["curve"] = curve
+        file: str = self._file(key)
+        temp: str = f"{file}.{os.getpid()}.tmp"
+        with open(temp, "wb") as f:
+            np.savez(f, **arrays)
+            self.total += f.tell()
+        try:
+            self.total -= os.path.getsize(file)
+        except FileNotFoundError:
+            pass
+        os.replace(temp, file)
+        if self.total > self.max_bytes:
+            self.evict()
+
+    def _entries(self) -> List[Tuple[float, int, str]]:
+        """(modification time, size, file) of every entry in the directory"""
+        entries: List[Tuple[float, int, str]] = []
+        for entry in os.scandir(self.path):
+            if entry.name.endswith(self.SUFFIX):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def evict(self) -> None:
+        """Deletes the least recently used entries until the cache fits TRIM of it"""
+        entries: List[Tuple[float, int, str]] = self._entries()
+        total: int = sum(size for _, size, _ in entries)
+        for _, size, file in sorted(entries):
+            if total <= self.max_bytes * self.TRIM:
+                break
+            try:
+                os.remove(file)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self.total = total
+
+
+def cached_run(
+    cache: ResultCache,
+    config: Config,
+    times: np.ndarray,
+    prices: np.ndarray,
+    on_bar: Optional[Callable[[Pair], None]] = None,
+    initial_funds: float = 1000.0,
+    dataset: Optional[str] = None,
+    ledger: bool = True,
+    curve: bool = False,
+) -> dict:
+    """
+    Runs a config over a series through the cache, simulating only on a miss or
+    when the stored entry lacks a requested ledger or curve.
+
+    Args:
+        cache (ResultCache): The cache to read and fill.
+        config (Config): The config to run, copied before the run.
+        times (np.ndarray): The timestamps of the series.
+        prices (np.ndarray): The prices of the series.
+        on_bar (Callable, optional): The signal function passed to run_pair.
+        initial_funds (float, optional): The starting funds. Defaults to 1000.
+        dataset (str, optional): The dataset identity. Defaults to a hash of the series.
+        ledger (bool, optional): Store the trade ledger. Defaults to True.
+        curve (bool, optional): Record and store the equity curve. Defaults to False.
+
+    Returns:
+        dict: The result as returned by ResultCache.get.
+    """
+    dataset = dataset if dataset is not None else dataset_id(times, prices)
+    key: str = cache.key(config, dataset, strategy_id(on_bar), initial_funds)
+    result: Optional[dict] = cache.get(key)
+    if (
+        result is not None
+        and (not ledger or result["ledger"] is not None)
+        and (not curve or result["curve"] is not None)
+    ):
+        return result
+    pair: Pair = Pair(config.symbol, copy.deepcopy(config), initial_funds)
+    if curve:
+        pair.strategy.recorder = EquityRecorder()
+    run_pair(pair, times, prices, on_bar)
+    result = {
+        "funds": dict(pair.funds.__dict__),
+        "tracking": dict(pair.tracking.__dict__),
+        "ledger": pair.strategy.trade_ledger() if ledger else None,
+        "curve": pair.strategy.recorder.curve if curve else None,
+    }
+    cache.put(key, **result)
+    return result
+
+
+class ResultsDB:
+    """
+    Local SQLite store of run summaries for querying across sweeps.
+
+    Every run is one row of ``runs`` with the headline Tracking metrics as indexed
+    columns, the full Funds/Tracking dicts as JSON, and its numeric config parameters
+    in an indexed ``params`` table. Adding a run key again replaces that run and
+    all of its parameters. Rows are buffered and written ``batch_size`` at a
+    time in a single transaction, and the database runs in WAL mode, so many worker
+    processes with their own ResultsDB can report into the same file without
+    serializing on per-row commits.
+
+    Attributes:
+        path (str): The database file.
+        batch_size (int): The number of buffered runs that triggers a write.
+        connection (sqlite3.Connection): The open connection.
+    """
+
+    METRICS = (
+        "net_profit",
+        "profit_factor",
+        "max_draw_down",
+        "max_run_up",
+        "win_loss_ratio",
+        "percent_profitable",
+        "avg_profit_per_trade",
+        "total_trades",
+    )
+    OPERATORS = ("<", "<=", "=", ">=", ">", "!=")
+
+    def __init__(self, path: str, batch_size: int = 500):
+        self.path: str = path
+        self.batch_size: int = batch_size
+        self.connection: sqlite3.Connection = sqlite3.connect(path, timeout=60.0)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self._runs: List[tuple] = []
+        self._params: Dict[str, List[tuple]] = {}
+        metrics: str = ", ".join(f"{m} REAL" for m in self.METRICS)
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS runs (run_key TEXT PRIMARY KEY, "
+                f"symbol TEXT, created REAL, {metrics}, funds TEXT, tracking TEXT)"
+            )
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS params "
+                "(run_key TEXT, name TEXT, value REAL)"
+            )
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS params_name_value ON params (name, value)"
+            )
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS params_run ON params (run_key)"
+            )
+            for metric in self.METRICS:
+                self.connection.execute(
+                    f"CREATE INDEX IF NOT EXISTS runs_{metric} ON runs ({metric})"
+                )
+
+    def add(
+        self,
+        funds: dict,
+        tracking: dict,
+        params: Optional[dict] = None,
+        symbol: str = "",
+        run_key: Optional[str] = None,
+    ) -> str:
+        """
+        Buffers a run, writing the buffer once it reaches batch_size.
+
+        Args:
+            funds (dict): The final Funds fields.
+            tracking (dict): The final Tracking fields.
+            params (dict, optional): The config parameters, only numeric ones are kept.
+            symbol (str, optional): The run's symbol.
+            run_key (str, optional): The run's unique key. Defaults to a random one.
+
+        Returns:
+            str: The run key.
+        """
+        run_key = run_key or uuid.uuid4().hex
+        self._runs.append(
+            (run_key, symbol, time.time())
+            + tuple(float(tracking.get(m, 0.0)) for m in self.METRICS)
+            + (json.dumps(funds, default=float), json.dumps(tracking, default=float))
+        )
+        self._params[run_key] = [
+            (run_key, name, float(value))
+            for name, value in (params or {}).items()
+            if isinstance(value, (int, float))
+        ]
+        if len(self._runs) >= self.batch_size:
+            self.flush()
+        return run_key
+
+    def add_pair(self, pair: Pair, run_key: Optional[str] = None) -> str:
+        """Buffers a finished pair with its config as parameters"""
+        return self.add(
+            dict(pair.funds.__dict__),
+            dict(pair.tracking.__dict__),
+            pair.config.get_state(),
+            pair.symbol,
+            run_key,
         )
-        self.closed_trades.append(trade)
-        self.open_trades.remove(trade)
-        trade.update_on_trade()
 
-    def close_all_trades(self) -> None:
-        """Close all open trades"""
-        for t in self.open_trades:
-            self.close_trade(t, t.size, MARKET)
+    def flush(self) -> None:
+        """Writes every buffered run in one transaction"""
+        if not self._runs:
+            return
+        columns: int = 5 + len(self.METRICS)
+        with self.connection:
+            self.connection.executemany(
+                f"INSERT OR REPLACE INTO runs VALUES ({', '.join('?' * columns)})",
+                self._runs,
+            )
+            self.connection.executemany(
+                "DELETE FROM params WHERE run_key = ?", [(k,) for k in self._params]
+            )
+            self.connection.executemany(
+                "INSERT INTO params VALUES (?, ?, ?)",
+                [row for rows in self._params.values() for row in rows],
+            )
+        self._runs = []
+        self._params = {}
+
+    def _condition(self, name: str, op: str) -> str:
+        if op not in self.OPERATORS:
+            raise ValueError(f"Invalid operator: {op}")
+        if name in self.METRICS:
+            return f"{name} {op} ?"
+        return (
+            "EXISTS (SELECT 1 FROM params p WHERE p.run_key = runs.run_key "
+            f"AND p.name = ? AND p.value {op} ?)"
+        )
 
-    def execute_order(self, order: Order) -> None:
-        """Execute an existing order"""
-        if order.status == IMMEDIATE:
-            if trade := self.get_trade_by_id(order.id):
-                if order.side == BUY:
-                    trade.size += order.size
-                else:
-                    trade.size -= order.size
-                trade.value = trade.size * order.price
-                trade.margin = trade.value / order.leverage
-                self.open_orders.remove(order)
+    def top(
+        self,
+        metric: str,
+        n: int = 50,
+        where: Optional[List[Tuple[str, str, float]]] = None,
+        ascending: bool = False,
+    ) -> List[dict]:
+        """
+        Finds the best runs by a metric. The top 50 by profit factor with a drawdown
+        shallower than X is ``top("profit_factor", 50, [("max_draw_down", ">", -X)])``.
 
-    def update(self, time_is, bar_idnex, price) -> None:
-        self.time = time_is
-        self.bar_index = bar_idnex
-        self.price = price
-        self.update_trades(price)
-        self.update_funds()
-        self.update_tracker()
+        Args:
+            metric (str): The metric column to rank by.
+            n (int, optional): The number of runs. Defaults to 50.
+            where (list, optional): (name, operator, value) filters on metric columns
+                or config parameters.
+            ascending (bool, optional): Rank the lowest values first. Defaults to False.
+
+        Returns:
+            List[dict]: The runs with their key, symbol, metrics, funds and tracking.
+        """
+        if metric not in self.METRICS:
+            raise ValueError(f"Invalid metric: {metric}")
+        self.flush()
+        conditions: List[str] = []
+        values: List[object] = []
+        for name, op, value in where or []:
+            conditions.append(self._condition(name, op))
+            values.extend((value,) if name in self.METRICS else (name, value))
+        query: str = "SELECT * FROM runs"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += f" ORDER BY {metric} {'ASC' if ascending else 'DESC'} LIMIT ?"
+        cursor = self.connection.execute(query, values + [n])
+        names: List[str] = [c[0] for c in cursor.description]
+        runs: List[dict] = []
+        for row in cursor:
+            run: dict = dict(zip(names, row))
+            run["funds"] = json.loads(run["funds"])
+            run["tracking"] = json.loads(run["tracking"])
+            runs.append(run)
+        return runs
+
+    def params(self, run_key: str) -> dict:
+        """Returns the stored config parameters of a run"""
+        self.flush()
+        return dict(
+            self.connection.execute(
+                "SELECT name, value FROM params WHERE run_key = ?", (run_key,)
+            ).fetchall()
+        )
 
+    def close(self) -> None:
+        self.flush()
+        self.connection.close()
 
-class Pair:
-    def __init__(self, symbol: str, config: Config, initiial_funds: float = 100.0):
-        self.symbol: str = symbol
-        self.config: Config = config
-        self.funds: Funds = Funds(initial=initiial_funds)
-        self.tracking: Tracking = Tracking()
-        self.strategy: Strategy = Strategy(self.config, self.funds, self.tracking)
-        self.price: float = 0.0
-        self.time: int = int(time.time())
-        self.order_ids: int = 0
-        self.trade_ids: int = 0
-        self.bar_index: int = 0
+    def __enter__(self) -> "ResultsDB":
+        return self
 
+    def __exit__(self, *exc) -> None:
+        self.close()
 
-import math
-import random
 
-from numpy import average
+def config_grid(base: Config, **values: List) -> List[Config]:
+    """
+    Builds one Config per combination of the given field values.
+
+    Args:
+        base (Config): The config every combination starts from.
+        **values: Lists of values per Config field, e.g. sl_dist=[0.01, 0.02].
+
+    Returns:
+        List[Config]: The configs, in the order of itertools.product.
+    """
+    configs: List[Config] = []
+    for combination in itertools.product(*values.values()):
+        config: Config = copy.deepcopy(base)
+        for name, value in zip(values, combination):
+            setattr(config, name, value)
+        configs.append(config)
+    return configs
+
+
+# series of a worker process, set once per worker instead of sent with every task
+_WORKER_SERIES: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+
+def _set_worker_series(times: np.ndarray, prices: np.ndarray) -> None:
+    global _WORKER_SERIES
+    _WORKER_SERIES = (times, prices)
+
+
+def _run_prefix(
+    config: Config,
+    stop: int,
+    on_bar: Optional[Callable[[Pair], None]],
+    initial_funds: float,
+) -> dict:
+    times, prices = _WORKER_SERIES
+    pair: Pair = Pair(config.symbol, copy.deepcopy(config), initial_funds)
+    run_pair(pair, times, prices, on_bar, stop=stop)
+    return dict(pair.tracking.__dict__)
+
+
+class SuccessiveHalving:
+    """
+    Successive-halving search over configs on growing prefixes of a series.
+
+    Every config runs on the first ``min_fraction`` of the data. Only the best
+    1/``eta`` by a Tracking metric survive, and their horizon grows ``eta`` times,
+    until the survivors run on the full series. Each stage runs its configs across a
+    process pool that receives the series once per worker. The candidates can differ
+    in any Config field, e.g. the sl_* exits or the tp_* ladder via config_grid.
+
+    Attributes:
+        configs (list): The candidate configs.
+        times (np.ndarray): The timestamps of the series.
+        prices (np.ndarray): The prices of the series.
+        on_bar (Callable): The module-level signal function passed to run_pair.
+        metric (str): The Tracking field to rank by.
+        maximize (bool): Rank higher metric values first.
+        eta (int): The survivor ratio and horizon growth per stage.
+        min_fraction (float): The fraction of the series of the first stage.
+        initial_funds (float): The starting funds of every run.
+        workers (int): The number of worker processes.
+        history (list): Per stage, the horizon and the (config index, metric) of
+            every config run.
+    """
+
+    def __init__(
+        self,
+        configs: List[Config],
+        times: np.ndarray,
+        prices: np.ndarray,
+        on_bar: Optional[Callable[[Pair], None]] = None,
+        metric: str = "net_profit",
+        maximize: bool = True,
+        eta: int = 3,
+        min_fraction: float = 0.1,
+        initial_funds: float = 1000.0,
+        workers: Optional[int] = None,
+    ):
+        self.configs: List[Config] = configs
+        self.times: np.ndarray = times
+        self.prices: np.ndarray = prices
+        self.on_bar: Optional[Callable[[Pair], None]] = on_bar
+        self.metric: str = metric
+        self.maximize: bool = maximize
+        if not 0 < min_fraction <= 1:
+            raise ValueError("min_fraction must be in (0, 1]")
+        self.eta: int = max(2, eta)
+        self.min_fraction: float = min_fraction
+        self.initial_funds: float = initial_funds
+        self.workers: int = workers or os.cpu_count() or 1
+        self.history: List[Tuple[int, List[Tuple[int, float]]]] = []
+
+    def horizons(self) -> List[int]:
+        """The number of bars run at every stage, ending with the full series"""
+        length: int = len(self.prices)
+        horizons: List[int] = []
+        fraction: float = self.min_fraction
+        while fraction < 1.0:
+            horizons.append(max(1, int(length * fraction)))
+            fraction *= self.eta
+        horizons.append(length)
+        return horizons
+
+    def run(self) -> List[Tuple[Config, dict]]:
+        """
+        Runs every stage.
+
+        Returns:
+            list: The (config, tracking) of the final survivors, best first.
+        """
+        survivors: List[int] = list(range(len(self.configs)))
+        results: List[dict] = []
+        self.history = []
+        with ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_set_worker_series,
+            initargs=(self.times, self.prices),
+        ) as pool:
+            for stage, horizon in enumerate(self.horizons()):
+                results = list(
+                    pool.map(
+                        _run_prefix,
+                        [self.configs[i] for i in survivors],
+                        itertools.repeat(horizon),
+                        itertools.repeat(self.on_bar),
+                        itertools.repeat(self.initial_funds),
+                    )
+                )
+                ranked: List[Tuple[int, dict]] = sorted(
+                    zip(survivors, results),
+                    key=lambda r: r[1][self.metric],
+                    reverse=self.maximize,
+                )
+                self.history.append(
+                    (horizon, [(i, r[self.metric]) for i, r in ranked])
+                )
+                if horizon == len(self.prices):
+                    return [(self.configs[i], r) for i, r in ranked]
+                keep: int = max(1, len(ranked) // self.eta)
+                survivors = [i for i, _ in ranked[:keep]]
+        return []
+
+
+def _run_segment(
+    config: Config,
+    start: int,
+    stop: int,
+    on_bar: Optional[Callable[[Pair], None]],
+    initial_funds: float,
+) -> dict:
+    times, prices = _WORKER_SERIES
+    pair: Pair = Pair(config.symbol, copy.deepcopy(config), initial_funds)
+    run_pair(pair, times, prices, on_bar, start=start, stop=stop)
+    return {
+        "funds": dict(pair.funds.__dict__),
+        "tracking": dict(pair.tracking.__dict__),
+        "ledger": pair.strategy.trade_ledger(),
+    }
+
+
+def _ledger_stats(ledgers: List[Dict[str, np.ndarray]]) -> dict:
+    """Trade statistics over several trade ledgers taken together"""
+    return trade_stats(
+        *(
+            np.concatenate([ledger[field] for ledger in ledgers] or [np.empty(0)])
+            for field in ("net_profit", "gross_profit", "gross_loss", "commission")
+        )
+    )
+
+
+class WalkForward:
+    """
+    Walk-forward optimization over rolling in-sample/out-of-sample windows.
+
+    The series is cut into segments of gcd(in_sample, step) bars and every in-sample
+    window is a run of whole segments. Each config runs once per segment, flat at the
+    segment start and closed out at its end. A window's in-sample score is the Tracking
+    metric of the trade statistics over its segments' combined ledgers, so
+    overlapping windows share their segment runs instead of re-simulating them. The
+    best config of every window then runs out-of-sample as one continuous run over
+    that window, starting flat at its first bar with fresh funds: no state or warm-up
+    is carried over from the in-sample bars, and trades still open at the window end
+    are closed there. Segment runs can also go through a ResultCache, which reuses
+    them across scheduler runs.
+
+    Attributes:
+        configs (list): The candidate configs.
+        times (np.ndarray): The timestamps of the series.
+        prices (np.ndarray): The prices of the series.
+        in_sample (int): Bars per in-sample window.
+        out_of_sample (int): Bars per out-of-sample window.
+        step (int): Bars between window starts, defaults to out_of_sample.
+        on_bar (Callable): The module-level signal function passed to run_pair.
+        metric (str): The trade statistic to pick configs by, a trade_stats key;
+            per-bar Tracking fields such as max_draw_down are not available.
+        maximize (bool): Pick higher metric values.
+        initial_funds (float): The starting funds of every run.
+        workers (int): The number of worker processes.
+        cache (ResultCache): Optional cache of segment runs.
+        dataset (str): The dataset identity used in cache keys.
+    """
+
+    def __init__(
+        self,
+        configs: List[Config],
+        times: np.ndarray,
+        prices: np.ndarray,
+        in_sample: int,
+        out_of_sample: int,
+        step: Optional[int] = None,
+        on_bar: Optional[Callable[[Pair], None]] = None,
+        metric: str = "net_profit",
+        maximize: bool = True,
+        initial_funds: float = 1000.0,
+        workers: Optional[int] = None,
+        cache: Optional[ResultCache] = None,
+        dataset: Optional[str] = None,
+    ):
+        self.configs: List[Config] = configs
+        self.times: np.ndarray = times
+        self.prices: np.ndarray = prices
+        self.in_sample: int = in_sample
+        self.out_of_sample: int = out_of_sample
+        self.step: int = step or out_of_sample
+        self.on_bar: Optional[Callable[[Pair], None]] = on_bar
+        if metric not in _ledger_stats([]):
+            raise ValueError(
+                f"Invalid metric: {metric}, must be a closed trade statistic"
+            )
+        self.metric: str = metric
+        self.maximize: bool = maximize
+        self.initial_funds: float = initial_funds
+        self.workers: int = workers or os.cpu_count() or 1
+        self.cache: Optional[ResultCache] = cache
+        self.dataset: str = dataset or (
+            dataset_id(times, prices) if cache is not None else ""
+        )
+
+    @property
+    def segment(self) -> int:
+        return math.gcd(self.in_sample, self.step)
+
+    def windows(self) -> List[Tuple[int, int, int]]:
+        """(in-sample start, out-of-sample start, out-of-sample end) of every window"""
+        windows: List[Tuple[int, int, int]] = []
+        start: int = 0
+        while start + self.in_sample + self.out_of_sample <= len(self.prices):
+            split: int = start + self.in_sample
+            windows.append((start, split, split + self.out_of_sample))
+            start += self.step
+        return windows
+
+    def _segment_runs(
+        self, pool: ProcessPoolExecutor, segments: List[int]
+    ) -> Dict[Tuple[int, int], dict]:
+        runs: Dict[Tuple[int, int], dict] = {}
+        pending: Dict[Tuple[int, int], object] = {}
+        strategy: str = strategy_id(self.on_bar)
+        for c, config in enumerate(self.configs):
+            for s in segments:
+                start, stop = s * self.segment, (s + 1) * self.segment
+                if self.cache is not None:
+                    key: str = self.cache.key(
+                        config,
+                        f"{self.dataset}[{start}:{stop}]",
+                        strategy,
+                        self.initial_funds,
+                    )
+                    cached: Optional[dict] = self.cache.get(key)
+                    if cached is not None and cached["ledger"] is not None:
+                        runs[c, s] = cached
+                        continue
+                pending[c, s] = pool.submit(
+                    _run_segment, config, start, stop, self.on_bar, self.initial_funds
+                )
+        for (c, s), future in pending.items():
+            runs[c, s] = future.result()
+            if self.cache is not None:
+                start, stop = s * self.segment, (s + 1) * self.segment
+                self.cache.put(
+                    self.cache.key(
+                        self.configs[c],
+                        f"{self.dataset}[{start}:{stop}]",
+                        strategy,
+                        self.initial_funds,
+                    ),
+                    **runs[c, s],
+                )
+        return runs
+
+    def run(self) -> dict:
+        """
+        Optimizes every window in-sample and evaluates its pick out-of-sample.
+
+        Returns:
+            dict: "windows", a list with the ranges, chosen config, in-sample
+                statistics and out-of-sample tracking of every window, and
+                "out_of_sample", the trade statistics of all out-of-sample trades.
+        """
+        windows: List[Tuple[int, int, int]] = self.windows()
+        segment: int = self.segment
+        needed: List[int] = sorted(
+            {
+                s
+                for start, split, _ in windows
+                for s in range(start // segment, split // segment)
+            }
+        )
+        pick = max if self.maximize else min
+        with ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_set_worker_series,
+            initargs=(self.times, self.prices),
+        ) as pool:
+            runs: Dict[Tuple[int, int], dict] = self._segment_runs(pool, needed)
+            picks: List[Tuple[int, dict]] = []
+            for start, split, _ in windows:
+                segments = range(start // segment, split // segment)
+                scores: List[Tuple[int, dict]] = [
+                    (c, _ledger_stats([runs[c, s]["ledger"] for s in segments]))
+                    for c in range(len(self.configs))
+                ]
+                picks.append(pick(scores, key=lambda score: score[1][self.metric]))
+            tests = [
+                pool.submit(
+                    _run_segment,
+                    self.configs[c],
+                    split,
+                    stop,
+                    self.on_bar,
+                    self.initial_funds,
+                )
+                for (c, _), (_, split, stop) in zip(picks, windows)
+            ]
+            results: List[dict] = []
+            for (c, stats), (start, split, stop), test in zip(picks, windows, tests):
+                tested: dict = test.result()
+                results.append(
+                    {
+                        "in_sample": (start, split),
+                        "out_of_sample": (split, stop),
+                        "config": self.configs[c],
+                        "in_sample_stats": stats,
+                        "out_of_sample_tracking": tested["tracking"],
+                        "ledger": tested["ledger"],
+                    }
+                )
+        return {
+            "windows": results,
+            "out_of_sample": _ledger_stats([r.pop("ledger") for r in results]),
+        }
+
+
+def _exit_scan(trade: Trade, prices: np.ndarray) -> Tuple[int, Optional[float], bool]:
+    """
+    Finds the first bar of a price window where a trade's exit rules could fire.
+
+    Returns:
+        tuple: The first candidate index, len(prices) without one, and the trailing
+            stop peak and activation of the bar before it.
+    """
+    entry: float = trade.entry_price
+    is_long: bool = trade.size > 0
+    hits: np.ndarray = np.zeros(len(prices), dtype=bool)
+    if trade.tp_targets and trade.tp_enabled:
+        target: float = trade.tp_targets[0]
+        hits |= prices > target if is_long else prices < target
+    if trade.sl_enabled:
+        hits |= (
+            prices < entry * (1 - trade.sl_dist)
+            if is_long
+            else prices > entry * (1 + trade.sl_dist)
+        )
+    peak: Optional[float] = trade.sl_trail_peak
+    active: bool = trade.sl_trail_activated
+    if trade.sl_trail_enabled and trade.sl_trail_dist:
+        if is_long:
+            peaks = np.maximum.accumulate(prices)
+            triggered = prices > entry * (1 + trade.sl_trigger_pct)
+        else:
+            peaks = np.minimum.accumulate(prices)
+            triggered = prices < entry * (1 - trade.sl_trigger_pct)
+        if peak is not None:
+            peaks = np.maximum(peaks, peak) if is_long else np.minimum(peaks, peak)
+        activated = np.logical_or.accumulate(triggered) | active
+        hits |= activated & (
+            prices < peaks * (1 - trade.sl_trail_dist)
+            if is_long
+            else prices > peaks * (1 + trade.sl_trail_dist)
+        )
+    first: int = int(np.argmax(hits)) if hits.any() else len(prices)
+    if first and trade.sl_trail_enabled and trade.sl_trail_dist:
+        peak, active = float(peaks[first - 1]), bool(activated[first - 1])
+    return first, peak, active
+
+
+def replay_trade(
+    trade: Trade, times: np.ndarray, prices: np.ndarray, start: int, window: int = 256
+) -> Trade:
+    """
+    Runs an opened trade's exits from its entry bar to its close.
+
+    Stretches where no exit rule can fire are applied in one vectorized step, taking
+    the trade's excursions and trailing stop state from the window's extremes. Only
+    the bars where an exit may happen go through Trade.update. A trade still open at
+    the end of the series is closed at the last price, like close_all_trades.
+
+    Args:
+        trade (Trade): The trade, as built by Strategy.make_trade.
+        times (np.ndarray): The timestamps of the series.
+        prices (np.ndarray): The prices of the series.
+        start (int): The entry bar.
+        window (int, optional): The first look-ahead length, doubled while no exit
+            is found. Defaults to 256.
+
+    Returns:
+        Trade: The closed trade.
+    """
+    end: int = len(prices)
+    i: int = start
+    while trade.status == OPEN and i < end:
+        segment: np.ndarray = prices[i : i + window]
+        first, peak, active = _exit_scan(trade, segment)
+        if first:
+            moves: np.ndarray = segment[:first] / trade.entry_price - 1
+            if trade.size < 0:
+                moves = -moves
+            trade.data.max_draw_down = min(trade.data.max_draw_down, float(moves.min()))
+            trade.data.max_run_up = max(trade.data.max_run_up, float(moves.max()))
+            trade.calc_profit(float(segment[first - 1]))
+            trade.sl_trail_peak, trade.sl_trail_activated = peak, active
+        if first == len(segment):
+            i += first
+            window *= 2
+            continue
+        i += first
+        trade.tracking.price = float(prices[i])
+        trade.update(float(prices[i]))
+        if trade.status != OPEN:
+            trade.data.exit_bar_index = i
+            trade.data.exit_time = times[i]
+        i += 1
+    if trade.status == OPEN:
+        trade.tracking.price = float(prices[-1])
+        trade.close_trade_calc(trade.size, float(prices[-1]), MARKET, "")
+        trade.data.exit_bar_index = end - 1
+        trade.data.exit_time = times[-1]
+    return trade
+
+
+def _replay_entries(config: Config, entries: Dict[str, np.ndarray]) -> List[dict]:
+    times, prices = _WORKER_SERIES
+    strategy: Strategy = Strategy(copy.deepcopy(config), Funds(), Tracking())
+    closed: List[dict] = []
+    for k in range(len(entries["bar_index"])):
+        strategy.bar_index = int(entries["bar_index"][k])
+        strategy.time = times[strategy.bar_index]
+        strategy.tracking = Tracking()
+        trade: Trade = strategy.make_trade(
+            str(entries["direction"][k]),
+            float(entries["size"][k]),
+            float(entries["price"][k]),
+            float(entries["leverage"][k]),
+            str(entries["comment"][k]),
+            str(entries["symbol"][k]),
+        )
+        replay_trade(trade, times, prices, strategy.bar_index)
+        closed.append(trade.data.__dict__)
+    return closed
+
+
+def replay_exits(
+    entries: Dict[str, np.ndarray],
+    config: Config,
+    times: np.ndarray,
+    prices: np.ndarray,
+    workers: Optional[int] = None,
+) -> dict:
+    """
+    Re-simulates recorded entries under new exit settings without a full rerun.
+
+    Every entry from Strategy.entry_events opens a trade with its recorded size,
+    which runs to its exit on its own from its entry bar, as entries placed from
+    on_bar or submitted orders do. The replay is exact for runs whose exits all
+    come from the stop loss, take profit and trailing stop rules, and whose entry
+    sizes weren't capped by funds freed or tied up by other trades in restrict_size.
+    Exits placed by a signal function are not replayed.
+
+    Args:
+        entries (dict): The entry arrays from Strategy.entry_events.
+        config (Config): The config holding the new sl_*/tp_* exit settings.
+        times (np.ndarray): The timestamps of the series.
+        prices (np.ndarray): The prices of the series.
+        workers (int, optional): Worker processes to split the entries over,
+            1 runs in process. Defaults to the CPU count.
+
+    Returns:
+        dict: "ledger", the closed trade arrays in entry order, and "tracking", their
+            trade statistics.
+    """
+    workers = workers or os.cpu_count() or 1
+    count: int = len(entries["bar_index"])
+    if workers == 1 or count < 2:
+        _set_worker_series(times, prices)
+        closed: List[dict] = _replay_entries(config, entries)
+    else:
+        bounds: np.ndarray = np.linspace(0, count, min(workers, count) + 1).astype(int)
+        chunks: List[Dict[str, np.ndarray]] = [
+            {k: v[a:b] for k, v in entries.items()}
+            for a, b in zip(bounds[:-1], bounds[1:])
+        ]
+        with ProcessPoolExecutor(
+            max_workers=len(chunks),
+            initializer=_set_worker_series,
+            initargs=(times, prices),
+        ) as pool:
+            closed = [
+                d
+                for part in pool.map(_replay_entries, itertools.repeat(config), chunks)
+                for d in part
+            ]
+    ledger: Dict[str, np.ndarray] = {
+        field: np.array([d[field] for d in closed], dtype=np.float64)
+        for field in LEDGER_FIELDS
+    }
+    return {
+        "ledger": ledger,
+        "tracking": trade_stats(
+            ledger["net_profit"],
+            ledger["gross_profit"],
+            ledger["gross_loss"],
+            ledger["commission"],
+        ),
+    }
 
 
 class Price:
@@ -1403,26 +5625,26 @@ def main() -> None:
         pair.time += 10000
         pair.bar_index += 1
     pair.strategy.close_all_trades()
+    pair.strategy.finalize_tracking()
     print(json.dumps(pair.funds.__dict__, indent=4))
 
     print(json.dumps(pair.strategy.tracking.__dict__, indent=4))
 
 
-import time
-
-start_time = start_time = time.process_time()
-print("Hello World")
-end_time = start_time = time.process_time()
+if __name__ == "__main__":
+    start_time = start_time = time.process_time()
+    print("Hello World")
+    end_time = start_time = time.process_time()
 
-print(f"Start Time : {start_time}")
-print(f"End Time : {end_time}")
-print(f"Execution Time : {end_time - start_time:0.6f}")
+    print(f"Start Time : {start_time}")
+    print(f"End Time : {end_time}")
+    print(f"Execution Time : {end_time - start_time:0.6f}")
 
-print()
-start_time = time.process_time()
-main()
-end_time = time.process_time()
+    print()
+    start_time = time.process_time()
+    main()
+    end_time = time.process_time()
 
-print(f"Start Time : {start_time}")
-print(f"End Time : {end_time}")
-print(f"Execution Time  : {end_time - start_time}")
+    print(f"Start Time : {start_time}")
+    print(f"End Time : {end_time}")
+    print(f"Execution Time  : {end_time - start_time}")
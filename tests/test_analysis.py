@@ -0,0 +1,139 @@
+import math
+import statistics
+
+import numpy as np
+import pytest
+
+import performance_analysis as pa
+from q import EquityRecorder
+
+
+@pytest.fixture(scope="module")
+def equity():
+    rng = np.random.default_rng(5)
+    return 1000 * np.exp(np.cumsum(rng.normal(0, 0.01, 200)))
+
+
+@pytest.fixture(scope="module")
+def pnl():
+    return np.random.default_rng(6).normal(0.5, 10, 60).round(2)
+
+
+def loop_streaks(wins):
+    best = {True: 0, False: 0}
+    current, run = None, 0
+    for win in wins:
+        run = run + 1 if win == current else 1
+        current = win
+        best[win] = max(best[win], run)
+    last_wins = run if current else 0
+    last_losses = run if current is False else 0
+    return best[True], best[False], last_wins, last_losses
+
+
+def loop_drawdown(equity, times):
+    peak, peak_at, depth, duration = equity[0], 0, 0.0, 0.0
+    for i, value in enumerate(equity):
+        if value >= peak:
+            peak, peak_at = value, i
+        depth = min(depth, value / peak - 1)
+        duration = max(duration, times[i] - times[peak_at])
+    return depth, duration
+
+
+def loop_runup(equity):
+    low, best = equity[0], 0.0
+    for value in equity:
+        low = min(low, value)
+        best = max(best, value / low - 1)
+    return best
+
+
+def test_curve_types_share_fields():
+    assert EquityRecorder.FIELDS == pa.CURVE_FIELDS
+
+
+@pytest.mark.parametrize(
+    "wins", [[], [True], [False, False], [True, True, False, True, True, True, False]]
+)
+def test_streaks(wins):
+    assert pa.streaks(np.array(wins, dtype=bool)) == loop_streaks(wins)
+
+
+def test_streaks_random():
+    wins = np.random.default_rng(7).random(500) < 0.5
+    assert pa.streaks(wins) == loop_streaks(wins.tolist())
+
+
+def test_trade_stats(pnl):
+    stats = pa.trade_stats(pnl)
+    wins = [p for p in pnl if p > 0]
+    losses = [-p for p in pnl if p <= 0]
+    assert stats["total_trades"] == len(pnl)
+    assert stats["total_winning_trades"] == len(wins)
+    assert stats["avg_win"] == pytest.approx(sum(wins) / len(wins))
+    assert stats["avg_loss"] == pytest.approx(sum(losses) / len(losses))
+    assert stats["profit_factor"] == pytest.approx(sum(wins) / sum(losses))
+    assert stats["net_profit"] == pytest.approx(sum(pnl))
+    assert stats["percent_profitable"] == pytest.approx(len(wins) / len(pnl))
+    streaks = loop_streaks([p > 0 for p in pnl])
+    assert (stats["max_consecutive_wins"], stats["max_consecutive_losses"]) == (
+        streaks[:2]
+    )
+
+
+def test_drawdowns(equity):
+    peaks = [max(equity[: i + 1]) for i in range(len(equity))]
+    expected = [v / p - 1 for v, p in zip(equity, peaks)]
+    np.testing.assert_allclose(pa.drawdowns(equity), expected)
+    times = np.arange(len(equity)) * 60.0
+    depth, duration = pa.max_drawdown(equity, times)
+    assert (depth, duration) == pytest.approx(loop_drawdown(equity, times))
+    assert pa.max_runup(equity) == pytest.approx(loop_runup(equity))
+
+
+def test_ratios(equity):
+    returns = pa.period_returns(equity)
+    expected = [b / a - 1 for a, b in zip(equity, equity[1:])]
+    np.testing.assert_allclose(returns, expected)
+    mean = statistics.fmean(expected)
+    assert pa.sharpe(returns, 252) == pytest.approx(
+        mean / statistics.stdev(expected) * math.sqrt(252)
+    )
+    downside = math.sqrt(sum(min(r, 0.0) ** 2 for r in expected) / len(expected))
+    assert pa.sortino(returns, 252) == pytest.approx(mean / downside * math.sqrt(252))
+    years = (len(equity) - 1) / 252
+    annual = (equity[-1] / equity[0]) ** (1 / years) - 1
+    depth, _ = loop_drawdown(equity, range(len(equity)))
+    assert pa.calmar(equity, 252) == pytest.approx(annual / -depth)
+
+
+def test_exposure():
+    margin = [0.0, 1.0, 2.0, 0.0, 0.0, 3.0, 0.0, 0.0]
+    assert pa.exposure(np.array(margin)) == sum(m > 0 for m in margin) / len(margin)
+    assert pa.exposure(np.array([])) == 0.0
+
+
+def test_analyze(equity, pnl):
+    n = len(equity)
+    curve = np.zeros((n, len(pa.CURVE_FIELDS)))
+    column = {name: i for i, name in enumerate(pa.CURVE_FIELDS)}
+    curve[:, column["time"]] = np.arange(n) * 60.0
+    curve[:, column["equity"]] = equity
+    curve[:, column["margin"]] = np.arange(n) % 3
+    entries = np.arange(len(pnl)) * 3.0
+    ledger = {
+        "net_profit": pnl,
+        "entry_bar_index": entries,
+        "exit_bar_index": entries + np.arange(len(pnl)) % 5,
+    }
+    report = pa.analyze(curve, ledger, 252)
+    depth, duration = loop_drawdown(equity, curve[:, column["time"]])
+    assert report["max_draw_down"] == pytest.approx(depth)
+    assert report["max_draw_down_duration"] == pytest.approx(duration)
+    assert report["max_run_up"] == pytest.approx(loop_runup(equity))
+    assert report["exposure"] == pytest.approx(2 / 3, abs=0.01)
+    assert report["net_profit"] == pytest.approx(pnl.sum())
+    durations = report["trade_durations"]
+    assert durations["max"] == 4.0
+    assert durations["p50"] == pytest.approx(np.median(np.arange(len(pnl)) % 5))
@@ -0,0 +1,40 @@
+import numpy as np
+
+from q import TickArchive, varint_decode, varint_encode
+
+
+def test_read_keeps_equal_times_across_blocks(tmp_path):
+    times = np.array([0.0, 1.0, 2.0, 2.0, 2.0, 2.0, 3.0])
+    prices = np.arange(len(times), dtype=float) + 100.0
+    archive = TickArchive.write(
+        str(tmp_path / "ticks.qtk"), times, prices, 1.0, time_unit=1.0, block_size=3
+    )
+    assert archive.index["first_time"].tolist() == [0, 2, 3]
+    read_times, read_prices = archive.read(2.0)
+    np.testing.assert_array_equal(read_times, times[2:])
+    np.testing.assert_array_equal(read_prices, prices[2:])
+    read_times, _ = archive.read(1.0, 3.0)
+    np.testing.assert_array_equal(read_times, times[1:6])
+
+
+def test_varints_round_trip_every_length():
+    values = np.array(
+        [0, 1, 127, 128, 16383, 16384, 2**35, 2**63 - 1, 2**63, 2**64 - 1],
+        dtype=np.uint64,
+    )
+    np.testing.assert_array_equal(varint_decode(varint_encode(values)), values)
+    small = np.arange(128, dtype=np.uint64)
+    np.testing.assert_array_equal(varint_decode(varint_encode(small)), small)
+
+
+def test_blocks_round_trip_jumps_both_ways(tmp_path):
+    rng = np.random.default_rng(6)
+    times = np.cumsum(rng.exponential(5.0, 5000)).round(6)
+    moves = rng.integers(-3, 4, len(times)) * 10 ** rng.integers(0, 7, len(times))
+    prices = 1000.0 + np.cumsum(moves) * 0.01
+    archive = TickArchive.write(
+        str(tmp_path / "ticks.qtk"), times, prices, 0.01, block_size=1024
+    )
+    read_times, read_prices = archive.read()
+    np.testing.assert_allclose(read_times, times, rtol=0, atol=1e-6)
+    np.testing.assert_allclose(read_prices, prices, rtol=0, atol=1e-6)
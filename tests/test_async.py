@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+from q import LONG, AsyncRunner, Config, LatencyStats, Pair
+
+TICKS = [(float(t), 100.0 + t) for t in range(20)]
+
+
+async def paced():
+    for tick in TICKS:
+        yield tick
+        await asyncio.sleep(0)
+
+
+def run(source, on_bar=None):
+    runner = AsyncRunner(Pair("BTCUSDT", Config(), 1000.0), source, on_bar)
+    asyncio.run(runner.run())
+    return runner
+
+
+def test_paced_ticks_are_decided_in_order():
+    seen = []
+    runner = run(paced(), lambda pair: seen.append((pair.time, pair.price)))
+    assert seen == TICKS
+    assert runner.ticks == runner.decisions == len(TICKS)
+    assert runner.pair.bar_index == len(TICKS)
+
+
+def test_burst_without_awaits_coalesces_into_the_latest_tick():
+    queue = asyncio.Queue()
+    for tick in TICKS:
+        queue.put_nowait(tick)
+    queue.put_nowait(None)
+    seen = []
+    runner = run(queue, lambda pair: seen.append((pair.time, pair.price)))
+    assert runner.ticks == len(TICKS)
+    assert runner.decisions == 1
+    assert seen == [TICKS[-1]]
+
+
+def test_on_bar_entries_are_stamped_with_their_tick():
+    def enter(pair):
+        if pair.bar_index == 5:
+            pair.strategy.new_entry(LONG, 1.0, pair.price, 1)
+
+    runner = run(paced(), enter)
+    (trade,) = runner.pair.strategy.closed_trades
+    assert trade.data.entry_bar_index == 5
+    assert trade.data.entry_time == TICKS[5][0]
+
+
+def test_latency_percentiles():
+    stats = LatencyStats()
+    assert stats.summary() == {
+        "count": 0,
+        "mean": 0.0,
+        "p50": 0.0,
+        "p99": 0.0,
+        "max": 0.0,
+    }
+    for ms in range(1, 101):
+        stats.record(ms / 1000)
+    summary = stats.summary()
+    assert summary["count"] == 100
+    assert summary["mean"] == pytest.approx(0.0505)
+    assert summary["p50"] == pytest.approx(0.0505)
+    assert summary["p99"] == pytest.approx(0.09901)
+    assert summary["max"] == 0.1
+
+
+def test_latencies_are_recorded_per_decision():
+    runner = run(paced())
+    summary = runner.latency.summary()
+    assert summary["count"] == runner.decisions
+    assert 0.0 <= summary["p50"] <= summary["p99"] <= summary["max"]
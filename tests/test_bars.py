@@ -0,0 +1,115 @@
+import numpy as np
+import pytest
+
+from q import (
+    ADVERSE_FIRST,
+    HIGH_FIRST,
+    LOW_FIRST,
+    LEDGER_FIELDS,
+    LONG,
+    NEAREST_FIRST,
+    SHORT,
+    Checkpointer,
+    Config,
+    Pair,
+    resample,
+    run_bars,
+)
+
+# take profit at 0.5%, stop loss at 2%
+TP_LONG, SL_LONG, TP_SHORT, SL_SHORT = 100.5, 98.0, 99.5, 102.0
+
+
+def run_one_bar(path, side, high, low):
+    config = Config()
+    config.sl_trail_enabled = False
+    config.intrabar_path = path
+    config.leverage = 2.0
+    pair = Pair("BTCUSDT", config, 1000.0)
+
+    def enter(pair):
+        if pair.bar_index == 0:
+            pair.strategy.new_entry(side, 1.0, pair.price, 1)
+
+    # a flat bar to enter on, then one bar reaching both exits
+    bars = np.array([[100.0, 100.0], [100.0, high], [100.0, low], [100.0, 99.0]])
+    run_bars(pair, np.array([0.0, 60.0]), bars, enter, close=False)
+    assert not pair.strategy.open_trades
+    (trade,) = pair.strategy.closed_trades
+    return trade.data.exit_price
+
+
+@pytest.mark.parametrize(
+    "path, side, exit_price",
+    [
+        (HIGH_FIRST, LONG, TP_LONG),
+        (HIGH_FIRST, SHORT, SL_SHORT),
+        (LOW_FIRST, LONG, SL_LONG),
+        (LOW_FIRST, SHORT, TP_SHORT),
+        (ADVERSE_FIRST, LONG, SL_LONG),
+        (ADVERSE_FIRST, SHORT, SL_SHORT),
+    ],
+)
+def test_path_decides_stop_loss_or_take_profit(path, side, exit_price):
+    assert run_one_bar(path, side, 103.0, 97.0) == pytest.approx(exit_price)
+
+
+@pytest.mark.parametrize(
+    "high, low, exit_price", [(102.5, 97.0, TP_LONG), (103.0, 97.5, SL_LONG)]
+)
+def test_nearest_first_walks_the_closer_extreme_first(high, low, exit_price):
+    assert run_one_bar(NEAREST_FIRST, LONG, high, low) == pytest.approx(exit_price)
+
+
+@pytest.fixture
+def bars():
+    rng = np.random.default_rng(5)
+    closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.003, 600)))
+    opens = np.append(100.0, closes[:-1])
+    spread = rng.uniform(0, 0.004, (2, len(closes)))
+    highs = np.maximum(opens, closes) * (1 + spread[0])
+    lows = np.minimum(opens, closes) * (1 - spread[1])
+    return np.arange(len(closes)) * 60.0, np.vstack((opens, highs, lows, closes))
+
+
+def signal(pair):
+    if pair.bar_index % 20 == 0:
+        side = LONG if pair.bar_index % 40 else SHORT
+        pair.strategy.new_entry(side, 0.1, pair.price, 1)
+
+
+def new_pair():
+    pair = Pair("BTCUSDT", Config(), 10000.0)
+    pair.add_timeframe(300.0)
+    return pair
+
+
+def test_timeframes_aggregate_the_bars(bars):
+    times, ohlc = bars
+    pair = run_bars(new_pair(), times, ohlc, signal)
+    higher = resample(np.repeat(times, 4), ohlc.T.ravel(), 300.0)
+    higher[5] /= 4
+    resampler = pair.timeframes[300.0]
+    np.testing.assert_array_equal(resampler.bars(), higher.T[:-1])
+    assert resampler.bar == higher.T[-1].tolist()
+
+
+def test_resumed_run_matches_straight_run(tmp_path, bars):
+    times, ohlc = bars
+    expected = run_bars(new_pair(), times, ohlc, signal)
+    path = str(tmp_path / "bars.ckpt")
+    killed = new_pair()
+    checkpoint = Checkpointer(path, 0.0)
+    run_bars(killed, times, ohlc, signal, stop=333, close=False, checkpoint=checkpoint)
+    pair = new_pair()
+    start = Checkpointer(path, 0.0).resume(pair)
+    assert start == 333
+    run_bars(pair, times, ohlc, signal, start)
+    assert pair.funds.__dict__ == expected.funds.__dict__
+    assert pair.tracking.__dict__ == expected.tracking.__dict__
+    ledger, expected_ledger = (p.strategy.trade_ledger() for p in (pair, expected))
+    for field in LEDGER_FIELDS:
+        np.testing.assert_array_equal(ledger[field], expected_ledger[field])
+    assert pair.timeframes[300.0].bars().tolist() == (
+        expected.timeframes[300.0].bars().tolist()
+    )
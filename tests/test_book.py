@@ -0,0 +1,25 @@
+import pytest
+
+from q import ASK, LONG, Config, Funds, OrderBook, Strategy, Tracking
+
+
+def make_strategy():
+    config = Config()
+    strategy = Strategy(config, Funds(1e9), Tracking())
+    strategy.update(0.0, 0, 100.0)
+    strategy.book = OrderBook()
+    strategy.book.apply([ASK, ASK], [100.0, 101.0], [1.0, 1.0])
+    return strategy
+
+
+def test_basket_entries_walk_the_book():
+    single = make_strategy()
+    for size in (1.5, 1.0):
+        single.new_entry(LONG, size, 100.0, 1)
+    basket = make_strategy()
+    trades = basket.new_entries([LONG, LONG], [1.5, 1.0], [100.0, 100.0])
+    assert [t.entry_price for t in trades] == pytest.approx(
+        [t.entry_price for t in single.open_trades]
+    )
+    assert trades[0].entry_price > 100.0
+    assert basket.book.asks == single.book.asks == {}
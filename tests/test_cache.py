@@ -0,0 +1,112 @@
+import functools
+import os
+
+import numpy as np
+import pytest
+
+from q import LONG, Config, ResultCache, cached_run, strategy_id
+
+
+def signal(pair, every=20):
+    if pair.bar_index % every == 0:
+        pair.strategy.new_entry(LONG, 1.0, pair.price, 1)
+
+
+@pytest.fixture
+def series():
+    rng = np.random.default_rng(1)
+    prices = 100 * np.exp(np.cumsum(rng.normal(0, 0.002, 2000)))
+    return np.arange(len(prices), dtype=float), prices
+
+
+def test_initial_funds_changes_key(tmp_path, series):
+    cache = ResultCache(str(tmp_path))
+    rich = cached_run(cache, Config(), *series, signal, initial_funds=1000.0)
+    poor = cached_run(cache, Config(), *series, signal, initial_funds=50.0)
+    assert ResultCache.key(Config(), "d", "s", 1000.0) != ResultCache.key(
+        Config(), "d", "s", 50.0
+    )
+    assert poor["funds"]["equity"] < 100 < rich["funds"]["equity"]
+
+
+def test_key_follows_config_dataset_and_strategy():
+    base = ResultCache.key(Config(), "d", "s")
+    changed = Config()
+    changed.sl_dist = 0.03
+    assert ResultCache.key(changed, "d", "s") != base
+    assert ResultCache.key(Config(), "e", "s") != base
+    assert ResultCache.key(Config(), "d", "t") != base
+    assert ResultCache.key(Config(), "d", "s") == base
+
+
+def test_hit_returns_stored_result(tmp_path, series):
+    cache = ResultCache(str(tmp_path))
+    first = cached_run(cache, Config(), *series, signal)
+    second = cached_run(cache, Config(), *series, signal)
+    assert second["funds"] == first["funds"]
+
+
+def test_strategy_id_of_partials():
+    assert strategy_id(functools.partial(signal, every=10)) != strategy_id(
+        functools.partial(signal, every=30)
+    )
+    assert strategy_id(functools.partial(signal, every=10)) == strategy_id(
+        functools.partial(signal, every=10)
+    )
+
+
+def test_strategy_id_of_closures():
+    def make(every):
+        def on_bar(pair):
+            signal(pair, every)
+
+        return on_bar
+
+    assert strategy_id(make(10)) != strategy_id(make(30))
+
+
+def entry(k):
+    return {"equity": float(k)}, {"total_trades": k}, {"net_profit": np.arange(200.0)}
+
+
+def cache_files(path):
+    return sorted(p.name for p in path.iterdir() if p.suffix == ResultCache.SUFFIX)
+
+
+def test_writes_scan_the_directory_only_to_evict(tmp_path, monkeypatch):
+    cache = ResultCache(str(tmp_path))
+    cache.put("probe", *entry(0))
+    size = cache.total
+    cache = ResultCache(str(tmp_path), max_bytes=20 * size)
+    assert cache.total == size
+    scans = []
+    real_scandir = os.scandir
+    monkeypatch.setattr(os, "scandir", lambda p: scans.append(p) or real_scandir(p))
+    for k in range(100):
+        cache.put(f"key{k}", *entry(k))
+        assert cache.total <= cache.max_bytes
+    # each eviction frees 10% of max_bytes, two entries
+    assert 0 < len(scans) <= 50
+    assert cache.total == sum(
+        os.path.getsize(tmp_path / f) for f in cache_files(tmp_path)
+    )
+
+
+def test_rewriting_a_key_does_not_grow_the_total(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    for k in range(10):
+        cache.put("same", *entry(1))
+    assert cache.total == os.path.getsize(tmp_path / "same.npz")
+
+
+def test_eviction_drops_the_least_recently_used(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    cache.put("old", *entry(0))
+    cache = ResultCache(str(tmp_path), max_bytes=int(cache.total * 3.5))
+    os.utime(tmp_path / "old.npz", (1, 1))
+    cache.put("older", *entry(1))
+    os.utime(tmp_path / "older.npz", (0, 0))
+    cache.put("new", *entry(2))
+    assert cache.get("older") is not None
+    cache.put("newest", *entry(3))
+    assert cache_files(tmp_path) == ["new.npz", "newest.npz", "older.npz"]
@@ -0,0 +1,135 @@
+import numpy as np
+import pytest
+
+from q import (
+    ASK,
+    BID,
+    BOOK_EVENT,
+    LEDGER_FIELDS,
+    LONG,
+    SHORT,
+    BookReplay,
+    Checkpointer,
+    Config,
+    EquityRecorder,
+    Pair,
+    chunked,
+    run_pair,
+)
+
+
+@pytest.fixture(scope="module")
+def series():
+    rng = np.random.default_rng(3)
+    prices = 100 * np.exp(np.cumsum(rng.normal(0, 0.002, 3000)))
+    return np.arange(len(prices), dtype=float), prices
+
+
+def book_events(times, prices):
+    events = []
+    for t, p in zip(times[::100], prices[::100]):
+        events.append((t, 0, 0.0, 0.0))
+        for level in range(1, 4):
+            events.append((t, ASK, p * (1 + 0.001 * level), 0.05))
+            events.append((t, BID, p * (1 - 0.001 * level), 0.05))
+    return np.array(events, dtype=BOOK_EVENT)
+
+
+def signal(pair):
+    if pair.bar_index % 30 == 0:
+        side = LONG if pair.bar_index % 60 else SHORT
+        pair.strategy.new_entry(side, 0.1, pair.price, 1)
+
+
+def new_pair():
+    pair = Pair("BTCUSDT", Config(), 10000.0)
+    pair.strategy.recorder = EquityRecorder()
+    pair.add_timeframe(60.0)
+    return pair
+
+
+def assert_same(pair, expected):
+    assert pair.funds.__dict__ == expected.funds.__dict__
+    assert pair.tracking.__dict__ == expected.tracking.__dict__
+    ledger, expected_ledger = (p.strategy.trade_ledger() for p in (pair, expected))
+    for field in LEDGER_FIELDS:
+        np.testing.assert_array_equal(ledger[field], expected_ledger[field])
+    np.testing.assert_array_equal(
+        pair.strategy.recorder.curve, expected.strategy.recorder.curve
+    )
+    assert pair.timeframes[60.0].bars().tolist() == (
+        expected.timeframes[60.0].bars().tolist()
+    )
+
+
+@pytest.mark.parametrize("book", [False, True])
+def test_resumed_run_matches_straight_run(tmp_path, series, book):
+    times, prices = series
+    events = book_events(times, prices) if book else None
+    replay = (lambda: BookReplay(events)) if book else (lambda: None)
+    expected = run_pair(new_pair(), times, prices, signal, replay=replay())
+    path = str(tmp_path / "run.ckpt")
+    killed = new_pair()
+    run_pair(
+        killed,
+        times,
+        prices,
+        signal,
+        stop=1712,
+        close=False,
+        checkpoint=Checkpointer(path, 0.0),
+        replay=replay(),
+    )
+    assert killed.strategy.closed_trades
+    pair = new_pair()
+    checkpoint = Checkpointer(path, 0.0)
+    fresh = replay()
+    start = checkpoint.resume(pair, replay=fresh)
+    assert start == 1712
+    run_pair(pair, times, prices, signal, start, checkpoint=checkpoint, replay=fresh)
+    assert_same(pair, expected)
+
+
+def test_resumed_chunk_continues_at_its_offset(tmp_path, series):
+    times, prices = series
+    expected = run_pair(new_pair(), times, prices, signal)
+    path = str(tmp_path / "run.ckpt")
+    killed = new_pair()
+    for offset, t, p in chunked(times, prices, 1000):
+        stop = 700 if offset == 2000 else None
+        run_pair(
+            killed,
+            t,
+            p,
+            signal,
+            stop=stop,
+            close=False,
+            checkpoint=Checkpointer(path, 0.0),
+            offset=offset,
+        )
+        if stop is not None:
+            break
+    pair = new_pair()
+    checkpoint = Checkpointer(path, 0.0)
+    start = checkpoint.resume(pair, offset=2000)
+    assert start == 700
+    run_pair(pair, times[2000:], prices[2000:], signal, start, offset=2000)
+    assert_same(pair, expected)
+
+
+def test_closed_trades_are_appended_once(tmp_path, series):
+    times, prices = series
+    path = str(tmp_path / "run.ckpt")
+    checkpoint = Checkpointer(path, 0.0)
+    pair = new_pair()
+    run_pair(pair, times, prices, signal, stop=1500, close=False)
+    checkpoint.save(pair)
+    with open(f"{path}.trades", "rb") as f:
+        first = f.read()
+    run_pair(pair, times, prices, signal, 1500, close=False)
+    checkpoint.save(pair)
+    with open(f"{path}.trades", "rb") as f:
+        assert f.read().startswith(first)
+    state, curve = Checkpointer.read(path)
+    assert len(state["strategy"]["closed_trades"]) == len(pair.strategy.closed_trades)
+    np.testing.assert_array_equal(curve, pair.strategy.recorder.curve)
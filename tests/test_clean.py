@@ -0,0 +1,73 @@
+import warnings
+
+import numpy as np
+import pytest
+
+from q import DROP, FILL, KEEP, RAISE, clean_ticks
+
+
+@pytest.fixture
+def ticks():
+    rng = np.random.default_rng(2)
+    prices = 100 * np.exp(np.cumsum(rng.normal(0, 1e-3, 200)))
+    return np.arange(200, dtype=float), prices
+
+
+def test_clean_series_is_untouched(ticks):
+    times, prices, report = clean_ticks(*ticks, max_gap=5)
+    np.testing.assert_array_equal(times, ticks[0])
+    np.testing.assert_array_equal(prices, ticks[1])
+    assert report.clean
+
+
+@pytest.mark.parametrize("bad", [np.inf, -np.inf, np.nan])
+def test_non_finite_time_drops_only_that_tick(ticks, bad):
+    times = ticks[0].copy()
+    times[50] = bad
+    cleaned, _, report = clean_ticks(times, ticks[1])
+    assert report.found["non_monotonic"].tolist() == [50]
+    np.testing.assert_array_equal(cleaned, np.delete(ticks[0], 50))
+
+
+def test_non_finite_time_fill(ticks):
+    times = ticks[0].copy()
+    times[50] = np.inf
+    cleaned, _, report = clean_ticks(times, ticks[1], {"non_monotonic": FILL})
+    assert report.ticks_out == 200
+    assert cleaned[50] == 49.0
+    assert np.all(np.diff(cleaned) >= 0)
+
+
+@pytest.mark.parametrize("bad", [0.0, -1.0, np.nan, np.inf])
+def test_invalid_prices(ticks, bad):
+    prices = ticks[1].copy()
+    prices[[0, 70]] = bad
+    _, cleaned, report = clean_ticks(ticks[0], prices)
+    assert report.found["invalid_price"].tolist() == [0, 70]
+    np.testing.assert_array_equal(cleaned, np.delete(ticks[1], [0, 70]))
+    _, filled, _ = clean_ticks(ticks[0], prices, {"invalid_price": FILL})
+    # the leading bad tick has nothing to fill from and is dropped
+    assert len(filled) == 199
+    assert filled[69] == ticks[1][69]
+
+
+def test_keep_is_quiet_and_still_finds_spikes(ticks):
+    prices = ticks[1].copy()
+    prices[[10, 11]] = [0.0, np.nan]
+    prices[100] *= 1.5
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        _, kept, report = clean_ticks(ticks[0], prices, {"invalid_price": KEEP})
+    assert len(kept) == 199
+    assert report.found["spike"].tolist() == [100]
+
+
+def test_raise_and_policy_checks(ticks):
+    prices = ticks[1].copy()
+    prices[5] = 0.0
+    with pytest.raises(ValueError):
+        clean_ticks(ticks[0], prices, {"invalid_price": RAISE})
+    with pytest.raises(ValueError):
+        clean_ticks(*ticks, {"gap": DROP})
+    with pytest.raises(ValueError):
+        clean_ticks(*ticks, {"dup": KEEP})
@@ -0,0 +1,65 @@
+import pytest
+
+from q import LONG, SHORT, Config, Funds, Strategy, Tracking
+
+FIELDS = (
+    "size",
+    "entry_price",
+    "value",
+    "margin",
+    "open_fees",
+    "tp_targets",
+    "tp_sizes",
+    "tp_size_total",
+    "tp_start",
+    "tp_end",
+)
+
+
+def make_strategy():
+    config = Config()
+    config.tp_targets_count = 3
+    config.ord_max_usd = config.position_max_usd = 1e6
+    strategy = Strategy(config, Funds(1e6), Tracking())
+    strategy.update(0.0, 0, 100.0)
+    return strategy
+
+
+def test_short_entry_profits_when_the_price_falls():
+    strategy = make_strategy()
+    strategy.config.sl_enabled = strategy.config.sl_trail_enabled = False
+    strategy.config.tp_enabled = False
+    strategy.config.tp_targets_count = 1
+    strategy.new_entry(SHORT, 1.0, 100.0, 1)
+    (trade,) = strategy.open_trades
+    size = trade.size
+    assert size < 0
+    assert trade.margin > 0
+    strategy.update(1.0, 1, 90.0)
+    assert strategy.funds.open_profit == pytest.approx(-size * 10.0)
+    strategy.close_all_trades()
+    assert trade.data.gross_profit == pytest.approx(-size * 10.0)
+    assert strategy.funds.margin == 0.0
+
+
+def test_short_take_profit_ladder_runs_down():
+    strategy = make_strategy()
+    strategy.new_entry(SHORT, 1.0, 100.0, 1)
+    (trade,) = strategy.open_trades
+    assert trade.tp_targets == sorted(trade.tp_targets, reverse=True)
+    assert trade.tp_targets[0] < 100.0
+
+
+def test_basket_matches_single_entries():
+    sides = [LONG, SHORT, SHORT, LONG]
+    sizes = [1.0, 2.0, 0.5, 3.0]
+    prices = [100.0, 101.0, 99.0, 102.0]
+    single = make_strategy()
+    for side, size, price in zip(sides, sizes, prices):
+        single.new_entry(side, size, price, 2)
+    basket = make_strategy()
+    trades = basket.new_entries(sides, sizes, prices, [2.0] * 4)
+    assert [t.size < 0 for t in trades] == [s == SHORT for s in sides]
+    for trade, expected in zip(trades, single.open_trades):
+        for field in FIELDS:
+            assert getattr(trade, field) == pytest.approx(getattr(expected, field))
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from q import LONG, SHORT, Config, FanOutRunner, Pair, chunked, run_pair
+
+
+def signal(pair):
+    if pair.bar_index % 50 == 0:
+        side = LONG if pair.bar_index % 100 else SHORT
+        pair.strategy.new_entry(side, 0.2, pair.price, 2)
+
+
+@pytest.fixture
+def series():
+    rng = np.random.default_rng(8)
+    prices = 100 * np.exp(np.cumsum(rng.normal(0, 0.002, 2500)))
+    return np.arange(len(prices), dtype=float), prices
+
+
+@pytest.fixture
+def configs():
+    configs = []
+    for sl_dist, tp_end in [(0.01, 0.01), (0.02, 0.03), (0.04, 0.02)]:
+        config = Config()
+        config.sl_dist = sl_dist
+        config.tp_end = tp_end
+        config.tp_targets_count = 2
+        configs.append(config)
+    return configs
+
+
+@pytest.mark.parametrize("chunk", [300, 16384])
+def test_fan_out_matches_serial_runs(series, configs, chunk):
+    times, prices = series
+    results = FanOutRunner.from_configs(configs, signal).run(times, prices, chunk)
+    assert len(results) == len(configs)
+    for result, config in zip(results, configs):
+        pair = run_pair(Pair(config.symbol, config, 1000.0), times, prices, signal)
+        assert result.funds == pair.funds.__dict__
+        assert result.tracking == pair.tracking.__dict__
+        assert result.ledger == [
+            dict(t.data.__dict__) for t in pair.strategy.closed_trades
+        ]
+        assert result.ledger
+
+
+def test_pairs_keep_their_own_state(series, configs):
+    times, prices = series
+    runner = FanOutRunner.from_configs(configs, [signal, None, signal])
+    results = runner.run_chunks(chunked(times, prices, 500))
+    assert not results[1].ledger
+    assert results[0].tracking != results[2].tracking
+    assert len({id(pair.funds) for pair in runner.pairs}) == len(configs)
+
+
+def test_one_on_bar_per_pair():
+    with pytest.raises(ValueError):
+        FanOutRunner([Pair("BTCUSDT", Config())], [signal, signal])
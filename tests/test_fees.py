@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from q import LONG, SHORT, Config, FeeSchedule, Funds, Strategy, Tracking
+
+TIERS = [(0.0, 0.0002, 0.0004), (1000.0, 0.0001, 0.0003), (5000.0, 0.0, 0.0002)]
+
+
+def test_tiers_must_start_at_zero_and_ascend():
+    with pytest.raises(ValueError):
+        FeeSchedule([(10.0, 0.0002, 0.0004)])
+    with pytest.raises(ValueError):
+        FeeSchedule([(0.0, 0.0002, 0.0004), (0.0, 0.0001, 0.0003)])
+
+
+def test_record_volume_moves_up_the_tiers():
+    config = Config()
+    config.set_fee_schedule(FeeSchedule(TIERS))
+    taker, maker = config.taker_fee, config.maker_fee
+    config.record_volume(999.0)
+    assert (maker.value, taker.value) == (0.0002, 0.0004)
+    config.record_volume(-1.0)
+    assert (maker.value, taker.value) == (0.0001, 0.0003)
+    config.record_volume(1e6)
+    assert config.fee_schedule.tier == 2
+    assert (maker.value, taker.value) == (0.0, 0.0002)
+    assert config.taker_fee is taker
+
+
+def test_fees_pick_maker_or_taker_rates():
+    schedule = FeeSchedule(TIERS)
+    fees = schedule.fees(
+        np.array([1.0, -1.0]), np.array([100.0, 100.0]), np.array([True, False])
+    )
+    assert fees.tolist() == pytest.approx([100.0 * 0.0002, 100.0 * 0.0004])
+
+
+def test_fill_crossing_a_tier_pays_the_tier_before_it():
+    schedule = FeeSchedule(TIERS)
+    fees = schedule.fees(np.array([6.0, 6.0, 40.0]), np.full(3, 100.0), record=False)
+    assert fees.tolist() == pytest.approx([600 * 0.0004, 600 * 0.0004, 4000 * 0.0003])
+    assert schedule.volume == 0.0
+    schedule.fees(np.array([6.0, 6.0, 40.0]), np.full(3, 100.0))
+    assert schedule.volume == 5200.0
+    assert schedule.tier == 2
+
+
+def make_strategy():
+    config = Config()
+    config.ord_max_usd = config.position_max_usd = 1e6
+    config.set_fee_schedule(FeeSchedule([(0.0, 0.0002, 0.0004), (1.0, 0.0001, 0.0003)]))
+    strategy = Strategy(config, Funds(1e6), Tracking())
+    strategy.update(0.0, 0, 100.0)
+    return strategy
+
+
+def test_basket_open_fees_follow_the_tiers_like_single_entries():
+    sides = [LONG, SHORT, LONG]
+    sizes = [1.0, 2.0, 0.5]
+    prices = [100.0, 101.0, 99.0]
+    single = make_strategy()
+    for side, size, price in zip(sides, sizes, prices):
+        single.new_entry(side, size, price, 2)
+    basket = make_strategy()
+    trades = basket.new_entries(sides, sizes, prices, [2.0] * 3)
+    assert [t.size for t in trades] == pytest.approx(
+        [t.size for t in single.open_trades]
+    )
+    expected = [t.open_fees for t in single.open_trades]
+    assert [t.open_fees for t in trades] == pytest.approx(expected)
+    assert expected[1] / abs(single.open_trades[1].value) == pytest.approx(0.0001)
+    assert basket.config.fee_schedule.volume == pytest.approx(
+        single.config.fee_schedule.volume
+    )
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from q import (
+    BUY,
+    LEDGER_FIELDS,
+    LONG,
+    SHORT,
+    Config,
+    EquityRecorder,
+    Order,
+    Pair,
+    run_pair,
+)
+
+
+@pytest.fixture(scope="module")
+def series():
+    rng = np.random.default_rng(4)
+    prices = 100 * np.exp(np.cumsum(rng.normal(0, 0.002, 2000)))
+    return np.arange(len(prices), dtype=float), prices
+
+
+def signal(pair):
+    if pair.bar_index % 30 == 0:
+        side = LONG if pair.bar_index % 60 else SHORT
+        pair.strategy.new_entry(side, 0.1, pair.price, 1)
+
+
+def new_pair():
+    pair = Pair("BTCUSDT", Config(), 10000.0)
+    pair.strategy.recorder = EquityRecorder()
+    return pair
+
+
+def test_branches_match_a_straight_run(series):
+    times, prices = series
+    expected = run_pair(new_pair(), times, prices, signal)
+    parent = run_pair(new_pair(), times, prices, signal, stop=1000, close=False)
+    assert parent.strategy.closed_trades
+    state = parent.get_state()
+    curve = parent.strategy.recorder.curve.copy()
+    for branch in parent.fork(2):
+        run_pair(branch, times, prices, signal, 1000)
+        assert branch.funds.__dict__ == expected.funds.__dict__
+        assert branch.tracking.__dict__ == expected.tracking.__dict__
+        ledger = branch.strategy.trade_ledger()
+        expected_ledger = expected.strategy.trade_ledger()
+        for field in LEDGER_FIELDS:
+            np.testing.assert_array_equal(ledger[field], expected_ledger[field])
+        np.testing.assert_array_equal(
+            branch.strategy.recorder.curve, expected.strategy.recorder.curve
+        )
+    assert parent.get_state() == state
+    np.testing.assert_array_equal(parent.strategy.recorder.curve, curve)
+
+
+def test_branch_cannot_mutate_parent(series):
+    times, prices = series
+    parent = run_pair(new_pair(), times, prices, signal, stop=1000, close=False)
+    parent.strategy.submit_order(
+        Order("BTCUSDT", parent.config, side=BUY, size=0.1, price=1.0, leverage=1)
+    )
+    state = parent.get_state()
+    (branch,) = parent.fork()
+    for trade in branch.strategy.closed_trades:
+        assert trade.funds is branch.funds and trade.config is branch.config
+    branch.strategy.closed_trades[0].data.net_profit = 1e9
+    branch.config.sl_dist = 0.5
+    branch.strategy.drain_submissions()
+    branch.strategy.close_all_trades()
+    assert branch.strategy.open_orders
+    assert parent.get_state() == state
+    assert len(parent.strategy.submissions) == 1
+    assert not parent.strategy.open_orders
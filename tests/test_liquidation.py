@@ -0,0 +1,76 @@
+import pytest
+
+from q import (
+    BUY,
+    CLOSED,
+    LIQUIDATION,
+    LONG,
+    SHORT,
+    Config,
+    Funds,
+    Order,
+    Strategy,
+    Tracking,
+)
+
+
+@pytest.fixture
+def strategy():
+    config = Config()
+    config.sl_enabled = config.sl_trail_enabled = config.tp_enabled = False
+    strategy = Strategy(config, Funds(1000.0), Tracking())
+    strategy.update(0.0, 0, 100.0)
+    return strategy
+
+
+def test_added_to_trade_liquidates_once(strategy):
+    strategy.new_entry(LONG, 2.0, 100.0, 10)
+    trade = strategy.open_trades[0]
+    trade.id = "t1"
+    size = trade.size
+    strategy.place_order(
+        Order(
+            "BTCUSDT",
+            strategy.config,
+            order_id="t1",
+            side=BUY,
+            size=1.0,
+            price=100.0,
+            leverage=10,
+        )
+    )
+    strategy.update(1.0, 1, 100.0)
+    assert trade.size == pytest.approx(size + 1.0)
+    assert len(strategy.liquidations.longs) == 2  # the stale entry stays behind
+    strategy.update(2.0, 2, 80.0)
+    assert strategy.closed_trades == [trade]
+    assert trade.status == CLOSED
+    assert trade.data.exit_type == LIQUIDATION
+    assert not strategy.open_trades
+    strategy.update(3.0, 3, 70.0)
+    assert strategy.closed_trades == [trade]
+
+
+def test_repriced_trade_keeps_one_live_entry(strategy):
+    strategy.new_entry(LONG, 2.0, 100.0, 10)
+    trade = strategy.open_trades[0]
+    for _ in range(3):
+        strategy.liquidations.add(trade, strategy.config.maintenance_margin)
+    assert [t for _, t in strategy.liquidations.due(0.0, 0.0)] == [trade]
+
+
+def test_shorts_liquidate_lowest_level_first(strategy):
+    for leverage in (5, 20, 10):
+        strategy.new_entry(SHORT, 1.0, 100.0, leverage)
+    strategy.new_entry(LONG, 1.0, 100.0, 10)
+    shorts = {t.leverage: t for t in strategy.open_trades if t.size < 0}
+    assert len(shorts) == 3
+    levels = sorted(t.liquidation_price for t in shorts.values())
+    assert levels == [shorts[k].liquidation_price for k in (20, 10, 5)]
+    strategy.update(1.0, 1, (levels[0] + levels[1]) / 2)
+    assert strategy.closed_trades == [shorts[20]]
+    strategy.update(2.0, 2, levels[2] + 1.0)
+    assert strategy.closed_trades == [shorts[20], shorts[10], shorts[5]]
+    assert all(t.data.exit_type == LIQUIDATION for t in strategy.closed_trades)
+    assert shorts[10].data.exit_price == pytest.approx(levels[2] + 1.0)
+    assert [t.size > 0 for t in strategy.open_trades] == [True]
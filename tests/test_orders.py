@@ -0,0 +1,86 @@
+import pytest
+
+from q import BUY, EXPIRED, GTD, LIMIT, LONG, Config, Funds, Order, Strategy, Tracking
+
+
+@pytest.fixture
+def strategy():
+    strategy = Strategy(Config(), Funds(1000.0), Tracking())
+    strategy.update(0.0, 0, 100.0)
+    return strategy
+
+
+def limit_order(config, price=90.0, **kwargs):
+    return Order(
+        "BTCUSDT",
+        config,
+        direction=LONG,
+        side=BUY,
+        type=LIMIT,
+        size=0.5,
+        price=price,
+        **kwargs
+    )
+
+
+def test_cancel_restores_funds(strategy):
+    before = dict(strategy.funds.__dict__)
+    order = limit_order(strategy.config)
+    strategy.place_order(order)
+    strategy.update(1.0, 1, 100.0)
+    assert strategy.funds.pending_margin == pytest.approx(order.margin)
+    strategy.cancel(order.id)
+    assert strategy.funds.__dict__ == pytest.approx(before)
+    strategy.update(2.0, 2, 100.0)
+    assert strategy.funds.__dict__ == pytest.approx(before)
+
+
+def test_cancel_all_restores_funds(strategy):
+    before = dict(strategy.funds.__dict__)
+    for price in (90.0, 80.0):
+        strategy.place_order(limit_order(strategy.config, price))
+    strategy.update(1.0, 1, 100.0)
+    strategy.cancel_all()
+    assert strategy.funds.__dict__ == pytest.approx(before)
+    assert strategy.funds.margin == 0.0
+
+
+def test_expiry_restores_funds(strategy):
+    before = dict(strategy.funds.__dict__)
+    order = limit_order(strategy.config, time_in_force=GTD, expire_time=10.0)
+    strategy.place_order(order)
+    strategy.update(5.0, 1, 100.0)
+    assert order.id in strategy.open_orders
+    strategy.update(11.0, 2, 100.0)
+    assert order.id not in strategy.open_orders
+    assert order.status == EXPIRED
+    assert strategy.funds.margin == 0.0
+    assert strategy.funds.__dict__ == pytest.approx(before)
+
+
+def test_modified_expiry_skips_stale_entry(strategy):
+    order = limit_order(strategy.config, time_in_force=GTD, expire_time=10.0)
+    strategy.place_order(order)
+    strategy.modify(order.id, {"expire_time": 20.0})
+    strategy.update(11.0, 1, 100.0)
+    assert order.id in strategy.open_orders
+    strategy.update(21.0, 2, 100.0)
+    assert order.id not in strategy.open_orders
+
+
+def test_duplicate_open_id_raises(strategy):
+    strategy.place_order(limit_order(strategy.config))
+    with pytest.raises(ValueError):
+        strategy.place_order(Order("BTCUSDT", strategy.config, order_id="order1"))
+
+
+@pytest.mark.parametrize(
+    "expire_time, pending, expired", [(10.0, 9.99, 10.0), (10.5, 10.9, 11.0)]
+)
+def test_expiry_fires_at_the_next_tick(strategy, expire_time, pending, expired):
+    order = limit_order(strategy.config, time_in_force=GTD, expire_time=expire_time)
+    strategy.place_order(order)
+    strategy.update(pending, 1, 100.0)
+    assert order.id in strategy.open_orders
+    strategy.update(expired, 2, 100.0)
+    assert order.status == EXPIRED
@@ -0,0 +1,71 @@
+import itertools
+import time
+
+import numpy as np
+import pytest
+
+from q import Prefetcher, chunked
+
+
+def test_chunks_arrive_in_order():
+    times = np.arange(10_000, dtype=float)
+    prices = times * 2
+    expected = list(chunked(times, prices, 512))
+    with Prefetcher(chunked(times, prices, 512), depth=3) as prefetcher:
+        got = list(prefetcher)
+    assert [offset for offset, _, _ in got] == [o for o, _, _ in expected]
+    for (_, t, p), (_, et, ep) in zip(got, expected):
+        np.testing.assert_array_equal(t, et)
+        np.testing.assert_array_equal(p, ep)
+    assert prefetcher.chunks == len(expected)
+
+
+def test_memory_mapped_chunks_are_copied(tmp_path):
+    path = tmp_path / "prices.npy"
+    np.save(path, np.arange(100.0))
+    mapped = np.load(path, mmap_mode="r")
+    with Prefetcher([mapped[:50], mapped[50:]]) as prefetcher:
+        chunks = list(prefetcher)
+    assert not any(isinstance(chunk, np.memmap) for chunk in chunks)
+    np.testing.assert_array_equal(np.concatenate(chunks), np.arange(100.0))
+
+
+def test_producer_stays_at_most_depth_ahead():
+    produced = []
+
+    def source():
+        for k in itertools.count():
+            produced.append(k)
+            yield k
+
+    prefetcher = Prefetcher(source(), depth=2)
+    assert next(prefetcher) == 0
+    time.sleep(0.2)
+    # the queue holds depth chunks and the producer blocks holding one more
+    assert len(produced) <= 1 + 2 + 1
+    prefetcher.close()
+
+
+def test_close_stops_an_endless_source():
+    prefetcher = Prefetcher(itertools.count(), depth=2)
+    assert [next(prefetcher) for _ in range(5)] == [0, 1, 2, 3, 4]
+    prefetcher.close()
+    assert not prefetcher.thread.is_alive()
+
+
+def test_source_errors_reach_the_consumer():
+    def source():
+        yield 1
+        raise OSError("feed dropped")
+
+    with Prefetcher(source()) as prefetcher:
+        assert next(prefetcher) == 1
+        with pytest.raises(OSError, match="feed dropped"):
+            next(prefetcher)
+        with pytest.raises(StopIteration):
+            next(prefetcher)
+
+
+def test_depth_is_validated():
+    with pytest.raises(ValueError):
+        Prefetcher([], depth=0)
@@ -0,0 +1,34 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from q import EquityRecorder, Funds
+
+
+def filled(values, path=None, capacity=4096):
+    recorder = EquityRecorder(capacity=capacity, path=path)
+    for i, value in enumerate(values):
+        funds = Funds()
+        funds.equity = value
+        recorder.record(SimpleNamespace(time=i, bar_index=i, price=0.0, funds=funds))
+    return recorder
+
+
+@pytest.mark.parametrize("count, buckets", [(9, 4), (10, 4), (13, 4), (101, 7)])
+def test_downsample_keeps_extremes(count, buckets):
+    values = np.random.default_rng(count).normal(size=count)
+    rows = filled(values).downsample(buckets)
+    assert len(rows) <= 2 * buckets
+    assert rows[:, 3].min() == values.min()
+    assert rows[:, 3].max() == values.max()
+    assert np.all(np.diff(rows[:, 0]) > 0)
+
+
+def test_file_backed_buffer_grows(tmp_path):
+    path = str(tmp_path / "curve.f8")
+    values = np.arange(50.0)
+    recorder = filled(values, path, capacity=4)
+    np.testing.assert_array_equal(recorder.column("equity"), values)
+    recorder.close()
+    np.testing.assert_array_equal(EquityRecorder.load(path)[:, 3], values)
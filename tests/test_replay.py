@@ -0,0 +1,54 @@
+import copy
+
+import numpy as np
+import pytest
+
+from q import LEDGER_FIELDS, LONG, SHORT, Config, Pair, replay_exits, run_pair
+
+
+@pytest.fixture(scope="module")
+def series():
+    rng = np.random.default_rng(0)
+    prices = 100 * np.exp(np.cumsum(rng.normal(0, 0.001, 5000)))
+    return np.arange(len(prices), dtype=float), prices
+
+
+def signal(pair):
+    if pair.bar_index % 50 == 0:
+        side = LONG if pair.bar_index % 100 else SHORT
+        pair.strategy.new_entry(side, 0.1, pair.price, 1)
+
+
+def run(config, times, prices):
+    pair = Pair(config.symbol, config, 1e9)
+    run_pair(pair, times, prices, signal)
+    return pair
+
+
+def test_replay_matches_full_run(series):
+    config = Config()
+    config.tp_targets_count = 3
+    pair = run(config, *series)
+    replay = replay_exits(pair.strategy.entry_events(), config, *series, workers=1)
+    ledger = pair.strategy.trade_ledger()
+    order = np.argsort(ledger["entry_bar_index"], kind="stable")
+    for field in LEDGER_FIELDS:
+        np.testing.assert_allclose(replay["ledger"][field], ledger[field][order])
+
+
+@pytest.mark.parametrize(
+    "field, value",
+    [("tp_start", 0.002), ("tp_end", 0.03), ("tp_targets_count", 4), ("tp_size_total", 0.3)],
+)
+def test_replay_follows_tp_settings(series, field, value):
+    config = Config()
+    config.tp_targets_count = 2
+    events = run(config, *series).strategy.entry_events()
+    base = replay_exits(events, config, *series, workers=1)["tracking"]
+    changed = copy.deepcopy(config)
+    setattr(changed, field, value)
+    replay = replay_exits(events, changed, *series, workers=1)["tracking"]
+    assert replay["net_profit"] != pytest.approx(base["net_profit"])
+    assert replay["net_profit"] == pytest.approx(
+        run(changed, *series).tracking.net_profit
+    )
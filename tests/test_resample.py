@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from q import BarResampler, align, resample
+
+
+def streamed(times, prices, volumes, seconds):
+    resampler = BarResampler(seconds, capacity=4)
+    for time_is, price, volume in zip(times, prices, volumes):
+        resampler.update(time_is, price, volume)
+    return np.vstack((resampler.bars(), [resampler.bar]))
+
+
+@pytest.mark.parametrize("seconds", [0.1, 0.3, 1.1, 60.0])
+def test_streaming_bars_equal_batch_bars(seconds):
+    rng = np.random.default_rng(2)
+    times = np.round(np.cumsum(rng.uniform(0, seconds / 3, 5000)), 3)
+    prices = 100 + np.cumsum(rng.normal(0, 0.1, len(times)))
+    volumes = rng.uniform(0, 2, len(times))
+    batch = resample(times, prices, seconds, volumes).T
+    stream = streamed(times, prices, volumes, seconds)
+    assert np.array_equal(stream[:, :5], batch[:, :5])
+    # volumes are summed in a different order
+    assert stream[:, 5] == pytest.approx(batch[:, 5])
+
+
+def test_align_only_sees_closed_bars():
+    bar_times = np.array([0.0, 60.0, 120.0])
+    times = np.array([0.0, 59.0, 60.0, 119.0, 120.0, 180.0, 500.0])
+    assert align(bar_times, 60.0, times).tolist() == [-1, -1, 0, 0, 1, 2, 2]
+
+
+def test_align_against_resampled_bars():
+    times = np.arange(0.0, 600.0, 7.0)
+    prices = np.sin(times)
+    bars = resample(times, prices, 60.0)
+    index = align(bars[0], 60.0, times)
+    for time_is, i in zip(times, index):
+        closed = bars[0] + 60.0 <= time_is
+        assert i == np.flatnonzero(closed).max(initial=-1)
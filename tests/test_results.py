@@ -0,0 +1,68 @@
+import pytest
+
+from q import ResultsDB
+
+
+def tracking(net_profit, max_draw_down=0.0):
+    return {"net_profit": net_profit, "max_draw_down": max_draw_down}
+
+
+@pytest.fixture
+def db(tmp_path):
+    with ResultsDB(str(tmp_path / "runs.db")) as db:
+        yield db
+
+
+def test_readded_run_replaces_its_params(db):
+    db.add({}, tracking(1.0), {"sl_dist": 0.01, "tp_start": 0.02}, run_key="k1")
+    db.flush()
+    db.add({}, tracking(2.0), {"sl_dist": 0.03}, run_key="k1")
+    db.flush()
+    db.add({}, tracking(3.0), {"sl_dist": 0.05}, run_key="k1")
+    db.add({}, tracking(4.0), {"sl_dist": 0.04}, run_key="k1")
+    assert db.params("k1") == {"sl_dist": 0.04}
+    runs = db.top("net_profit")
+    assert [r["run_key"] for r in runs] == ["k1"]
+    assert runs[0]["net_profit"] == 4.0
+    assert db.top("net_profit", where=[("sl_dist", "<", 0.035)]) == []
+
+
+def test_query_round_trip(db):
+    for k, (profit, draw_down, sl_dist) in enumerate(
+        [(5.0, -1.0, 0.01), (9.0, -4.0, 0.02), (7.0, -2.0, 0.03), (1.0, 0.0, 0.02)]
+    ):
+        db.add(
+            {"balance": 100.0 + k},
+            tracking(profit, draw_down),
+            {"sl_dist": sl_dist, "symbol": "ignored"},
+            symbol="BTCUSDT",
+            run_key=f"k{k}",
+        )
+    runs = db.top("net_profit", 2, [("max_draw_down", ">", -3.0)])
+    assert [r["run_key"] for r in runs] == ["k2", "k0"]
+    assert runs[0]["funds"] == {"balance": 102.0}
+    assert runs[0]["tracking"] == tracking(7.0, -2.0)
+    runs = db.top("net_profit", where=[("sl_dist", "=", 0.02)], ascending=True)
+    assert [r["run_key"] for r in runs] == ["k3", "k1"]
+    assert db.params("k0") == {"sl_dist": 0.01}
+
+
+@pytest.mark.parametrize("op", ["<", "<=", "=", ">=", ">", "!="])
+def test_operators(db, op):
+    db.add({}, tracking(1.0), {"sl_dist": 0.01}, run_key="k")
+    assert len(db.top("net_profit", where=[("sl_dist", op, 0.01)])) == (
+        op in ("<=", "=", ">=")
+    )
+
+
+@pytest.mark.parametrize(
+    "where", [[("sl_dist", "; DROP TABLE runs; --", 0.0)], [("sl_dist", "LIKE", 0.0)]]
+)
+def test_invalid_operator(db, where):
+    with pytest.raises(ValueError):
+        db.top("net_profit", where=where)
+
+
+def test_invalid_metric(db):
+    with pytest.raises(ValueError):
+        db.top("funds")
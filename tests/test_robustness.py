@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+import performance_analysis as pa
+
+
+@pytest.fixture(scope="module")
+def pnl():
+    return np.random.default_rng(8).normal(1.0, 20.0, 40)
+
+
+@pytest.mark.parametrize("method", [pa.BOOTSTRAP, pa.PERMUTATION])
+def test_resample_shapes_and_seed(pnl, method):
+    stats = pa.resample(pnl, method, paths=250, seed=3, batch=100)
+    assert set(stats) == {
+        "net_profit",
+        "max_draw_down",
+        "profit_factor",
+        "win_loss_ratio",
+        "ruined",
+    }
+    assert all(v.shape == (250,) for v in stats.values())
+    again = pa.resample(pnl, method, paths=250, seed=3, batch=100)
+    pooled = pa.resample(pnl, method, paths=250, seed=3, batch=100, workers=2)
+    for k in stats:
+        np.testing.assert_array_equal(stats[k], again[k])
+        np.testing.assert_array_equal(stats[k], pooled[k])
+    other = pa.resample(pnl, method, paths=250, seed=4, batch=100)
+    assert not np.array_equal(stats["max_draw_down"], other["max_draw_down"])
+
+
+def test_permutation_keeps_the_trades(pnl):
+    stats = pa.resample(pnl, pa.PERMUTATION, paths=50, seed=0)
+    np.testing.assert_allclose(stats["net_profit"], pnl.sum())
+    bootstrap = pa.resample(pnl, pa.BOOTSTRAP, paths=50, seed=0)
+    assert np.ptp(bootstrap["net_profit"]) > 0
+
+
+def test_resample_rejects_unknown_method(pnl):
+    with pytest.raises(ValueError):
+        pa.resample(pnl, "jackknife")
+
+
+def test_robustness_is_reproducible(pnl):
+    report = pa.robustness(pnl, paths=200, seed=11, batch=50)
+    assert report == pa.robustness(pnl, paths=200, seed=11, batch=50)
+    assert set(report) == {"actual", pa.BOOTSTRAP, pa.PERMUTATION}
+    assert report["actual"]["net_profit"] == pytest.approx(pnl.sum())
+    for method in (pa.BOOTSTRAP, pa.PERMUTATION):
+        interval = report[method]["max_draw_down"]
+        assert interval["low"] <= interval["mean"] <= interval["high"] <= 0
+        assert 0.0 <= report[method]["risk_of_ruin"] <= 1.0
+
+
+def test_robustness_streams_do_not_collide_across_seeds(pnl):
+    report = pa.robustness(pnl, paths=200, seed=11)
+    shifted = pa.resample(pnl, pa.PERMUTATION, paths=200, seed=12)
+    mean = report[pa.PERMUTATION]["max_draw_down"]["mean"]
+    assert mean != pytest.approx(float(shifted["max_draw_down"].mean()))
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from q import LONG, Config, SuccessiveHalving, config_grid
+
+
+def signal(pair):
+    if pair.bar_index % 40 == 0:
+        pair.strategy.new_entry(LONG, 1.0, pair.price, 1)
+
+
+@pytest.fixture
+def series():
+    rng = np.random.default_rng(4)
+    prices = 100 * np.exp(np.cumsum(rng.normal(0, 0.002, 900)))
+    return np.arange(len(prices), dtype=float), prices
+
+
+@pytest.mark.parametrize("fraction", [0.0, -0.5, 1.5])
+def test_min_fraction_is_validated(series, fraction):
+    with pytest.raises(ValueError):
+        SuccessiveHalving([Config()], *series, min_fraction=fraction)
+
+
+def test_full_fraction_runs_one_stage(series):
+    assert SuccessiveHalving([Config()], *series, min_fraction=1.0).horizons() == [900]
+
+
+def test_tp_settings_change_the_ranking_metric(series):
+    base = Config()
+    base.tp_targets_count = 3
+    base.sl_trail_enabled = False
+    configs = config_grid(base, tp_start=[0.002, 0.004], tp_end=[0.01, 0.03])
+    search = SuccessiveHalving(
+        configs, *series, signal, min_fraction=1.0, workers=1
+    )
+    search.run()
+    first_stage = [metric for _, metric in search.history[0][1]]
+    assert len(set(np.round(first_stage, 9))) == len(configs)
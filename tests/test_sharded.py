@@ -0,0 +1,62 @@
+import copy
+
+import numpy as np
+import pytest
+
+from q import (
+    LONG,
+    SHORT,
+    Config,
+    MarketDataStore,
+    Pair,
+    RunResult,
+    SharedMarketData,
+    ShardedRunner,
+    run_pair,
+)
+
+
+def signal(pair):
+    if pair.bar_index % 40 == 0:
+        side = LONG if pair.bar_index % 80 else SHORT
+        pair.strategy.new_entry(side, 0.1, pair.price, 1)
+
+
+@pytest.fixture(scope="module")
+def data():
+    rng = np.random.default_rng(2)
+    series = {}
+    for symbol, length in (("AAA", 3000), ("BBB", 1200), ("CCC", 800), ("DDD", 50)):
+        prices = 100 * np.exp(np.cumsum(rng.normal(0, 0.002, length)))
+        series[symbol] = (np.arange(length, dtype=float), prices)
+    return series
+
+
+def serial(data, config):
+    results = []
+    for symbol, (times, prices) in data.items():
+        pair_config = copy.deepcopy(config)
+        pair_config.symbol = symbol
+        pair = Pair(symbol, pair_config, 1000.0)
+        results.append(RunResult.from_pair(run_pair(pair, times, prices, signal)))
+    return {r.symbol: r for r in results}
+
+
+@pytest.mark.parametrize("shared", [False, True])
+def test_sharded_run_matches_serial_run(tmp_path, data, shared):
+    config = Config()
+    expected = serial(data, config)
+    store = MarketDataStore.write(str(tmp_path), data)
+    if shared:
+        store = SharedMarketData.from_store(store)
+    try:
+        report = ShardedRunner(store, config, 1000.0, signal, workers=2).run()
+    finally:
+        if shared:
+            store.close()
+    assert sorted(report.results) == sorted(expected)
+    assert any(r.ledger for r in expected.values())
+    for symbol, result in report.results.items():
+        assert result.funds == expected[symbol].funds
+        assert result.tracking == expected[symbol].tracking
+        assert result.ledger == expected[symbol].ledger
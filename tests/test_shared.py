@@ -0,0 +1,59 @@
+import gc
+import os
+import pickle
+
+import numpy as np
+
+from q import Config, SharedMarketData, ShardedRunner
+
+
+def make_data():
+    rng = np.random.default_rng(1)
+    data = {}
+    for symbol in ("AAA", "BBB", "CCC"):
+        prices = 100 * np.exp(np.cumsum(rng.normal(0, 0.001, 500)))
+        data[symbol] = (np.arange(len(prices), dtype=float), prices)
+    return data
+
+
+def test_close_unlinks_segment():
+    data = make_data()
+    host = SharedMarketData.create(data)
+    path = host.path(host.name)
+    ShardedRunner(host, Config(), workers=2).run()
+    assert os.path.exists(path)
+    assert not host.closed
+    np.testing.assert_array_equal(host.get("BBB")[1], data["BBB"][1])
+    host.close()
+    assert host.closed
+    assert not os.path.exists(path)
+    host.close()
+
+
+def test_segment_outlives_the_owner_while_handles_are_open():
+    data = make_data()
+    host = SharedMarketData.create(data)
+    path = host.path(host.name)
+    other = pickle.loads(pickle.dumps(host))
+    assert other.name == host.name
+    host.close()
+    assert os.path.exists(path)
+    np.testing.assert_array_equal(other.get("AAA")[1], data["AAA"][1])
+    other.close()
+    assert not os.path.exists(path)
+
+
+def test_views_are_read_only():
+    with SharedMarketData.create(make_data()) as host:
+        times, prices = host.get("CCC")
+        assert not prices.flags.writeable
+        assert host.symbols() == ["AAA", "BBB", "CCC"]
+        assert host.size("CCC") == 2 * 500 * 8
+
+
+def test_collected_owner_unlinks_segment():
+    host = SharedMarketData.create(make_data())
+    path = host.path(host.name)
+    del host
+    gc.collect()
+    assert not os.path.exists(path)
@@ -0,0 +1,84 @@
+import asyncio
+import threading
+
+import pytest
+
+from q import (
+    BUY,
+    LIMIT,
+    LONG,
+    PENDING,
+    AsyncRunner,
+    Config,
+    Funds,
+    Order,
+    Pair,
+    Strategy,
+    Tracking,
+)
+
+
+def limit_order(config, price=90.0):
+    return Order(
+        "BTCUSDT",
+        config,
+        direction=LONG,
+        side=BUY,
+        type=LIMIT,
+        size=0.1,
+        price=price,
+    )
+
+
+@pytest.fixture
+def strategy():
+    strategy = Strategy(Config(), Funds(1000.0), Tracking())
+    strategy.update(0.0, 0, 100.0)
+    return strategy
+
+
+def test_update_fills_open_orders_every_tick(strategy):
+    order = limit_order(strategy.config)
+    strategy.place_order(order)
+    strategy.update(1.0, 1, 95.0)
+    assert order.status == PENDING
+    strategy.update(2.0, 2, 89.0)
+    assert not strategy.open_orders
+    (trade,) = strategy.open_trades
+    assert trade.data.entry_bar_index == 2
+
+
+def test_submissions_apply_on_the_next_update_in_order(strategy):
+    orders = [limit_order(strategy.config, 90.0 - k) for k in range(4)]
+    threads = [
+        threading.Thread(target=strategy.submit_order, args=(order,))
+        for order in orders
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not strategy.open_orders
+    strategy.update(1.0, 1, 100.0)
+    assert len(strategy.open_orders) == 4
+    first, second = sorted(strategy.open_orders)[:2]
+    strategy.submit_cancel(first)
+    strategy.submit_modify(second, price=50.0)
+    strategy.update(2.0, 2, 100.0)
+    assert first not in strategy.open_orders
+    assert strategy.open_orders[second].price == 50.0
+
+
+def test_async_submit_without_exchange_places_the_order():
+    pair = Pair("BTCUSDT", Config(), 1000.0)
+    queue = asyncio.Queue()
+    for tick in [(0.0, 100.0), (1.0, 89.0)]:
+        queue.put_nowait(tick)
+    queue.put_nowait(None)
+    runner = AsyncRunner(pair, queue, close=False)
+    order = limit_order(pair.config)
+    runner.submit(order)
+    assert order.id in pair.strategy.open_orders
+    asyncio.run(runner.run())
+    assert not pair.strategy.open_orders
+    assert len(pair.strategy.open_trades) == 1
@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from q import LONG, Config, Pair, WalkForward, config_grid, run_pair
+
+
+def signal(pair):
+    if pair.bar_index % 25 == 0:
+        pair.strategy.new_entry(LONG, 1.0, pair.price, 1)
+
+
+@pytest.fixture
+def series():
+    rng = np.random.default_rng(11)
+    prices = 100 * np.exp(np.cumsum(rng.normal(0, 0.003, 600)))
+    return np.arange(len(prices), dtype=float), prices
+
+
+@pytest.fixture
+def configs():
+    base = Config()
+    base.sl_trail_enabled = False
+    return config_grid(base, sl_dist=[0.005, 0.02])
+
+
+def test_tracking_metric_is_rejected(series, configs):
+    with pytest.raises(ValueError):
+        WalkForward(configs, *series, 200, 100, metric="max_draw_down")
+
+
+def test_window_and_segment_boundaries(series, configs):
+    walk = WalkForward(configs, *series, 200, 100, step=50, on_bar=signal)
+    assert walk.segment == 50
+    assert walk.windows() == [
+        (0, 200, 300),
+        (50, 250, 350),
+        (100, 300, 400),
+        (150, 350, 450),
+        (200, 400, 500),
+        (250, 450, 550),
+        (300, 500, 600),
+    ]
+    walk = WalkForward(configs, *series, 200, 150, on_bar=signal)
+    assert walk.segment == 50
+    assert walk.windows() == [(0, 200, 350), (150, 350, 500)]
+
+
+def test_out_of_sample_runs_only_on_unseen_bars(series, configs):
+    times, prices = series
+    result = WalkForward(
+        configs, times, prices, 200, 100, on_bar=signal, workers=1
+    ).run()
+    assert [w["out_of_sample"] for w in result["windows"]] == [
+        (200, 300),
+        (300, 400),
+        (400, 500),
+        (500, 600),
+    ]
+    for window in result["windows"]:
+        split, stop = window["out_of_sample"]
+        pair = Pair(window["config"].symbol, window["config"], 1000.0)
+        run_pair(pair, times, prices, signal, start=split, stop=stop)
+        ledger = pair.strategy.trade_ledger()
+        assert ledger["entry_bar_index"].min() >= split
+        assert ledger["exit_bar_index"].max() < stop
+        assert window["out_of_sample_tracking"] == pair.tracking.__dict__
+
+
+def test_in_sample_bars_do_not_move_out_of_sample_scores(series, configs):
+    times, prices = series
+    walk = WalkForward(configs[:1], times, prices, 200, 100, on_bar=signal, workers=1)
+    before = walk.run()
+    walk.prices = prices.copy()
+    walk.prices[:200] *= 1.5
+    after = walk.run()
+    assert (
+        after["windows"][0]["in_sample_stats"]
+        != before["windows"][0]["in_sample_stats"]
+    )
+    assert after["out_of_sample"] == before["out_of_sample"]
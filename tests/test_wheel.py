@@ -0,0 +1,34 @@
+import math
+import random
+
+import pytest
+
+from q import TimingWheel
+
+
+@pytest.mark.parametrize("bits, levels", [(1, 1), (2, 1), (2, 2), (3, 3), (6, 6)])
+def test_advance_matches_reference(bits, levels):
+    rng = random.Random(bits * 10 + levels)
+    resolution = 0.5
+    wheel = TimingWheel(resolution, bits, levels)
+    pending = []
+    now = 0.0
+    for k in range(3000):
+        if rng.random() < 0.5:
+            when = now + rng.choice([0.1, 1.0, 10.0, 1000.0]) * rng.random()
+            tick = max(math.ceil(when / resolution), int(now // resolution) + 1)
+            wheel.schedule(when, k)
+            pending.append((tick, k))
+        else:
+            now += rng.choice([0.2, 3.0, 50.0])
+            target = int(now // resolution)
+            due = sorted(p for p in pending if p[0] <= target)
+            pending = [p for p in pending if p[0] > target]
+            assert wheel.advance(now) == [k for _, k in due]
+    assert wheel.count == len(pending)
+
+
+@pytest.mark.parametrize("bits, levels", [(0, 6), (6, 0)])
+def test_invalid_shape(bits, levels):
+    with pytest.raises(ValueError):
+        TimingWheel(bits=bits, levels=levels)